@@ -1,4 +1,5 @@
-from loans import amortization_fixed, calculate_balance
+from loans import amortization_fixed, calculate_balance, annual_totals
+from timing import stage
 import numpy as np
 
 def compare_loans(offers):
@@ -6,14 +7,16 @@ def compare_loans(offers):
     results = []
     for offer in offers:
         try:
-            df = amortization_fixed(
-                offer.get("principal", 100000),
-                offer.get("rate", 5),
-                offer.get("years", 30)
-            )
+            with stage("amortization"):
+                df = amortization_fixed(
+                    offer.get("principal", 100000),
+                    offer.get("rate", 5),
+                    offer.get("years", 30),
+                    as_frame=False
+                )
             
             # Calculate APR with fees
-            monthly_payment = df["Payment"].iloc[0] if len(df) > 0 else 0
+            monthly_payment = df["Payment"][0] if len(df["Payment"]) > 0 else 0
             apr = offer.get("rate", 5)  # Simplified, could use true APR
             
             results.append({
@@ -41,33 +44,34 @@ def compare_loans(offers):
     
     return results
 
-def sensitivity_analysis(data):
-    """Analyze sensitivity to rate changes"""
+RATE_CHANGES = [-2, -1.5, -1, -0.5, 0, 0.5, 1, 1.5, 2]
+
+def iter_sensitivity(data):
+    """Yield sensitivity rows one rate change at a time"""
     base_rate = data.get("rate", 5)
     principal = data.get("principal", 100000)
     years = data.get("years", 30)
     
-    results = []
-    base_df = amortization_fixed(principal, base_rate, years)
-    base_payment = base_df["Payment"].iloc[0]
+    with stage("amortization"):
+        base_df = amortization_fixed(principal, base_rate, years, as_frame=False)
+    base_payment = base_df["Payment"][0]
     base_total_interest = base_df["Interest"].sum()
     
-    rate_changes = [-2, -1.5, -1, -0.5, 0, 0.5, 1, 1.5, 2]
-    
-    for delta in rate_changes:
+    for delta in data.get("rate_changes", RATE_CHANGES):
         test_rate = base_rate + delta
         if test_rate < 0.1:
             test_rate = 0.1
             
-        df = amortization_fixed(principal, test_rate, years)
-        test_payment = df["Payment"].iloc[0]
+        with stage("amortization"):
+            df = amortization_fixed(principal, test_rate, years, as_frame=False)
+        test_payment = df["Payment"][0]
         test_total_interest = df["Interest"].sum()
         
         payment_change = test_payment - base_payment
         payment_change_pct = ((test_payment / base_payment - 1) * 100) if base_payment > 0 else 0
         interest_change = test_total_interest - base_total_interest
         
-        results.append({
+        yield {
             "rate": round(test_rate, 2),
             "monthly_payment": round(test_payment, 2),
             "total_interest": round(test_total_interest, 2),
@@ -75,9 +79,11 @@ def sensitivity_analysis(data):
             "payment_change": round(payment_change, 2),
             "payment_change_pct": round(payment_change_pct, 2),
             "interest_change": round(interest_change, 2)
-        })
-    
-    return results
+        }
+
+def sensitivity_analysis(data):
+    """Analyze sensitivity to rate changes"""
+    return list(iter_sensitivity(data))
 
 def affordability(data):
     """Calculate debt-to-income ratio and affordability"""
@@ -124,7 +130,8 @@ def refinancing(data):
     closing_costs = data.get("closing_costs", 3000)
     roll_costs = data.get("roll_costs", False)
     
-    old_df = amortization_fixed(old_principal, old_rate, old_years)
+    with stage("amortization"):
+        old_df = amortization_fixed(old_principal, old_rate, old_years, as_frame=False)
     
     # If rolling costs into loan
     if roll_costs:
@@ -132,10 +139,11 @@ def refinancing(data):
     else:
         new_principal = old_principal
     
-    new_df = amortization_fixed(new_principal, new_rate, new_years)
+    with stage("amortization"):
+        new_df = amortization_fixed(new_principal, new_rate, new_years, as_frame=False)
     
-    old_monthly = old_df["Payment"].iloc[0]
-    new_monthly = new_df["Payment"].iloc[0]
+    old_monthly = old_df["Payment"][0]
+    new_monthly = new_df["Payment"][0]
     monthly_savings = old_monthly - new_monthly
     
     if monthly_savings > 0:
@@ -174,8 +182,21 @@ def refinancing(data):
     }
 
 def tax_implications(data):
-    """Calculate tax implications of mortgage interest"""
-    annual_interest = data.get("annual_interest", 5000)
+    """Calculate tax implications of mortgage interest
+    
+    Without "annual_interest", a loan's principal, rate and years give the
+    interest paid in "tax_year" (default 1) of its schedule.
+    """
+    annual_interest = data.get("annual_interest")
+    if annual_interest is None and "principal" in data:
+        years = int(data.get("years", 30))
+        if years < 1:
+            raise ValueError("Years must be greater than 0")
+        tax_year = min(max(int(data.get("tax_year", 1)), 1), years)
+        totals = annual_totals(float(data["principal"]), float(data.get("rate", 5)), years)
+        annual_interest = float(totals["interest"][0, tax_year - 1])
+    elif annual_interest is None:
+        annual_interest = 5000
     tax_rate = data.get("tax_rate", 25)
     property_tax = data.get("property_tax", 0)
     filing_status = data.get("filing_status", "single")
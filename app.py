@@ -1,5 +1,5 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from loans import loan_dispatcher, calculate_true_apr
+from flask import Flask, render_template, request, jsonify, send_file, g, Response, make_response, stream_with_context
+from loans import loan_dispatcher, calculate_true_apr, schedule_records, annual_from_monthly
 from analysis import (
     compare_loans,
     sensitivity_analysis,
@@ -7,180 +7,379 @@ from analysis import (
     refinancing,
     tax_implications
 )
-from prepayment import prepayment_scenarios
+from prepayment import prepayment_scenarios, lump_sum_prepayment, lump_sum_curves, PREPAYMENT_DEFAULTS
 from documentation import generate_html_report, generate_text_report
-import pandas as pd
+from ratesheet import default_sheet
+from incremental import incremental_calculate
+from risk import risk_report
+from pool import pool_report
+from portfolio import portfolio_report
+from diff import scenario_diff
+from solver import solve
+from stress import stress_report
+import stream
+from store import results, reports, content_hash
+from spec import LoanSpec, parse_loans, spec_columns
+import singleflight
+from timing import stage
+import timing
+import metrics
+import numpy as np
 import io
 import traceback
 import json
+import time
+import os
+import functools
 
 app = Flask(__name__, 
             template_folder='.',
             static_folder='.',
             static_url_path='')
 
+def current_route():
+    return request.url_rule.rule if request.url_rule else "<unmatched>"
+
+def error_response(e, status=400, **extra):
+    """JSON error body for an exception caught by a route, counted in /metrics"""
+    metrics.record_error(current_route(), e)
+    return jsonify({"error": str(e), **extra}), status
+
+# Bump when engine changes alter results, so cached ETags stop matching
+RESULT_VERSION = "1"
+CACHE_CONTROL = os.environ.get("LOAN_CACHE_CONTROL", "public, no-cache")
+
+def request_spec():
+    """LoanSpec of the current request body, parsed once per request"""
+    if "loan_spec" not in g:
+        g.loan_spec = LoanSpec.from_dict(request.get_json())
+    return g.loan_spec
+
+def conditional(kind, key=None):
+    """ETag a pure calculation route by its request body and answer If-None-Match with 304.
+
+    The tag is computed from the normalized request alone (key(data) when
+    given, e.g. a LoanSpec hash), so a matching request is answered before
+    any amortization runs.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True)
+            if data is None:
+                return view(*args, **kwargs)
+            
+            try:
+                normalized = key(data) if key else data
+            except Exception:
+                # Invalid payloads are left to the view's error handling
+                return view(*args, **kwargs)
+            etag = content_hash(RESULT_VERSION, kind, normalized)[:32]
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = CACHE_CONTROL
+            return response
+        return wrapper
+    return decorator
+
+@app.before_request
+def start_timing():
+    g.timing_token = timing.start_request()
+    g.timing_start = time.perf_counter()
+    g.alloc_baseline = metrics.start_allocation_sample()
+
+@app.after_request
+def add_server_timing(response):
+    route = current_route()
+    elapsed = time.perf_counter() - g.timing_start
+    metrics.record_request(route, request.method, response.status_code, elapsed)
+    metrics.finish_allocation_sample(route, g.pop("alloc_baseline", None))
+    
+    stages = timing.finish_request(g.pop("timing_token", None), route)
+    if stages is not None:
+        timing.histogram(route, "total").observe(elapsed * 1000)
+        stages["total"] = elapsed * 1000
+        response.headers["Server-Timing"] = timing.server_timing_header(stages)
+    return response
+
 @app.route("/")
 def index():
     return render_template("index.html")
 
+def compute_calculation(spec):
+    """Summary, schedule records and visualization data for a LoanSpec"""
+    df, summary = loan_dispatcher(spec, as_frame=False)
+    
+    # For variable rate loans, we need different visualization data
+    with stage("visualization"):
+        if spec.type == "variable":
+            visualization_data = generate_annual_visualization_data(df)
+        else:
+            visualization_data = generate_visualization_data(df)
+    
+    with stage("to_dict"):
+        schedule = schedule_records(df)
+    
+    return summary, schedule, visualization_data
+
 @app.route("/calculate", methods=["POST"])
+@conditional("calculate", key=lambda data: request_spec().hash)
 def calculate():
     try:
-        data = request.json
+        with stage("parse"):
+            data = request.json
         
         # Handle missing or invalid data
         if not data:
             return jsonify({"error": "No data provided"}), 400
             
-        df, summary = loan_dispatcher(data)
+        # Identical concurrent requests share one computation, however the payload spells its values
+        spec = request_spec()
+        key = content_hash("calculate", spec.hash)
+        summary, schedule, visualization_data = singleflight.group("calculate").do(
+            key, lambda: compute_calculation(spec)
+        )
+        metrics.record_schedule_length(current_route(), summary["total_months"])
         
-        # For variable rate loans, we need different visualization data
-        if data.get("type") == "variable":
-            visualization_data = generate_annual_visualization_data(df)
-        else:
-            visualization_data = generate_visualization_data(df)
+        # Keep the result so exports can reference it instead of re-uploading it; payloads
+        # that spell the same spec share the key, so the normalized spec is stored
+        result_id = results.put(key, {
+            "loan_data": spec.to_dict(),
+            "schedule": schedule,
+            "summary": summary
+        })
+        
+        with stage("encode"):
+            return jsonify({
+                "summary": summary,
+                "schedule": schedule,
+                "visualization": visualization_data,
+                "loan_type": spec.type,  # Add loan type to response
+                "result_id": result_id
+            })
+    except Exception as e:
+        return error_response(e, traceback=traceback.format_exc())
+
+@app.route("/calculate/incremental", methods=["POST"])
+def calculate_incremental():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+        
+        with stage("amortization"):
+            columns, summary, recomputed_from = incremental_calculate(data)
+        
+        with stage("to_dict"):
+            schedule = [dict(zip(columns, row)) for row in zip(*columns.values())]
         
         return jsonify({
             "summary": summary,
-            "schedule": df.to_dict(orient="records"),
-            "visualization": visualization_data,
-            "loan_type": data.get("type", "fixed")  # Add loan type to response
+            "schedule": schedule,
+            "recomputed_from": recomputed_from
         })
     except Exception as e:
-        return jsonify({"error": str(e), "traceback": traceback.format_exc()}), 400
+        return error_response(e)
 
 @app.route("/compare", methods=["POST"])
+@conditional("compare")
 def compare():
     try:
         return jsonify(compare_loans(request.json["offers"]))
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return error_response(e)
 
 @app.route("/sensitivity", methods=["POST"])
+@conditional("sensitivity")
 def sensitivity():
     try:
-        return jsonify(sensitivity_analysis(request.json))
+        data = request.json
+        return jsonify(singleflight.group("sensitivity").do(
+            content_hash("sensitivity", data), lambda: sensitivity_analysis(data)
+        ))
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return error_response(e)
 
 @app.route("/affordability", methods=["POST"])
 def affordability_api():
     try:
         return jsonify(affordability(request.json))
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return error_response(e)
 
 @app.route("/refinance", methods=["POST"])
 def refinance():
     try:
         return jsonify(refinancing(request.json))
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return error_response(e)
 
 @app.route("/tax", methods=["POST"])
 def tax():
     try:
         return jsonify(tax_implications(request.json))
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return error_response(e)
 
 @app.route("/prepayment", methods=["POST"])
 def prepayment():
     try:
         data = request.json
+        spec = LoanSpec.from_dict(data, PREPAYMENT_DEFAULTS)
         result = prepayment_scenarios(
-            data.get("principal", 100000),
-            data.get("rate", 5),
-            data.get("years", 30),
+            spec.principal,
+            spec.rate,
+            spec.years,
             data.get("prepayment_amount", 0),
             data.get("prepayment_start", 1),
             data.get("prepayment_frequency", "monthly")
         )
         return jsonify(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return error_response(e)
+
+@app.route("/prepayment/lump_sum", methods=["POST"])
+def lump_sum():
+    try:
+        data = request.json
+        mode = data.get("mode", "recast")
+        loans = data.get("loans")
+        if loans is None and "amounts" not in data:
+            spec = LoanSpec.from_dict(data, PREPAYMENT_DEFAULTS)
+            return jsonify(lump_sum_prepayment(
+                spec.principal,
+                spec.rate,
+                spec.years,
+                float(data.get("lump_sum_amount", 0)),
+                int(data.get("lump_sum_month", 1)),
+                mode
+            ))
+        
+        columns = spec_columns(parse_loans(loans or [data], PREPAYMENT_DEFAULTS))
+        return jsonify(lump_sum_curves(
+            columns["principal"].tolist(),
+            columns["rate"].tolist(),
+            columns["years"].tolist(),
+            [float(a) for a in data.get("amounts", [data.get("lump_sum_amount", 0)])],
+            mode,
+            float(data.get("discount_rate", 0))
+        ))
+    except Exception as e:
+        return error_response(e)
+
+def export_source(data):
+    """(loan_data, schedule, summary, cache key) from a stored result_id or a posted schedule"""
+    result_id = data.get("result_id")
+    if result_id:
+        result = results.get(result_id)
+        if result is None:
+            return None
+        return result["loan_data"], result["schedule"], result["summary"], result_id
+    
+    loan_data = data.get("loan_data", {})
+    schedule = data.get("schedule", data.get("data", []))
+    summary = data.get("summary", {})
+    return loan_data, schedule, summary, content_hash(loan_data, schedule, summary)
+
+def not_found_response():
+    return jsonify({"error": "Result not found or expired"}), 404
 
 @app.route("/export", methods=["POST"])
 def export_csv():
     try:
-        data = request.json.get("data", [])
+        source = export_source(request.json)
+        if source is None:
+            return not_found_response()
+        _, data, _, key = source
         if not data:
             return jsonify({"error": "No data to export"}), 400
-            
-        df = pd.DataFrame(data)
-        buffer = io.StringIO()
-        df.to_csv(buffer, index=False)
-        buffer.seek(0)
+        
+        def render():
+            import pandas as pd
+            df = pd.DataFrame(data)
+            buffer = io.StringIO()
+            df.to_csv(buffer, index=False)
+            return buffer.getvalue().encode()
         
         return send_file(
-            io.BytesIO(buffer.getvalue().encode()),
+            io.BytesIO(reports.get_or_render(("csv", key), render)),
             mimetype="text/csv",
             as_attachment=True,
             download_name="amortization_schedule.csv"
         )
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return error_response(e)
 
 @app.route("/export/html", methods=["POST"])
 def export_html():
     try:
-        data = request.json
-        schedule = data.get("schedule", [])
-        summary = data.get("summary", {})
-        loan_data = data.get("loan_data", {})
+        source = export_source(request.json)
+        if source is None:
+            return not_found_response()
+        loan_data, schedule, summary, key = source
         
         if not schedule:
             return jsonify({"error": "No data to export"}), 400
             
-        html_report = generate_html_report(loan_data, schedule, summary)
+        html_report = reports.get_or_render(
+            ("html", key), lambda: generate_html_report(loan_data, schedule, summary).encode()
+        )
         
         return send_file(
-            io.BytesIO(html_report.encode()),
+            io.BytesIO(html_report),
             mimetype="text/html",
             as_attachment=True,
             download_name="loan_report.html"
         )
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return error_response(e)
 
 @app.route("/export/text", methods=["POST"])
 def export_text():
     try:
-        data = request.json
-        schedule = data.get("schedule", [])
-        summary = data.get("summary", {})
-        loan_data = data.get("loan_data", {})
+        source = export_source(request.json)
+        if source is None:
+            return not_found_response()
+        loan_data, schedule, summary, key = source
         
         if not schedule:
             return jsonify({"error": "No data to export"}), 400
             
-        text_report = generate_text_report(loan_data, schedule, summary)
+        text_report = reports.get_or_render(
+            ("text", key), lambda: generate_text_report(loan_data, schedule, summary).encode()
+        )
         
         return send_file(
-            io.BytesIO(text_report.encode()),
+            io.BytesIO(text_report),
             mimetype="text/plain",
             as_attachment=True,
             download_name="loan_report.txt"
         )
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return error_response(e)
 
 @app.route("/calculate/apr", methods=["POST"])
 def calculate_apr():
     try:
         data = request.json
-        principal = data.get("principal", 0)
-        rate = data.get("rate", 0)
-        years = data.get("years", 0)
-        fees = data.get("fees", 0)
+        # A plain fixed-rate loan: other payload fields (type, extra payments, rounding) don't apply
+        spec = LoanSpec.from_dict({k: data[k] for k in ("principal", "rate", "years", "fees") if k in data},
+                                  {"years": 0})
+        principal, rate, years, fees = spec.principal, spec.rate, spec.years, spec.fees
         
         if not principal or not years:
             return jsonify({"error": "Missing required parameters"}), 400
             
-        df = loan_dispatcher({"type": "fixed", "principal": principal, "rate": rate, "years": years})[0]
-        monthly_payment = df["Payment"].iloc[0] if len(df) > 0 else 0
+        df = loan_dispatcher(spec, as_frame=False)[0]
+        monthly_payment = float(df["Payment"][0]) if len(df["Payment"]) > 0 else 0
         
-        apr = calculate_true_apr(principal, monthly_payment, years * 12, fees)
+        with stage("apr"):
+            apr = calculate_true_apr(principal, monthly_payment, years * 12, fees)
         
         return jsonify({
             "nominal_rate": rate,
@@ -189,16 +388,107 @@ def calculate_apr():
             "fees_impact": round(apr - rate, 3) if apr else 0
         })
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return error_response(e)
+
+@app.route("/quote", methods=["POST"])
+def quote():
+    try:
+        data = request.json
+        sheet = default_sheet()
+        loans = data.get("loans")
+        if loans is None:
+            spec = LoanSpec.from_dict(data)
+            if spec.principal <= 0:
+                raise ValueError("Principal must be greater than 0")
+            if spec.years <= 0:
+                raise ValueError("Years must be greater than 0")
+            return jsonify(sheet.quote(spec.principal, spec.rate, spec.years * 12, spec.fees))
+        
+        columns = spec_columns(parse_loans(loans))
+        for name, label in (("principal", "Principal"), ("years", "Years")):
+            invalid = np.flatnonzero(columns[name] <= 0)
+            if len(invalid):
+                raise ValueError(f"loans[{invalid[0]}]: {label} must be greater than 0")
+        result = sheet.quote_batch(columns["principal"], columns["rate"], columns["years"] * 12, columns["fees"])
+        return jsonify({
+            "monthly_payment": np.round(result["payment"], 2).tolist(),
+            "apr": [round(a, 3) if np.isfinite(a) else None for a in result["apr"].tolist()],
+            "source": [["table", "interpolated", "exact"][s] for s in result["source"].tolist()]
+        })
+    except Exception as e:
+        return error_response(e)
+
+@app.route("/risk", methods=["POST"])
+def risk():
+    try:
+        return jsonify(risk_report(request.json))
+    except Exception as e:
+        return error_response(e)
+
+@app.route("/pool", methods=["POST"])
+def pool():
+    try:
+        return jsonify(pool_report(request.json))
+    except Exception as e:
+        return error_response(e)
+
+@app.route("/portfolio", methods=["POST"])
+def portfolio():
+    try:
+        return jsonify(portfolio_report(request.json))
+    except Exception as e:
+        return error_response(e)
+
+@app.route("/diff", methods=["POST"])
+def diff():
+    try:
+        return jsonify(scenario_diff(request.json))
+    except Exception as e:
+        return error_response(e)
+
+@app.route("/solve", methods=["POST"])
+def solve_api():
+    try:
+        return jsonify(solve(request.json))
+    except Exception as e:
+        return error_response(e)
+
+@app.route("/stress", methods=["POST"])
+def stress():
+    try:
+        return jsonify(stress_report(request.json))
+    except Exception as e:
+        return error_response(e)
+
+@app.route("/stream/<kind>", methods=["POST"])
+def stream_analysis(kind):
+    """Server-Sent Events for long analyses: result rows as they finish, with progress and ETA"""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    if kind not in stream.STREAMS:
+        return jsonify({"error": f"Unknown stream: {kind}"}), 404
+    
+    route = current_route()
+    body = stream.events(kind, data, on_error=lambda e: metrics.record_error(route, e))
+    response = Response(stream_with_context(body), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Keep reverse proxies from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 def generate_visualization_data(df):
     """Generate simple visualization data without matplotlib"""
-    if df.empty:
+    if len(df["Payment"]) == 0:
         return {}
     
 
     # Check if this is annual data (variable rate) or monthly data
-    if 'Year' in df.columns:
+    if 'Year' in df:
         # This is annual data (variable rate loan)
         return generate_annual_visualization_data(df)
     
@@ -225,23 +515,14 @@ def generate_visualization_data(df):
         cumulative_interest.append(ci)
         cumulative_principal.append(cp)
     
-    # Yearly summary
-    yearly_data = []
-    for year in range(1, (len(months) // 12) + 2):
-        start_idx = (year - 1) * 12
-        end_idx = min(year * 12, len(months))
-        
-        if start_idx < len(months):
-            year_interest = sum(interests[start_idx:end_idx])
-            year_principal = sum(principals[start_idx:end_idx])
-            year_end_balance = balances[min(end_idx, len(balances)-1)]
-            
-            yearly_data.append({
-                "year": year,
-                "interest": year_interest,
-                "principal": year_principal,
-                "balance": year_end_balance
-            })
+    # Yearly summary; balance is the one after each year's last payment
+    annual = annual_from_monthly(df, as_frame=False)
+    yearly_data = [
+        {"year": year, "interest": interest, "principal": principal, "balance": balance}
+        for year, interest, principal, balance in zip(
+            annual["Year"].tolist(), annual["Interest"].tolist(), annual["Principal"].tolist(),
+            annual["Balance"].tolist())
+    ]
     
     return {
         "monthly_data": {
@@ -265,7 +546,7 @@ def generate_visualization_data(df):
 
 def generate_annual_visualization_data(df):
     """Generate visualization data for annual loan schedule"""
-    if df.empty:
+    if len(df["Payment"]) == 0:
         return {}
     
     # For variable rate loans, we already have annual data
@@ -0,0 +1,216 @@
+"""Run JSONL files of route-style requests without an HTTP server.
+
+Each input line is one request:
+
+    {"route": "/calculate", "payload": {"principal": 300000, "rate": 6.5, "years": 30}, "id": "loan-1"}
+
+"payload" is the JSON body the route takes; without it, the record's other
+fields (all but "route" and "id") are the body. "route" defaults to
+/calculate. Records go through the app's own routes in-process (Flask test
+client), so validation, defaults and error bodies are exactly the server's.
+Any JSON POST route works except /stream/*.
+
+Output lines follow input order, one per non-blank input line, and carry
+its 1-based line number:
+
+    {"line": 1, "id": "loan-1", "route": "/calculate", "status": 200, "result": {...}}
+
+Failed requests keep the route's status and error body; lines that are not
+valid JSON get status 400 with an error result.
+
+Input is read in chunks of --chunk-size lines, which are spread over a pool
+of --workers processes and written back in order. After each chunk, the
+checkpoint file (default OUTPUT.checkpoint) records the input byte offset and
+the output size. --resume continues from there: the output is cut back to its
+checkpointed size, and the run picks up at the next unprocessed line. A
+throughput report goes to stderr at the end.
+
+Usage:
+    python batch.py INPUT.jsonl -o OUTPUT.jsonl [--workers N] [--chunk-size N] [--resume]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+CHUNK_SIZE = 1000
+DEFAULT_ROUTE = "/calculate"
+
+_client = None
+
+def _test_client():
+    global _client
+    if _client is None:
+        from app import app
+        app.json.compact = True
+        _client = app.test_client()
+    return _client
+
+def parse_record(line):
+    """(route, body, id) of one input line (str or UTF-8 bytes)"""
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("Each line must be a JSON object")
+    route = record.get("route", DEFAULT_ROUTE)
+    if not isinstance(route, str) or not route.startswith("/") or route.startswith("/stream"):
+        raise ValueError(f"Unsupported route: {route}")
+    if "payload" in record:
+        body = record["payload"]
+    else:
+        body = {k: v for k, v in record.items() if k not in ("route", "id")}
+    return route, body, record.get("id")
+
+def run_record(line_number, line):
+    """One output line (without newline) and (route, status, seconds) for one input line"""
+    start = time.perf_counter()
+    route, record_id = None, None
+    try:
+        route, body, record_id = parse_record(line)
+        response = _test_client().post(route, json=body)
+        status = response.status_code
+        result = response.get_data(as_text=True).strip() if response.is_json else json.dumps(
+            {"error": f"{route} did not return JSON"})
+    except ValueError as e:
+        # Malformed lines (JSONDecodeError and UnicodeDecodeError are ValueErrors) answer like a bad request
+        status = 400
+        result = json.dumps({"error": str(e)})
+    head = json.dumps({"line": line_number, "id": record_id, "route": route, "status": status})
+    return f'{head[:-1]}, "result": {result}}}', (route or "<invalid>", status, time.perf_counter() - start)
+
+def _run_chunk(items):
+    return [run_record(n, line) for n, line in items]
+
+def read_chunks(f, chunk_size, offset=0, first_line=1):
+    """(items, end offset, next line number) per chunk of non-blank lines; items are (line number, bytes).
+
+    Offsets are counted from the bytes read, so pipes work too. Lines stay
+    undecoded; run_record turns lines that are not valid UTF-8 into 400 rows.
+    """
+    line_number = first_line
+    items = []
+    for raw in iter(f.readline, b""):
+        offset += len(raw)
+        if raw.strip():
+            items.append((line_number, raw))
+        line_number += 1
+        if len(items) >= chunk_size:
+            yield items, offset, line_number
+            items = []
+    if items:
+        yield items, offset, line_number
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path, state):
+    """Write the checkpoint atomically, so a crash leaves the old or the new one"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class Throughput:
+    """Record, error and per-route timing totals for the final report"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.records = 0
+        self.errors = 0
+        self.routes = {}
+
+    def add(self, route, status, seconds):
+        self.records += 1
+        self.errors += status >= 400
+        count, total = self.routes.get(route, (0, 0.0))
+        self.routes[route] = (count + 1, total + seconds)
+
+    def report(self, workers, resumed_from):
+        elapsed = time.perf_counter() - self.start
+        return {
+            "records": self.records,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 3),
+            "records_per_s": round(self.records / elapsed, 1) if elapsed > 0 else 0,
+            "workers": workers,
+            "resumed_from_line": resumed_from,
+            "routes": {
+                route: {"records": count, "mean_ms": round(total / count * 1000, 3)}
+                for route, (count, total) in sorted(self.routes.items())
+            }
+        }
+
+def run_batch(input_path, output_path=None, workers=1, chunk_size=CHUNK_SIZE, checkpoint_path=None,
+              resume=False):
+    """Process input_path into output_path (default stdout); returns the throughput report"""
+    if checkpoint_path is None and output_path is not None:
+        checkpoint_path = f"{output_path}.checkpoint"
+    state = load_checkpoint(checkpoint_path) if resume and checkpoint_path else None
+    if state is not None and state.get("input") != os.path.abspath(input_path):
+        raise ValueError(f"Checkpoint {checkpoint_path} belongs to {state.get('input')}")
+    state = state or {"input": os.path.abspath(input_path), "offset": 0, "line": 1, "output_size": 0}
+
+    if output_path is None:
+        out = sys.stdout.buffer
+    else:
+        out = open(output_path, "r+b" if state["output_size"] and os.path.exists(output_path) else "wb")
+        # Drop lines written after the last checkpoint; they are produced again
+        out.truncate(state["output_size"])
+        out.seek(state["output_size"])
+
+    stats = Throughput()
+    resumed_from = state["line"]
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        with open(input_path, "rb") as f:
+            if state["offset"]:
+                f.seek(state["offset"])
+            for items, offset, next_line in read_chunks(f, chunk_size, state["offset"], state["line"]):
+                if pool is None:
+                    rows = _run_chunk(items)
+                else:
+                    # A few slices per worker balances uneven records without per-line IPC
+                    step = max(len(items) // (workers * 4), 1)
+                    slices = [items[i:i + step] for i in range(0, len(items), step)]
+                    rows = [row for part in pool.map(_run_chunk, slices) for row in part]
+                data = "".join(f"{line}\n" for line, _ in rows).encode()
+                out.write(data)
+                out.flush()
+                for _, timing in rows:
+                    stats.add(*timing)
+                if checkpoint_path:
+                    state.update(offset=offset, line=next_line, output_size=state["output_size"] + len(data))
+                    save_checkpoint(checkpoint_path, state)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if output_path is not None:
+            out.close()
+    return stats.report(workers, resumed_from)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of route-style loan requests")
+    parser.add_argument("input", help="JSONL file, one request per line")
+    parser.add_argument("-o", "--output", help="JSONL results file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="lines read and written at a time")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint")
+    args = parser.parse_args(argv)
+    if args.resume and not (args.output or args.checkpoint):
+        parser.error("--resume needs --output or --checkpoint")
+
+    report = run_batch(args.input, args.output, max(args.workers, 1), max(args.chunk_size, 1),
+                       args.checkpoint, args.resume)
+    json.dump(report, sys.stderr, indent=2)
+    print(file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""Performance tracking for the loan calculator.
+
+Usage:
+    python bench.py imports [--output FILE] [--repeat N]
+    python bench.py run [--output FILE] [--filter TEXT] [--max-batch N] [--quick]
+    python bench.py compare BASELINE CURRENT [--threshold PCT]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = ["loans", "prepayment", "analysis", "documentation", "visualization", "app"]
+
+def measure_import_time(module, repeat=5):
+    """Best-of-N cold import time of a module in a fresh interpreter, in milliseconds"""
+    timings = []
+    pandas_loaded = False
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c",
+             f"import sys, {module}; print('pandas' in sys.modules)"],
+            cwd=HERE, capture_output=True, text=True, check=True
+        )
+        pandas_loaded = result.stdout.strip() == "True"
+
+        # The last line of -X importtime output is the requested module itself
+        for line in reversed(result.stderr.splitlines()):
+            parts = [p.strip() for p in line.split("|")]
+            if len(parts) == 3 and parts[2] == module:
+                timings.append(int(parts[1]) / 1000)
+                break
+
+    return {
+        "module": module,
+        "best_ms": round(min(timings), 2) if timings else None,
+        "median_ms": round(sorted(timings)[len(timings) // 2], 2) if timings else None,
+        "pandas_loaded": pandas_loaded
+    }
+
+def run_imports(args):
+    results = [measure_import_time(m, args.repeat) for m in MODULES]
+    report = {
+        "kind": "imports",
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "results": results
+    }
+
+    for r in results:
+        best = "n/a" if r["best_ms"] is None else f"{r['best_ms']:.2f}"
+        print(f"{r['module']:15s} {best:>9s} ms   pandas loaded: {r['pandas_loaded']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+# ---------- ENGINE / ROUTE BENCHMARKS ----------
+TERMS = [1, 5, 10, 15, 20, 30, 40, 50]
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000, 1000000]
+QUICK_TERMS = [1, 30, 50]
+
+ROUTE_PAYLOADS = {
+    "/calculate": {"type": "fixed", "principal": 300000, "rate": 6.5, "years": 30, "fees": 2500},
+    "/calculate/apr": {"principal": 300000, "rate": 6.5, "years": 30, "fees": 2500},
+    "/compare": {"offers": [
+        {"name": "A", "principal": 300000, "rate": 6.5, "years": 30},
+        {"name": "B", "principal": 300000, "rate": 5.9, "years": 15}
+    ]},
+    "/sensitivity": {"principal": 300000, "rate": 6.5, "years": 30},
+    "/affordability": {"income": 9000, "debts": 600, "payment": 2200},
+    "/refinance": {"remaining_balance": 250000, "old_rate": 7, "remaining_years": 27, "new_rate": 6, "new_years": 30},
+    "/tax": {"annual_interest": 18000, "tax_rate": 24, "property_tax": 5000},
+    "/prepayment": {"principal": 300000, "rate": 6.5, "years": 30, "prepayment_amount": 250,
+                    "prepayment_start": 1, "prepayment_frequency": "all"},
+    "/calculate/incremental": {"session_id": "bench", "principal": 300000, "rate": 6.5, "years": 30,
+                               "extra_payments": {"240": 5000}},
+    "/quote": {"loans": [{"principal": 300000, "rate": 6.5, "years": 30, "fees": 2500},
+                         {"principal": 412345, "rate": 6.37, "years": 25}]},
+    "/prepayment/lump_sum": {"loans": [{"principal": 300000, "rate": 6.5, "years": 30},
+                                       {"principal": 200000, "rate": 5.5, "years": 15}],
+                             "amounts": [10000, 50000], "discount_rate": 4},
+    "/pool": {"loans": [{"principal": 300000, "rate": 6.5, "years": 30, "age": 12},
+                        {"balance": 180000, "rate": 5.25, "remaining_months": 200, "age": 160}],
+              "scenarios": [{"cpr": 6}, {"psa": 100}, {"psa": 300}]},
+    "/solve": {"solve_for": "rate", "principal": [300000, 250000, 400000], "payment": [1896.2, 1700, 2600],
+               "years": 30},
+    "/stress": {"loans": [
+        {"type": "fixed", "principal": 300000, "rate": 6.5, "years": 30, "monthly_income": 9000},
+        {"type": "interest_only", "principal": 450000, "rate": 5.75, "years": 30, "interest_only_years": 10,
+         "monthly_income": 12000, "monthly_debts": 800},
+        {"type": "balloon", "principal": 200000, "rate": 7.25, "years": 7, "balloon": 40, "monthly_income": 7000},
+        {"type": "variable", "principal": 250000, "rates": "4.5,5,5.5,6", "years": 20, "monthly_income": 8000}
+    ]},
+    "/risk": {"loans": [loan for years in (10, 30)
+                        for loan in ({"type": "fixed", "principal": 300000, "rate": 6.5, "years": years},
+                                     {"type": "interest_only", "principal": 300000, "rate": 6.5, "years": years,
+                                      "interest_only_years": 5},
+                                     {"type": "balloon", "principal": 300000, "rate": 6.5, "years": years,
+                                      "balloon": 25})]},
+    "/portfolio": {"loans": [
+        {"type": "fixed", "principal": 300000, "rate": 6.5, "years": 30, "age": 24, "vintage": 2022},
+        {"type": "interest_only", "principal": 450000, "rate": 5.75, "years": 30, "interest_only_years": 10,
+         "age": 60, "vintage": 2019},
+        {"type": "balloon", "principal": 200000, "rate": 7.25, "years": 7, "balloon": 40, "age": 12, "vintage": 2023},
+        {"type": "variable", "principal": 250000, "rates": "4.5,5,5.5,6", "years": 20, "age": 30, "vintage": 2021}
+    ], "discount_rate": 6},
+    "/diff": {"loan": {"principal": 300000, "rate": 6.5, "years": 30}, "scenarios": [
+        {"name": "current"},
+        {"name": "prepay", "extra_payments": [{"month": 1, "amount": 200, "every": 1}]},
+        {"name": "refinance", "rate": 5.5, "fees": 6000}
+    ]}
+}
+
+def loan_spec(loan_type, years, principal=250000, rate=6.0):
+    """Representative request payload for a loan type and term"""
+    spec = {"type": loan_type, "principal": principal, "rate": rate, "years": years}
+    if loan_type == "variable":
+        spec["rates"] = ",".join(str(rate + 0.25 * (i % 4)) for i in range(years))
+    elif loan_type == "interest_only":
+        spec["interest_only_years"] = max(years // 3, 1) if years > 1 else 1
+    elif loan_type == "balloon":
+        spec["balloon"] = 25
+    return spec
+
+def engine_cases(terms):
+    """(name, params, callable) for every engine across loan terms"""
+    from loans import (amortization_fixed, amortization_variable, amortization_interest_only,
+                       amortization_balloon, loan_dispatcher)
+    from prepayment import prepayment_scenarios
+    from app import generate_visualization_data
+
+    cases = []
+    for years in terms:
+        rates = ",".join(["6", "6.5", "7"])
+        io_years = max(years // 3, 1)
+        cases.append(("amortization_fixed", {"years": years},
+                      lambda y=years: amortization_fixed(250000, 6, y, as_frame=False)))
+        cases.append(("amortization_variable", {"years": years},
+                      lambda y=years: amortization_variable(250000, rates, y, as_frame=False)))
+        cases.append(("amortization_interest_only", {"years": years},
+                      lambda y=years, i=io_years: amortization_interest_only(250000, 6, y, i, as_frame=False)))
+        cases.append(("amortization_balloon", {"years": years},
+                      lambda y=years: amortization_balloon(250000, 6, y, 25, as_frame=False)))
+        cases.append(("prepayment_scenarios", {"years": years},
+                      lambda y=years: prepayment_scenarios(250000, 6, y, 200, 1, "all")))
+
+        schedule = amortization_fixed(250000, 6, years, as_frame=False)
+        cases.append(("generate_visualization_data", {"years": years},
+                      lambda s=schedule: generate_visualization_data(s)))
+
+        for loan_type in ["fixed", "variable", "interest_only", "balloon"]:
+            spec = loan_spec(loan_type, years)
+            cases.append(("loan_dispatcher", {"type": loan_type, "years": years},
+                          lambda s=spec: loan_dispatcher(s, as_frame=False)))
+            cases.append(("loan_dispatcher_frame", {"type": loan_type, "years": years},
+                          lambda s=spec: loan_dispatcher(s)))
+            annual = {**spec, "schedule": "annual"}
+            cases.append(("loan_dispatcher_annual", {"type": loan_type, "years": years},
+                          lambda s=annual: loan_dispatcher(s, as_frame=False)))
+
+        # Irregular plan: yearly bonus, monthly top-ups for two years, a skipped month
+        events = {**loan_spec("fixed", years), "start_date": "2025-01-01", "extra_payments": [
+            {"date": "2025-03-01", "amount": 5000, "every": 12},
+            {"date": "2025-01-01", "amount": 100, "every": 1, "until": "2026-12-01"},
+            {"month": min(18, years * 12), "skip": True}
+        ]}
+        cases.append(("loan_dispatcher_events", {"years": years},
+                      lambda s=events: loan_dispatcher(s, as_frame=False)))
+    return cases
+
+def incremental_cases():
+    """Late-month edits on 30 and 40 year loans: incremental update vs full rebuild"""
+    from incremental import IncrementalSchedule
+
+    cases = []
+    for years in [30, 40]:
+        base = {"principal": 300000, "rate": 6.5, "years": years}
+        for month in [12, years * 6, years * 12 - 24]:
+            schedule = IncrementalSchedule()
+            schedule.update(base)
+            amounts = iter(range(1 << 30))
+            cases.append(("incremental_edit", {"years": years, "month": month},
+                          lambda s=schedule, m=month, a=amounts:
+                          s.update({**base, "extra_payments": {m: next(a) % 1000}})))
+            cases.append(("incremental_full", {"years": years, "month": month},
+                          lambda m=month: IncrementalSchedule().update({**base, "extra_payments": {m: 500}})))
+    return cases
+
+def batch_cases(max_batch):
+    """(name, params, callable) over batch sizes; scalar engines are capped at max_batch loans"""
+    import numpy as np
+    from loans import pmt, loan_dispatcher, annual_totals
+    from cents import amortize_cents
+    from ratesheet import RateSheet
+    from pool import pool_cashflows
+    from portfolio import loan_analytics
+
+    cases = []
+    sheet = RateSheet.build()
+    rng = np.random.default_rng(0)
+    for size in BATCH_SIZES:
+        principal = rng.uniform(50000, 1000000, size)
+        rate = rng.uniform(2, 10, size) / 1200
+        n = rng.choice([120, 180, 240, 360], size)
+        cases.append(("pmt_vectorized", {"batch": size},
+                      lambda r=rate, k=n, p=principal: pmt(r, k, p)))
+        grid_rate = rng.integers(8, 100, size) * 0.125
+        cases.append(("ratesheet_quote", {"batch": size},
+                      lambda r=grid_rate, k=n, p=principal: sheet.quote_batch(p, r, k)))
+        book = {"type": rng.choice([0, 2, 3], size).astype(np.int8), "principal": principal, "rate": rate * 1200,
+                "years": n // 12, "interest_only_years": np.full(size, 5), "balloon": np.full(size, 20.0),
+                "age": rng.integers(0, 120, size)}
+        cases.append(("portfolio_analytics", {"batch": size}, lambda b=book: loan_analytics(b)))
+        cases.append(("annual_totals", {"batch": size},
+                      lambda r=rate, k=n, p=principal: annual_totals(p, r * 1200, k // 12)))
+        if size <= 10000:
+            # loans x periods int64 outputs; larger batches are memory bound
+            cases.append(("amortize_cents", {"batch": size},
+                          lambda r=rate, k=n, p=principal: amortize_cents(p, r * 1200, k)))
+            age = rng.integers(0, 60, size)
+            cases.append(("pool_cashflows", {"batch": size},
+                          lambda r=rate, k=n, p=principal, a=age: pool_cashflows(
+                              p, r * 1200, k, a, [{"cpr": 6}, {"psa": 100}, {"psa": 300}])))
+
+        if size <= max_batch:
+            specs = [loan_spec("fixed", int(k) // 12, float(p), float(r) * 1200)
+                     for p, r, k in zip(principal, rate, n)]
+            cases.append(("loan_dispatcher_batch", {"batch": size},
+                          lambda s=specs: [loan_dispatcher(x, as_frame=False) for x in s]))
+    return cases
+
+def route_cases():
+    """(name, params, callable) for every Flask route through the test client"""
+    from app import app
+    from store import reports
+
+    client = app.test_client()
+    cases = [("route", {"path": "/", "method": "GET"}, lambda: client.get("/"))]
+    for path, payload in ROUTE_PAYLOADS.items():
+        cases.append(("route", {"path": path, "method": "POST"},
+                      lambda p=path, d=payload: client.post(p, json=d)))
+
+    schedule = client.post("/calculate", json=ROUTE_PAYLOADS["/calculate"]).get_json()
+    export = {"schedule": schedule["schedule"], "summary": schedule["summary"],
+              "loan_data": ROUTE_PAYLOADS["/calculate"]}
+    cases.append(("route", {"path": "/export", "method": "POST"},
+                  lambda: client.post("/export", json={"data": schedule["schedule"]})))
+    cases.append(("route", {"path": "/export/html", "method": "POST"},
+                  lambda: client.post("/export/html", json=export)))
+    cases.append(("route", {"path": "/export/text", "method": "POST"},
+                  lambda: client.post("/export/text", json=export)))
+    by_id = {"result_id": schedule["result_id"]}
+    for path in ["/export", "/export/html", "/export/text"]:
+        # Clear rendered reports so every sample renders, not just the first
+        cases.append(("route", {"path": path, "method": "POST", "by": "result_id"},
+                      lambda p=path: (reports.clear(), client.post(p, json=by_id))))
+    return cases
+
+def time_case(fn, min_time=0.2, repeat=5):
+    """Best and median per-call time in milliseconds, auto-scaling the loop count"""
+    fn()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeat or number >= 1 << 20:
+            break
+        number *= 2
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+
+    return {
+        "best_ms": min(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "number": number,
+        "repeat": repeat
+    }
+
+def case_key(result):
+    params = ",".join(f"{k}={result['params'][k]}" for k in sorted(result["params"]))
+    return f"{result['name']}[{params}]"
+
+def run_benchmarks(args):
+    terms = QUICK_TERMS if args.quick else TERMS
+    max_batch = min(args.max_batch, 100) if args.quick else args.max_batch
+    cases = engine_cases(terms) + incremental_cases() + batch_cases(max_batch) + route_cases()
+
+    results = []
+    for name, params, fn in cases:
+        result = {"name": name, "params": params}
+        if args.filter and args.filter not in case_key(result):
+            continue
+        result.update(time_case(fn, args.min_time, args.repeat))
+        results.append(result)
+        print(f"{case_key(result):60s} {result['best_ms']:12.4f} ms")
+
+    report = {
+        "kind": "run",
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+def compare_reports(baseline, current, threshold):
+    """Per-case change between two run reports; regressions exceed threshold percent"""
+    base = {case_key(r): r for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        key = case_key(r)
+        if key not in base:
+            continue
+        old, new = base[key]["best_ms"], r["best_ms"]
+        change = (new / old - 1) * 100 if old > 0 else 0
+        rows.append({
+            "case": key,
+            "baseline_ms": old,
+            "current_ms": new,
+            "change_pct": round(change, 1),
+            "regression": change > threshold
+        })
+    return rows
+
+def run_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows = compare_reports(baseline, current, args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['case']:60s} {row['baseline_ms']:10.4f} -> {row['current_ms']:10.4f} ms "
+              f"{row['change_pct']:+7.1f}% {flag}")
+
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\n{len(rows)} cases compared, {len(regressions)} regressions above {args.threshold}%")
+    return 1 if regressions else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Loan calculator performance tracking")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imports = sub.add_parser("imports", help="measure cold import time of each module")
+    imports.add_argument("--output", help="write results as JSON to this file")
+    imports.add_argument("--repeat", type=int, default=5)
+    imports.set_defaults(func=run_imports)
+
+    run = sub.add_parser("run", help="time engines, batch sizes and Flask routes")
+    run.add_argument("--output", help="write results as JSON to this file")
+    run.add_argument("--filter", help="only run cases whose key contains this text")
+    run.add_argument("--max-batch", type=int, default=100,
+                     help="largest batch for scalar engines (vectorized cases always run to 1M)")
+    run.add_argument("--min-time", type=float, default=0.2, help="target seconds per case")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--quick", action="store_true", help="a reduced grid for smoke runs")
+    run.set_defaults(func=run_benchmarks)
+
+    compare = sub.add_parser("compare", help="flag regressions against a baseline run")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=10.0, help="percent slowdown to flag")
+    compare.set_defaults(func=run_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
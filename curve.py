@@ -0,0 +1,153 @@
+"""Index forward curves for variable-rate loans.
+
+A curve is a set of tenor points (years) and index rates (%), interpolated
+linearly or with a monotone cubic (Fritsch-Carlson) that never overshoots
+between points, and held flat beyond the first and last tenor. Curves are
+built once per distinct spec and cached by content hash; each curve also
+caches its rates at annual reset times, so loans sharing a curve share one
+interpolated vector.
+
+A variable loan can then price off the curve instead of a literal rate list:
+
+    {"type": "variable", "principal": 250000, "years": 30,
+     "index": {"tenors": [0.25, 1, 2, 5, 10, 30], "rates": [5.3, 5.0, 4.6, 4.2, 4.3, 4.5],
+               "method": "monotone_cubic"},
+     "margin": 2.25, "floor": 3, "cap": 11, "periodic_cap": 2}
+
+Rate for reset year t = index(t) + margin, limited to periodic_cap points of
+change per reset and to [floor, cap] over the life of the loan.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from store import content_hash
+
+METHODS = ("linear", "monotone_cubic")
+MAX_CURVES = 64
+
+def _monotone_slopes(x, y):
+    """Fritsch-Carlson tangents for monotone cubic Hermite interpolation"""
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    slopes = np.empty_like(y)
+    slopes[0], slopes[-1] = delta[0], delta[-1]
+    slopes[1:-1] = (delta[:-1] + delta[1:]) / 2
+    # Flat at local extrema and where the secant changes sign
+    turning = delta[:-1] * delta[1:] <= 0
+    slopes[1:-1][turning] = 0
+    flat = delta == 0
+    slopes[:-1][flat] = 0
+    slopes[1:][flat] = 0
+
+    # Scale tangents back into the monotonicity region alpha^2 + beta^2 <= 9
+    with np.errstate(divide="ignore", invalid="ignore"):
+        alpha = slopes[:-1] / delta
+        beta = slopes[1:] / delta
+    radius = np.hypot(alpha, beta)
+    over = ~flat & (radius > 3)
+    tau = np.where(over, 3 / np.where(over, radius, 1), 1)
+    slopes[:-1] = np.where(over, tau * alpha * delta, slopes[:-1])
+    slopes[1:] = np.where(over, tau * beta * delta, slopes[1:])
+    return slopes
+
+class ForwardCurve:
+    """Index rates (%) by tenor (years) with linear or monotone cubic interpolation"""
+
+    def __init__(self, tenors, rates, method="linear"):
+        if method not in METHODS:
+            raise ValueError(f"Invalid interpolation method: {method}")
+        tenors = np.asarray(tenors, dtype=float)
+        rates = np.asarray(rates, dtype=float)
+        if tenors.ndim != 1 or tenors.shape != rates.shape or len(tenors) == 0:
+            raise ValueError("Curve needs matching, non-empty tenors and rates")
+        order = np.argsort(tenors)
+        self.tenors = tenors[order]
+        self.rates = rates[order]
+        if (np.diff(self.tenors) <= 0).any():
+            raise ValueError("Curve tenors must be distinct")
+        self.method = method
+        self.slopes = None
+        if method == "monotone_cubic" and len(tenors) > 2:
+            self.slopes = _monotone_slopes(self.tenors, self.rates)
+        self._resets = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, t):
+        """Index rate (%) at times t (years), flat beyond the curve"""
+        t = np.clip(np.asarray(t, dtype=float), self.tenors[0], self.tenors[-1])
+        if self.slopes is None:
+            return np.interp(t, self.tenors, self.rates)
+
+        i = np.clip(np.searchsorted(self.tenors, t, side="right") - 1, 0, len(self.tenors) - 2)
+        h = self.tenors[i + 1] - self.tenors[i]
+        s = (t - self.tenors[i]) / h
+        h00 = (1 + 2 * s) * (1 - s) ** 2
+        h10 = s * (1 - s) ** 2
+        h01 = s ** 2 * (3 - 2 * s)
+        h11 = s ** 2 * (s - 1)
+        return (h00 * self.rates[i] + h10 * h * self.slopes[i]
+                + h01 * self.rates[i + 1] + h11 * h * self.slopes[i + 1])
+
+    def annual_resets(self, years):
+        """Index rates at t = 0, 1, .., years - 1, computed once per length (read-only)"""
+        with self._lock:
+            resets = self._resets.get(years)
+            if resets is None:
+                resets = self(np.arange(years, dtype=float))
+                resets.flags.writeable = False
+                self._resets[years] = resets
+            return resets
+
+_curves = OrderedDict()
+_curves_lock = threading.Lock()
+
+def curve_from_spec(spec):
+    """Cached ForwardCurve for {"tenors": [...], "rates": [...], "method": ...}"""
+    tenors = [float(t) for t in spec.get("tenors", [])]
+    rates = [float(r) for r in spec.get("rates", [])]
+    method = spec.get("method", "linear")
+    key = content_hash("curve", tenors, rates, method)
+    with _curves_lock:
+        curve = _curves.get(key)
+        if curve is not None:
+            _curves.move_to_end(key)
+            return curve
+    curve = ForwardCurve(tenors, rates, method)
+    with _curves_lock:
+        curve = _curves.setdefault(key, curve)
+        while len(_curves) > MAX_CURVES:
+            _curves.popitem(last=False)
+    return curve
+
+def indexed_rates(curve, years, margin, floor=None, cap=None, periodic_cap=None):
+    """Annual rates (%) of loans priced at index + margin, shape (loans, years).
+
+    margin, floor, cap and periodic_cap may be scalars or per-loan arrays.
+    """
+    margin = np.atleast_1d(np.asarray(margin, dtype=float))
+
+    def per_loan(value, default):
+        value = default if value is None else value
+        return np.broadcast_to(np.asarray(value, dtype=float), margin.shape)[:, None]
+
+    rates = curve.annual_resets(int(years))[None, :] + margin[:, None]
+    rates = np.clip(rates, per_loan(floor, -np.inf), per_loan(cap, np.inf))
+    if periodic_cap is not None:
+        # Each reset moves at most periodic_cap from the previous one; both
+        # ends are within [floor, cap] already, so the result stays inside too
+        limit = per_loan(periodic_cap, np.inf)[:, 0]
+        for t in range(1, rates.shape[1]):
+            rates[:, t] = np.clip(rates[:, t], rates[:, t - 1] - limit, rates[:, t - 1] + limit)
+    return rates
+
+def loan_rates(data, years):
+    """Annual rate list (%) for a variable loan payload that specifies an index curve"""
+    def optional(name):
+        value = data.get(name)
+        return None if value is None or value == "" else float(value)
+
+    curve = curve_from_spec(data["index"])
+    return indexed_rates(curve, years, float(data.get("margin", 0)), optional("floor"),
+                         optional("cap"), optional("periodic_cap"))[0].tolist()
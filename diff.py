@@ -0,0 +1,146 @@
+"""Scenario diffs: several loans on one aligned period axis.
+
+Each scenario is a /calculate-style loan; "loan" gives fields they share, so
+"with vs without prepayment" is one loan and two scenarios that differ only
+in "extra_payments". Scenarios are laid out as (scenarios, periods) arrays:
+when every scenario is a fixed, interest-only or balloon loan without
+payment events or cents rounding they come from loans.period_totals in one
+batched closed-form pass, otherwise all of them come from loan_dispatcher. Loans that end early are padded with zero payments
+and their final balance.
+
+Against the baseline scenario (default: the first) every other scenario gets
+per-period deltas (scenario - baseline) in payment, interest and balance, and
+cumulative savings: the baseline's fees plus payments to date less the
+scenario's. A crossover is a period where savings change sign ("ahead" when
+the scenario becomes cheaper to date, "behind" when it stops being).
+
+"period" is "month" (default) or "year"; variable loans have yearly schedules
+and need "year". The output is columnar, one list per series.
+"""
+import numpy as np
+
+from loans import annual_from_monthly, loan_dispatcher, period_totals
+from spec import LoanSpec
+
+PERIODS = {"month": 1, "year": 12}
+SERIES = ("payment", "interest", "balance")
+
+def parse_scenarios(data):
+    """Names and LoanSpecs of a /diff payload's scenarios"""
+    scenarios = data.get("scenarios") or []
+    if len(scenarios) < 2:
+        raise ValueError("At least two scenarios are required")
+    names, specs = [], []
+    for i, item in enumerate(scenarios):
+        try:
+            spec = LoanSpec.from_dict(item, data.get("loan"))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"scenarios[{i}]: {e}") from e
+        if spec.principal <= 0:
+            raise ValueError(f"scenarios[{i}]: Principal must be greater than 0")
+        if spec.years <= 0:
+            raise ValueError(f"scenarios[{i}]: Years must be greater than 0")
+        # The diff sets the period axis
+        spec.schedule = None
+        names.append(item.get("name") or f"Scenario {i + 1}")
+        specs.append(spec)
+    return names, specs
+
+def _closed_form(spec):
+    return spec.type != "variable" and spec.extra_payments is None and not spec.rounding
+
+def scenario_series(specs, period="month"):
+    """(scenarios, periods) payment, interest and balance arrays on one period axis"""
+    months_per_period = PERIODS[period]
+    if period == "month" and any(s.type == "variable" for s in specs):
+        raise ValueError('Variable loans have yearly schedules; use "period": "year"')
+
+    rows = {}
+    # One source per diff: closed-form and engine rows round differently, and
+    # mixing them would show cent-level deltas between identical loans
+    batch = list(range(len(specs))) if all(_closed_form(s) for s in specs) else []
+    if batch:
+        totals = period_totals(
+            [specs[i].principal for i in batch],
+            [specs[i].rate for i in batch],
+            [specs[i].years for i in batch],
+            [min(specs[i].interest_only_years, specs[i].years) * 12 if specs[i].type == "interest_only" else 0
+             for i in batch],
+            [specs[i].balloon / 100 if specs[i].type == "balloon" else 0.0 for i in batch],
+            months_per_period
+        )
+        # Cent-rounded like engine rows, so both sources total alike
+        totals["balance"] = np.maximum(totals["balance"], 0)
+        for row, i in enumerate(batch):
+            rows[i] = {name: np.round(totals[name][row], 2) for name in SERIES}
+
+    for i, spec in enumerate(specs):
+        if i in rows:
+            continue
+        schedule, _ = loan_dispatcher(spec, as_frame=False)
+        if period == "year" and spec.type != "variable":
+            schedule = annual_from_monthly(schedule, as_frame=False)
+        rows[i] = {name: np.asarray(schedule[name.capitalize()], dtype=float) for name in SERIES}
+
+    n_periods = max(len(rows[i]["payment"]) for i in rows)
+    series = {name: np.zeros((len(specs), n_periods)) for name in SERIES}
+    for i, row in rows.items():
+        n = len(row["payment"])
+        series["payment"][i, :n] = row["payment"][:n_periods]
+        series["interest"][i, :n] = row["interest"][:n_periods]
+        series["balance"][i, :n] = row["balance"][:n_periods]
+        series["balance"][i, n:] = row["balance"][-1] if n else specs[i].principal
+    return series
+
+def crossovers(savings, opening):
+    """Periods (1-based) where cumulative savings change sign, starting from opening savings"""
+    ahead = np.concatenate(([opening > 0], savings > 0))
+    changed = np.flatnonzero(ahead[1:] != ahead[:-1]) + 1
+    return [{"period": int(p), "direction": "ahead" if ahead[p] else "behind"} for p in changed]
+
+def _values(values):
+    return np.round(values, 2).tolist()
+
+def scenario_diff(data):
+    """Per-period series, deltas against the baseline and savings crossovers for a /diff payload"""
+    period = data.get("period", "month")
+    if period not in PERIODS:
+        raise ValueError(f"Invalid period: {period}")
+    names, specs = parse_scenarios(data)
+    baseline = int(data.get("baseline", 0))
+    if not 0 <= baseline < len(specs):
+        raise ValueError(f"Invalid baseline: {baseline}")
+
+    series = scenario_series(specs, period)
+    fees = np.array([s.fees for s in specs])
+    cost = fees[:, None] + np.cumsum(series["payment"], axis=1)
+    savings = np.round(cost[baseline] - cost, 2)
+    deltas = {name: series[name] - series[name][baseline] for name in SERIES}
+
+    results = []
+    for i, (label, spec) in enumerate(zip(names, specs)):
+        paid = series["payment"][i]
+        result = {
+            "name": label,
+            "loan": spec.to_dict(),
+            "summary": {
+                "total_paid": round(float(paid.sum()), 2),
+                "total_interest": round(float(series["interest"][i].sum()), 2),
+                "fees": spec.fees,
+                "payoff_period": int(np.flatnonzero(paid > 0)[-1]) + 1 if (paid > 0).any() else 0
+            },
+            **{name: _values(series[name][i]) for name in SERIES}
+        }
+        if i != baseline:
+            result.update({f"delta_{name}": _values(deltas[name][i]) for name in SERIES})
+            result["cumulative_savings"] = _values(savings[i])
+            result["crossovers"] = crossovers(savings[i], fees[baseline] - fees[i])
+            result["summary"]["total_savings"] = round(float(savings[i][-1]), 2)
+        results.append(result)
+
+    return {
+        "period": period,
+        "periods": list(range(1, series["payment"].shape[1] + 1)),
+        "baseline": baseline,
+        "scenarios": results
+    }
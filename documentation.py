@@ -1,5 +1,4 @@
 import io
-import pandas as pd
 from datetime import datetime
 
 def generate_html_report(loan_data, schedule, summary):
@@ -335,6 +334,8 @@ Report generated by Advanced Loan Calculator
 
 def generate_csv_report(loan_data, schedule, summary):
     """Generate CSV report - simple wrapper for DataFrame"""
+    import pandas as pd
+    
     df = pd.DataFrame(schedule)
     
     # Add summary information as a separate DataFrame
@@ -0,0 +1,82 @@
+"""Sparse, dated extra-payment events merged onto a schedule's period grid.
+
+An event is a dict with an amount and either a date or a 1-based month:
+
+    {"date": "2025-03-15", "amount": 5000}
+    {"month": 14, "amount": 250}
+    {"date": "2025-03", "amount": 5000, "every": 12, "count": 10}   yearly bonus
+    {"date": "2025-01", "amount": 100, "every": 1, "until": "2026-12"}
+    {"month": 30, "skip": true}                                       missed payment
+
+Dates are placed by calendar month relative to start_date, the date of the
+first payment (period 1). Recurring events repeat every `every` months for
+`count` occurrences, until `until`, or to the end of the term. Skipped periods
+pay nothing and the interest is capitalized. Amounts may be negative for short
+payments.
+
+Expansion and merging are array operations (repeat, bincount), so the cost
+grows with the number of events and the length of the period grid, not with
+their product.
+"""
+import numpy as np
+
+def _month_offsets(dates, start_date):
+    """Calendar months from start_date to each date"""
+    if start_date is None:
+        raise ValueError("start_date is required for dated extra payments")
+    months = np.array(dates, dtype="datetime64[D]").astype("datetime64[M]")
+    return (months - np.datetime64(start_date, "D").astype("datetime64[M]")).astype(np.int64)
+
+def event_months(events, n_months, start_date=None):
+    """Expand events to (month index, amount, skip) arrays, 0-based and sorted by month.
+
+    Occurrences outside the term are dropped.
+    """
+    if not events:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, np.zeros(0), np.zeros(0, dtype=bool)
+
+    dated = [i for i, e in enumerate(events) if e.get("date") is not None]
+    first = np.array([int(e.get("month", 0)) - 1 for e in events], dtype=np.int64)
+    if dated:
+        first[dated] = _month_offsets([events[i]["date"] for i in dated], start_date)
+
+    every = np.array([int(e.get("every", 0)) for e in events], dtype=np.int64)
+    if (every < 0).any():
+        raise ValueError("every must not be negative")
+    count = np.array([int(e.get("count", 1 if e.get("until") is None else 0)) for e in events], dtype=np.int64)
+
+    until = [i for i, e in enumerate(events) if e.get("until") is not None]
+    if until:
+        last = _month_offsets([events[i]["until"] for i in until], start_date)
+        step = np.maximum(every[until], 1)
+        count[until] = np.maximum((last - first[until]) // step + 1, 0)
+    # Recurring events without count or until run to the end of the term
+    open_ended = (every > 0) & np.array([e.get("count") is None and e.get("until") is None for e in events])
+    count[open_ended] = np.maximum((n_months - 1 - first[open_ended]) // every[open_ended] + 1, 0)
+    count = np.where(every > 0, count, np.minimum(count, 1))
+
+    amount = np.array([float(e.get("amount", 0)) for e in events])
+    skip = np.array([bool(e.get("skip", False)) for e in events])
+
+    # Occurrence k of event j falls at first[j] + k * every[j]
+    starts = np.cumsum(count) - count
+    occurrence = np.arange(int(count.sum())) - np.repeat(starts, count)
+    months = np.repeat(first, count) + np.repeat(every, count) * occurrence
+    amounts = np.repeat(amount, count)
+    skips = np.repeat(skip, count)
+
+    inside = (months >= 0) & (months < n_months)
+    order = np.argsort(months[inside], kind="stable")
+    return months[inside][order], amounts[inside][order], skips[inside][order]
+
+def extra_vector(months, amounts, n_periods, months_per_period=1):
+    """Dense extra-payment array over the period grid (amounts in the same period add up)"""
+    periods = np.asarray(months, dtype=np.int64) // months_per_period
+    return np.bincount(periods, weights=amounts, minlength=n_periods)[:n_periods]
+
+def skip_vector(months, skips, n_periods):
+    """Boolean array of skipped periods"""
+    skipped = np.zeros(n_periods, dtype=bool)
+    skipped[np.asarray(months, dtype=np.int64)[np.asarray(skips, dtype=bool)]] = True
+    return skipped
@@ -0,0 +1,191 @@
+"""Incremental schedule recomputation.
+
+A schedule is kept per session. Loans are parsed with LoanSpec (fixed,
+interest-only and balloon; extra_payments take the dated and recurring events
+of events.py), and "rate_changes" ({month: rate} or [{"month": .., "rate": ..}])
+recast the payment over the remaining term from the change month.
+
+Each update lays the loan out as per-month loans.cashflow_kernel inputs
+(rate, interest-only, recast, extra, skip). When they first differ from the
+session's previous inputs at some month, the kernel resumes at the start of
+the KERNEL_BLOCK-period block holding that month (blocks count from the last
+recast), with the balance and level payment in force there; earlier periods
+are reused. A full run anchors its blocks at the same periods, so the result
+is identical to recomputing from scratch.
+
+Invalidation by parameter:
+    principal, years, balloon    whole schedule
+    rate, interest_only_years    from the earliest month whose inputs differ
+    rate_changes                 from the earliest month whose rate differs
+    extra_payments               from the earliest month whose extra or skip differs
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from events import event_months, extra_vector, skip_vector
+from loans import KERNEL_BLOCK, cashflow_kernel, kernel_schedule
+from spec import LoanSpec
+
+MAX_SESSIONS = 256
+INCREMENTAL_TYPES = ("fixed", "interest_only", "balloon")
+PERIOD_INPUTS = ("rates", "io", "recast", "extra", "skip")
+
+def _rate_changes(entries):
+    """{month: rate} from a dict keyed by month or a list of {"month": .., "rate": ..}"""
+    if not entries:
+        return {}
+    items = entries.items() if isinstance(entries, dict) else ((e["month"], e["rate"]) for e in entries)
+    return {int(month): float(rate) for month, rate in items}
+
+def kernel_inputs(data):
+    """LoanSpec and per-month cashflow_kernel inputs of an incremental payload"""
+    spec = LoanSpec.from_dict(data)
+    if spec.type not in INCREMENTAL_TYPES:
+        raise ValueError(f"Incremental schedules are not available for loan type: {spec.type}")
+    if spec.rounding:
+        raise ValueError("Incremental schedules do not support cents rounding")
+    if spec.principal <= 0:
+        raise ValueError("Principal must be greater than 0")
+    if spec.years <= 0:
+        raise ValueError("Years must be greater than 0")
+
+    n = spec.years * 12
+    annual_rate = np.full(n, spec.rate)
+    recast = np.zeros(n, dtype=bool)
+    for month, rate in sorted(_rate_changes(data.get("rate_changes")).items()):
+        if 1 <= month <= n:
+            annual_rate[month - 1:] = rate
+            recast[month - 1] = True
+
+    io_months = min(spec.interest_only_years, spec.years) * 12 if spec.type == "interest_only" else 0
+    if io_months < n:
+        recast[io_months] = True
+    months, amounts, skips = event_months(spec.extra_payments, n, spec.start_date)
+    return spec, {
+        "principal": spec.principal,
+        "balloon": spec.principal * spec.balloon / 100 if spec.type == "balloon" else 0.0,
+        # Interest-only to maturity never repays principal within the schedule
+        "settle": io_months < n,
+        "annual_rate": annual_rate,
+        "rates": annual_rate / 100 / 12,
+        "io": np.arange(n) < io_months,
+        "recast": recast,
+        "extra": extra_vector(months, amounts, n),
+        "skip": skip_vector(months, skips, n)
+    }
+
+def first_affected_month(old, new):
+    """Earliest month whose kernel inputs differ between two payloads (None if identical)"""
+    if (old is None or len(old["rates"]) != len(new["rates"])
+            or any(old[k] != new[k] for k in ("principal", "balloon", "settle"))):
+        return 1
+    changed = np.zeros(len(new["rates"]), dtype=bool)
+    for key in PERIOD_INPUTS:
+        changed |= old[key] != new[key]
+    months = np.flatnonzero(changed)
+    return int(months[0]) + 1 if len(months) else None
+
+class IncrementalSchedule:
+    """Kernel result for one loan, resumed from the first affected block on update"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spec = None
+        self.inputs = None
+        # Unrounded cashflow_kernel arrays
+        self.result = None
+
+    def update(self, data):
+        """Apply a new payload; returns the month recomputation started from (None if nothing changed)"""
+        spec, inputs = kernel_inputs(data)
+        start = first_affected_month(self.inputs, inputs)
+        self.spec, self.inputs = spec, inputs
+        if start is None:
+            return None
+        # Changes after an earlier payoff leave the schedule as it is
+        if start > 1 and start > len(self.result["balance"]):
+            return None
+
+        resume = self._resume_period(start)
+        self._recompute(resume)
+        return resume + 1
+
+    def _resume_period(self, start):
+        """0-based first period of the kernel block holding month start"""
+        recasts = np.flatnonzero(self.inputs["recast"][:start])
+        segment = int(recasts[-1]) if len(recasts) else 0
+        return segment + (start - 1 - segment) // KERNEL_BLOCK * KERNEL_BLOCK
+
+    def _recompute(self, resume):
+        inputs = self.inputs
+        if resume:
+            opening = float(self.result["balance"][resume - 1])
+            # A recast at the resume period computes its own payment
+            payment = None if inputs["recast"][resume] else float(self.result["level"][resume - 1])
+        else:
+            opening, payment = inputs["principal"], None
+
+        tail = cashflow_kernel(opening, inputs["rates"][resume:], io=inputs["io"][resume:],
+                               recast=inputs["recast"][resume:], extra=inputs["extra"][resume:],
+                               balloon=inputs["balloon"], settle=inputs["settle"], skip=inputs["skip"][resume:],
+                               payment=payment)
+        if resume:
+            tail = {name: np.concatenate((values[:resume], tail[name])) for name, values in self.result.items()}
+        self.result = tail
+
+    def columns(self):
+        """Rounded schedule as {column: list}"""
+        n = len(self.result["balance"])
+        schedule = kernel_schedule(self.result, self.inputs["annual_rate"][:n], as_frame=False)
+        if not self.spec.extra_payments:
+            schedule.pop("Extra")
+        return {name: values.tolist() for name, values in schedule.items()}
+
+    def summary(self):
+        result = self.result
+        payments = np.round(result["payment"], 2)
+        first = result["interest"][0] if self.inputs["io"][0] else result["level"][0]
+        return {
+            "total_paid": round(float(payments.sum()), 2),
+            "total_interest": round(float(np.round(result["interest"], 2).sum()), 2),
+            "total_months": len(payments),
+            "monthly_payment": round(float(first), 2) if len(payments) else 0,
+            "months_saved": self.spec.years * 12 - len(payments)
+        }
+
+class SessionStore:
+    """Bounded LRU of IncrementalSchedule objects keyed by session id"""
+
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            schedule = self._sessions.get(session_id)
+            if schedule is None:
+                schedule = self._sessions[session_id] = IncrementalSchedule()
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return schedule
+
+    def __len__(self):
+        return len(self._sessions)
+
+sessions = SessionStore()
+
+def incremental_calculate(data, store=sessions):
+    """Update the session's schedule and return (schedule columns, summary, recomputed_from)"""
+    session_id = data.get("session_id")
+    if session_id is None:
+        raise ValueError("session_id is required")
+    schedule = store.get(str(session_id))
+    # One request at a time per session keeps the cached prefix consistent
+    with schedule.lock:
+        recomputed_from = schedule.update(data)
+        return schedule.columns(), schedule.summary(), recomputed_from
@@ -1,8 +1,48 @@
-import pandas as pd
 import numpy as np
-from numpy_financial import pmt, ipmt, ppmt, npv, irr
 import warnings
-warnings.filterwarnings('ignore')
+from timing import stage
+from cents import amortize_cents, cents_schedule_rows
+from events import event_months, extra_vector, skip_vector
+from curve import curve_from_spec, indexed_rates
+from spec import LoanSpec, parse_rates
+
+# pandas and numpy_financial are imported lazily: the engines below run on
+# plain NumPy and only build a DataFrame when one is actually requested.
+
+SCHEDULE_COLUMNS = ["Month", "Payment", "Interest", "Principal", "Balance", "Annual_Rate"]
+ANNUAL_SCHEDULE_COLUMNS = ["Year", "Payment", "Interest", "Principal", "Balance", "Annual_Rate"]
+
+def pmt(rate, n_periods, pv):
+    """Annuity payment with numpy_financial's sign convention (negative for a positive pv)"""
+    rate = np.asarray(rate, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (1 + rate) ** n_periods
+        payment = np.where(rate == 0, pv / n_periods, pv * rate * growth / (growth - 1))
+    payment = -payment
+    return payment.item() if payment.ndim == 0 else payment
+
+def build_schedule(rows, columns=SCHEDULE_COLUMNS, as_frame=True):
+    """Turn engine rows into a DataFrame, or a dict of NumPy column arrays when as_frame is False"""
+    if as_frame:
+        import pandas as pd
+        return pd.DataFrame(rows, columns=columns)
+    data = np.array(rows, dtype=float).reshape(len(rows), len(columns))
+    schedule = {name: data[:, i] for i, name in enumerate(columns)}
+    schedule[columns[0]] = schedule[columns[0]].astype(np.int64)
+    return schedule
+
+def schedule_frame(schedule):
+    """DataFrame view of a schedule given as a dict of column arrays"""
+    import pandas as pd
+    return pd.DataFrame(schedule)
+
+def schedule_records(schedule):
+    """Row records for a schedule given as a DataFrame or a dict of column arrays"""
+    if hasattr(schedule, "to_dict") and not isinstance(schedule, dict):
+        return schedule.to_dict(orient="records")
+    columns = list(schedule.keys())
+    values = [np.asarray(schedule[c]).tolist() for c in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
 
 def calculate_pmt(principal, rate, n_periods):
     """Calculate monthly payment for fixed-rate loan"""
@@ -20,15 +60,57 @@ def calculate_balance(principal, payment, rate, periods_paid):
     payment_factor = payment * (((1 + monthly_rate) ** periods_paid) - 1) / monthly_rate
     return future_value - payment_factor
 
+def annuity_rate(pv, payment, n_periods, fv=0.0, tol=1e-12, max_iter=50):
+    """Periodic rate at which n_periods level payments plus fv at the end repay pv, by batched Newton iteration.
+
+    Works on arrays; entries that do not converge are NaN.
+    """
+    pv, payment, n, fv = np.broadcast_arrays(
+        np.asarray(pv, dtype=float), np.asarray(payment, dtype=float),
+        np.asarray(n_periods, dtype=float), np.asarray(fv, dtype=float)
+    )
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # Standard two-point approximation as the starting guess
+        i = 2 * (payment * n + fv - pv) / (pv * (n + 1))
+        converged = np.zeros(i.shape, dtype=bool)
+        for _ in range(max_iter):
+            v = np.exp(-n * np.log1p(i))
+            # Near zero the closed-form annuity factor cancels; use its series there
+            small = np.abs(i) < 1e-6
+            safe_i = np.where(small, 1.0, i)
+            annuity = np.where(small, n - n * (n + 1) / 2 * i + n * (n + 1) * (n + 2) / 6 * i ** 2,
+                               -np.expm1(-n * np.log1p(safe_i)) / safe_i)
+            d_annuity = np.where(small, -n * (n + 1) / 2 + n * (n + 1) * (n + 2) / 3 * i,
+                                 (n * v / (1 + i) - annuity) / safe_i)
+            f = payment * annuity + fv * v - pv
+            df = payment * d_annuity - n * fv * v / (1 + i)
+            step = f / df
+            i = i - step
+            converged = np.abs(step) < tol
+            if converged.all():
+                break
+    i = np.where(converged & np.isfinite(i) & (i > -1), i, np.nan)
+    return i.item() if i.ndim == 0 else i
+
 def calculate_true_apr(principal, monthly_payment, term_months, fees=0):
     """Calculate true APR including fees using IRR method"""
     try:
+        # Level payments: solve the IRR in closed-form Newton steps, falling
+        # back to numpy_financial's polynomial roots if that does not converge
+        monthly_rate = annuity_rate(principal - fees, monthly_payment, term_months)
+        if not np.isnan(monthly_rate):
+            return round(((1 + monthly_rate) ** 12 - 1) * 100, 3)
+        
+        from numpy_financial import irr
+        
         # Cash flows: negative initial (principal - fees), positive payments
         cash_flows = [-(principal - fees)]
         cash_flows.extend([monthly_payment] * term_months)
         
-        monthly_rate = irr(cash_flows)
-        if monthly_rate is None:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            monthly_rate = irr(cash_flows)
+        if monthly_rate is None or np.isnan(monthly_rate):
             return None
         
         apr = ((1 + monthly_rate) ** 12 - 1) * 100
@@ -36,283 +118,453 @@ def calculate_true_apr(principal, monthly_payment, term_months, fees=0):
     except:
         return None
 
-# ---------- FIXED RATE LOAN ----------
-def amortization_fixed(principal, rate, years, fees=0):
-    r = rate / 100 / 12
-    n = years * 12
+# ---------- CASH-FLOW KERNEL ----------
+# Balances are re-anchored at least this often to bound cumulative-product error
+KERNEL_BLOCK = 120
+
+def level_payment(balance, period_rate, n_periods, balloon=0.0):
+    """Level payment that amortizes balance down to balloon over n_periods"""
+    if n_periods <= 0:
+        return balance
+    if period_rate == 0:
+        return (balance - balloon) / n_periods
+    discount = (1 + period_rate) ** -n_periods
+    return (balance - balloon * discount) * period_rate / (1 - discount)
+
+def cashflow_kernel(principal, rates, io=None, recast=None, extra=None, balloon=0.0, settle=True, skip=None,
+                    payment=None):
+    """Amortize one loan from per-period event arrays.
+
+    Args:
+        principal: Opening balance
+        rates: Interest rate for each period, as a decimal per period
+        io: Interest-only flag per period (default none)
+        recast: Periods at which the level payment is recomputed from the balance
+            over the remaining amortizing periods at that period's rate; the
+            first period always recasts
+        extra: Extra principal paid per period
+        balloon: Balance the level payment leaves for the final period
+        settle: Whether the final period pays off the remaining balance
+        skip: Periods whose scheduled payment is skipped; their interest is capitalized
+        payment: Level payment in force at the first period, to resume a run
+            part way through a segment (default: recast there like any segment)
+
+    Returns a dict of unrounded 'payment', 'interest', 'principal', 'balance',
+    'rate' and 'level' (the level payment in force) arrays, truncated at the
+    period the loan is paid off, and 'extra': the extra principal actually
+    applied per period (an event larger than the payoff only pays what is
+    owed), or None without extra.
+
+    Within a run of periods sharing one level payment P the balance follows
+    the linear recurrence B[k] = g[k] * B[k-1] - c[k], with g = 1 + rate and
+    c = P + extra (g = 1 and c = extra while interest-only, c = extra when
+    skipped), which is solved
+    with cumulative products instead of a Python loop.
+    """
+    rates = np.asarray(rates, dtype=float)
+    n = len(rates)
+    io = np.zeros(n, dtype=bool) if io is None else np.asarray(io, dtype=bool)
+    recast = np.zeros(n, dtype=bool) if recast is None else np.asarray(recast, dtype=bool).copy()
+    has_extra = extra is not None
+    extra = np.zeros(n) if extra is None else np.asarray(extra, dtype=float)
+    skip = np.zeros(n, dtype=bool) if skip is None else np.asarray(skip, dtype=bool)
+    if n:
+        recast[0] = True
     
-    # Calculate monthly payment
-    if r == 0:
-        payment = principal / n
-    else:
-        payment = -pmt(r, n, principal)
+    # Amortizing periods left from each period on, for recasting
+    amortizing_left = np.cumsum((~io)[::-1])[::-1]
     
-    balance = float(principal)
-    rows = []
+    balance = np.empty(n)
+    # Level payment in force per period, before extra principal
+    level = np.zeros(n)
+    opening = float(principal)
+    resumed, payment = payment, 0.0
+    k = 0
+    end = n
     
-    for m in range(1, n + 1):
-        interest = balance * r
-        principal_paid = payment - interest
-        
-        if principal_paid > balance:
-            principal_paid = balance
+    boundaries = np.flatnonzero(recast).tolist() + [n]
+    for seg_start, seg_end in zip(boundaries[:-1], boundaries[1:]):
+        if seg_start or resumed is None:
+            payment = level_payment(opening, rates[seg_start], int(amortizing_left[seg_start]), balloon)
+        else:
+            payment = resumed
+        for k in range(seg_start, seg_end, KERNEL_BLOCK):
+            stop = min(k + KERNEL_BLOCK, seg_end)
+            r = rates[k:stop]
+            amortizing = ~io[k:stop]
+            skipped = skip[k:stop]
+            growth = np.where(amortizing | skipped, 1 + r, 1.0)
+            outflow = np.where(amortizing & ~skipped, payment, 0.0) + extra[k:stop]
+            cumulative = np.cumprod(growth)
+            block = cumulative * (opening - np.cumsum(outflow / cumulative))
             
-        balance -= principal_paid
-        
-        rows.append([
-            m,
-            round(payment, 2),
-            round(interest, 2),
-            round(principal_paid, 2),
-            round(max(balance, 0), 2),
-            rate  # Annual rate column for consistency
-        ])
-        
-        if abs(balance) < 0.01:  # Account for floating point errors
-            balance = 0
+            paid_off = np.flatnonzero(block < 0.01)
+            if len(paid_off):
+                stop = k + int(paid_off[0]) + 1
+                block = block[:stop - k]
+                block[-1] = 0.0
+                end = stop
+            balance[k:stop] = block
+            level[k:stop] = payment
+            opening = block[-1]
+            if end < n:
+                break
+        if end < n:
             break
     
-    return pd.DataFrame(
-        rows,
-        columns=["Month", "Payment", "Interest", "Principal", "Balance", "Annual_Rate"]
-    )
+    balance = balance[:end]
+    rates = rates[:end]
+    if settle and end == n and n:
+        balance[-1] = 0.0
+    previous = np.concatenate(([float(principal)], balance[:-1]))
+    interest = previous * rates
+    principal_paid = previous - balance
+    paid = interest + principal_paid
+    
+    applied = None
+    if has_extra:
+        scheduled = np.where(skip[:end], 0.0, np.where(io[:end], interest, level[:end]))
+        applied = np.clip(np.minimum(extra[:end], paid - scheduled), 0, None)
+    
+    return {
+        "payment": paid,
+        "interest": interest,
+        "principal": principal_paid,
+        "balance": balance,
+        "rate": rates,
+        "level": level[:end],
+        "extra": applied
+    }
+
+def kernel_schedule(result, annual_rates, columns=SCHEDULE_COLUMNS, as_frame=True):
+    """Rounded schedule from a cashflow_kernel result"""
+    n = len(result["balance"])
+    schedule = {
+        columns[0]: np.arange(1, n + 1, dtype=np.int64),
+        # + 0.0 turns the -0.0 of skipped periods into 0.0
+        "Payment": np.round(result["payment"], 2) + 0.0,
+        "Interest": np.round(result["interest"], 2),
+        "Principal": np.round(result["principal"], 2),
+        "Balance": np.round(np.maximum(result["balance"], 0), 2),
+        "Annual_Rate": np.broadcast_to(np.asarray(annual_rates, dtype=float), (n,)).copy()
+    }
+    if result.get("extra") is not None:
+        schedule["Extra"] = np.round(result["extra"], 2)
+    return schedule_frame(schedule) if as_frame else schedule
+
+# ---------- FIXED RATE LOAN ----------
+def amortization_fixed(principal, rate, years, fees=0, as_frame=True, extra=None, skip=None):
+    n = years * 12
+    result = cashflow_kernel(principal, np.full(n, rate / 100 / 12), extra=extra, skip=skip)
+    return kernel_schedule(result, rate, SCHEDULE_COLUMNS, as_frame)
 
 # ---------- VARIABLE RATE LOAN ----------
-def amortization_variable(principal, rates_input, years):
+def amortization_variable(principal, rates_input, years, as_frame=True, extra=None):
     """Variable rate loan with ANNUAL payments and ANNUAL schedule"""
-    # Parse rates input
-    if isinstance(rates_input, str):
-        rates_list = [float(r.strip()) for r in rates_input.split(",") if r.strip()]
-    else:
-        rates_list = rates_input
+    rates_list = parse_rates(rates_input)
     
     # Validate and extend rates
     if not rates_list:
         raise ValueError("At least one rate must be provided")
     
     if len(rates_list) < years:
-        rates_list.extend([rates_list[-1]] * (years - len(rates_list)))
+        rates_list = rates_list + [rates_list[-1]] * (years - len(rates_list))
     elif len(rates_list) > years:
         rates_list = rates_list[:years]
     
-    balance = float(principal)
-    rows = []
-    
-    for year in range(1, years + 1):
-        annual_rate = rates_list[year - 1] / 100  # Convert to decimal
-        remaining_years = years - year + 1
-        
-        # Calculate annual payment using the formula: PMT = PV * r / (1 - (1 + r)^(-n))
-        if annual_rate == 0:
-            annual_payment = balance / remaining_years
-        else:
-            annual_payment = balance * annual_rate / (1 - (1 + annual_rate) ** (-remaining_years))
-        
-        # Annual interest
-        interest = balance * annual_rate
-        
-        # Annual principal
-        principal_paid = annual_payment - interest
-        
-        # Adjust for final payment
-        if year == years:
-            principal_paid = balance
-            annual_payment = interest + principal_paid
-        
-        # Update balance
-        balance -= principal_paid
-        
-        rows.append([
-            year,  # Year number
-            round(annual_payment, 2),
-            round(interest, 2),
-            round(principal_paid, 2),
-            round(max(balance, 0), 2),
-            rates_list[year - 1]  # Annual rate in percentage
-        ])
-        
-        if abs(balance) < 0.01:
-            balance = 0
-            break
-    
-    return pd.DataFrame(
-        rows,
-        columns=["Year", "Payment", "Interest", "Principal", "Balance", "Annual_Rate"]
-    )
+    # Annual payment recomputed every year over the remaining years
+    annual_rates = np.array(rates_list, dtype=float)
+    result = cashflow_kernel(principal, annual_rates / 100, recast=np.ones(years, dtype=bool), extra=extra)
+    return kernel_schedule(result, annual_rates[:len(result["balance"])], ANNUAL_SCHEDULE_COLUMNS, as_frame)
 
 # ---------- INTEREST ONLY LOAN ----------
-def amortization_interest_only(principal, rate, years, interest_only_years=None):
-    monthly_rate = rate / 100 / 12
-    balance = float(principal)
-    rows = []
-    
+def amortization_interest_only(principal, rate, years, interest_only_years=None, as_frame=True,
+                               extra=None, skip=None):
+    n = years * 12
     if interest_only_years is None or interest_only_years >= years:
-        # Interest-only for entire term
-        for m in range(1, years * 12 + 1):
-            interest = principal * monthly_rate
-            payment = interest
-            rows.append([
-                m,
-                round(payment, 2),
-                round(interest, 2),
-                0,
-                principal,
-                rate
-            ])
+        io_months = n
     else:
-        # Interest-only period
-        for m in range(1, interest_only_years * 12 + 1):
-            interest = principal * monthly_rate
-            payment = interest
-            rows.append([
-                m,
-                round(payment, 2),
-                round(interest, 2),
-                0,
-                principal,
-                rate
-            ])
-        
-        # Amortization period
-        remaining_months = (years - interest_only_years) * 12
-        if remaining_months > 0:
-            payment = -pmt(monthly_rate, remaining_months, principal)
-            
-            for i in range(1, remaining_months + 1):
-                m = interest_only_years * 12 + i
-                interest = balance * monthly_rate
-                principal_paid = payment - interest
-                
-                if principal_paid > balance:
-                    principal_paid = balance
-                    
-                balance -= principal_paid
-                
-                rows.append([
-                    m,
-                    round(payment, 2),
-                    round(interest, 2),
-                    round(principal_paid, 2),
-                    round(max(balance, 0), 2),
-                    rate
-                ])
-                
-                if abs(balance) < 0.01:
-                    balance = 0
-                    break
-    
-    return pd.DataFrame(
-        rows,
-        columns=["Month", "Payment", "Interest", "Principal", "Balance", "Annual_Rate"]
-    )
+        io_months = max(interest_only_years, 0) * 12
+    
+    io = np.arange(n) < io_months
+    recast = np.zeros(n, dtype=bool)
+    if io_months < n:
+        recast[io_months] = True
+    
+    # Interest-only for the entire term never repays principal within the schedule
+    result = cashflow_kernel(principal, np.full(n, rate / 100 / 12), io=io, recast=recast, extra=extra,
+                             settle=io_months < n, skip=skip)
+    return kernel_schedule(result, rate, SCHEDULE_COLUMNS, as_frame)
 
 # ---------- BALLOON LOAN ----------
-def amortization_balloon(principal, rate, years, balloon_percent):
+def amortization_balloon(principal, rate, years, balloon_percent, as_frame=True, extra=None, skip=None):
+    n = years * 12
     balloon_amount = principal * (balloon_percent / 100)
-    monthly_rate = rate / 100 / 12
-    total_months = years * 12
+    result = cashflow_kernel(principal, np.full(n, rate / 100 / 12), extra=extra, balloon=balloon_amount, skip=skip)
+    return kernel_schedule(result, rate, SCHEDULE_COLUMNS, as_frame)
+
+# ---------- INTEGER-CENTS MODE ----------
+def amortization_cents(principal, rate, years, interest_only_years=0, balloon_percent=0,
+                       rounding="half_even", as_frame=True, extra=None, skip=None):
+    """Fixed, interest-only or balloon schedule computed exactly in int64 cents"""
+    result = amortize_cents(
+        principal, rate, years * 12,
+        io_months=min(max(interest_only_years, 0), years) * 12,
+        balloon=principal * balloon_percent / 100,
+        rounding=rounding,
+        extra=None if extra is None else np.asarray(extra)[None, :],
+        skip=None if skip is None else np.asarray(skip)[None, :]
+    )
+    schedule = build_schedule(cents_schedule_rows(result, rate), SCHEDULE_COLUMNS, as_frame=False)
+    if "extra" in result:
+        schedule["Extra"] = result["extra"][0, :int(result["periods"][0])] / 100
+    return schedule_frame(schedule) if as_frame else schedule
+
+# ---------- ANNUAL AGGREGATE ----------
+def annual_totals(principal, rate, years, io_months=0, balloon_fraction=0.0):
+    """Per-year payment, interest, principal and ending balance of monthly-pay loans; (loans, years) arrays"""
+    return period_totals(principal, rate, years, io_months, balloon_fraction, 12)
+
+def period_totals(principal, rate, years, io_months=0, balloon_fraction=0.0, months_per_period=12):
+    """Per-period payment, interest, principal and ending balance of monthly-pay loans, in closed form.
     
-    # Calculate monthly payment
-    if monthly_rate == 0:
-        payment = (principal - balloon_amount) / total_months
-    else:
-        numerator = (principal * monthly_rate * ((1 + monthly_rate) ** total_months)) - (balloon_amount * monthly_rate)
-        denominator = ((1 + monthly_rate) ** total_months) - 1
-        payment = numerator / denominator
+    Works on arrays of loans; returns (loans, periods) arrays with periods of
+    months_per_period months, zero after maturity (the balance keeps its
+    final value). Over interest-only months the balance stays at principal L; afterwards
+    B[j] = L g^j - P (g^j - 1) / r with g = 1 + r, so a period's principal is
+    the drop in balance across it and its interest is its payments (rL per
+    interest-only month, P per amortizing month, plus the balloon at maturity)
+    less that principal. Interest-only loans to maturity never repay
+    principal within the schedule, as in amortization_interest_only.
+    """
+    L = np.atleast_1d(np.asarray(principal, dtype=float))
+    r = np.broadcast_to(np.asarray(rate, dtype=float) / 1200, L.shape)
+    n = np.broadcast_to(np.asarray(years, dtype=np.int64) * 12, L.shape)
+    m = np.broadcast_to(np.minimum(np.asarray(io_months, dtype=np.int64), n), L.shape)
+    b = np.broadcast_to(np.asarray(balloon_fraction, dtype=float), L.shape)
+    amortizing = n - m
+    lump = np.where(amortizing > 0, b * L, 0.0)
+    # Level payment through log1p/expm1, so tiny rates keep their digits
+    lg = np.log1p(r)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        level = r * (L - lump * np.exp(-amortizing * lg)) / -np.expm1(-amortizing * lg)
+    payment = np.where(amortizing > 0, np.where(r == 0, (L - lump) / np.maximum(amortizing, 1), level), 0.0)
     
-    balance = float(principal)
-    rows = []
+    n_periods = -(-int(n.max()) // months_per_period) if L.size else 0
+    month_end = months_per_period * np.arange(n_periods + 1)[None, :]
+    lg = lg[:, None]
+    j = np.maximum(month_end - m[:, None], 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        grown = np.expm1(j * lg)
+        balance = np.where(r[:, None] == 0, L[:, None] - payment[:, None] * j,
+                           L[:, None] * (1 + grown) - payment[:, None] * grown / r[:, None])
+    balance = np.where(j == 0, L[:, None], balance)
+    balance = np.where(month_end >= n[:, None], np.where(amortizing > 0, 0.0, L)[:, None], balance)
     
-    for m in range(1, total_months + 1):
-        interest = balance * monthly_rate
-        
-        if m == total_months:
-            principal_paid = balance - balloon_amount
-            payment = interest + principal_paid
-            balance = balloon_amount
-            
-            rows.append([
-                m,
-                round(payment + balloon_amount, 2),
-                round(interest, 2),
-                round(principal_paid + balloon_amount, 2),
-                0,
-                rate
-            ])
-            break
-        else:
-            principal_paid = payment - interest
-            
-            if principal_paid > balance:
-                principal_paid = balance
-                
-            balance -= principal_paid
-            
-            rows.append([
-                m,
-                round(payment, 2),
-                round(interest, 2),
-                round(principal_paid, 2),
-                round(max(balance, 0), 2),
-                rate
-            ])
-    
-    return pd.DataFrame(
-        rows,
-        columns=["Month", "Payment", "Interest", "Principal", "Balance", "Annual_Rate"]
-    )
+    # Months of each period that are interest-only and amortizing
+    start = month_end[:, :-1]
+    in_term = np.clip(n[:, None] - start, 0, months_per_period)
+    io_in_period = np.clip(m[:, None] - start, 0, months_per_period)
+    matures = (start < n[:, None]) & (month_end[:, 1:] >= n[:, None])
+    paid = (io_in_period * (r * L)[:, None] + (in_term - io_in_period) * payment[:, None]
+            + np.where(matures, lump[:, None], 0.0))
+    principal_paid = balance[:, :-1] - balance[:, 1:]
+    return {
+        "payment": paid,
+        "interest": paid - principal_paid,
+        "principal": principal_paid,
+        "balance": balance[:, 1:]
+    }
+
+def amortization_annual(principal, rate, years, interest_only_years=0, balloon_percent=0, as_frame=True):
+    """Yearly rows of a fixed, interest-only or balloon loan without building the monthly schedule"""
+    io_months = min(max(interest_only_years or 0, 0), years) * 12
+    totals = annual_totals(principal, rate, years, io_months, balloon_percent / 100)
+    schedule = _annual_rows(totals, rate)
+    return schedule_frame(schedule) if as_frame else schedule
+
+def _annual_rows(totals, rate):
+    """Schedule columns for the first loan of annual_totals"""
+    years = totals["payment"].shape[1]
+    return {
+        "Year": np.arange(1, years + 1, dtype=np.int64),
+        "Payment": np.round(totals["payment"][0], 2),
+        "Interest": np.round(totals["interest"][0], 2),
+        "Principal": np.round(totals["principal"][0], 2),
+        "Balance": np.round(np.maximum(totals["balance"][0], 0), 2),
+        "Annual_Rate": np.full(years, float(rate))
+    }
+
+def annual_from_monthly(schedule, as_frame=True):
+    """Yearly rows summed from a monthly schedule (dict of column arrays)"""
+    n = len(schedule["Payment"])
+    starts = np.arange(0, n, 12)
+    ends = np.minimum(starts + 12, n) - 1
+    annual = {"Year": np.arange(1, len(starts) + 1, dtype=np.int64)}
+    for name in ("Payment", "Interest", "Principal"):
+        annual[name] = np.round(np.add.reduceat(np.asarray(schedule[name], dtype=float), starts), 2) if n else np.zeros(0)
+    annual["Balance"] = np.asarray(schedule["Balance"], dtype=float)[ends]
+    annual["Annual_Rate"] = np.asarray(schedule["Annual_Rate"], dtype=float)[ends]
+    return schedule_frame(annual) if as_frame else annual
 
 # ---------- DISPATCHER ----------
-def loan_dispatcher(data):
-    loan_type = data.get("type", "fixed")
-    principal = float(data.get("principal", 0))
-    fees = float(data.get("fees", 0))
+def loan_dispatcher(data, as_frame=True):
+    """Build the schedule and summary for a request payload or LoanSpec; as_frame=False keeps NumPy columns"""
+    spec = data if isinstance(data, LoanSpec) else LoanSpec.from_dict(data)
     
-    if principal <= 0:
+    if spec.principal <= 0:
         raise ValueError("Principal must be greater than 0")
     
-    if loan_type == "fixed":
-        rate = float(data.get("rate", 0))
-        years = int(data.get("years", 1))
-        df = amortization_fixed(principal, rate, years, fees)
-        
-    elif loan_type == "variable":
-        rates = data.get("rates", "")
-        years = int(data.get("years", 1))
+    if spec.schedule == "annual" and spec.type != "variable":
+        return _annual_dispatch(spec, as_frame)
+    
+    with stage("amortization"):
+        extra, skip = _payment_events(spec)
+        df = _build_schedule(spec, extra, skip)
+    
+    with stage("summary"):
+        summary = _summarize(spec, df, extra)
+    
+    if as_frame:
+        df = schedule_frame(df)
+    
+    return df, summary
+
+def _annual_dispatch(spec, as_frame):
+    """Yearly schedule and summary; closed form unless events or cents rounding need the monthly engine"""
+    with stage("amortization"):
+        extra, skip = _payment_events(spec)
+        if extra is not None or spec.rounding:
+            monthly = _build_schedule(spec, extra, skip)
+            with stage("summary"):
+                summary = _summarize(spec, monthly, extra)
+            df = annual_from_monthly(monthly, as_frame=False)
+        else:
+            io_years = spec.interest_only_years if spec.type == "interest_only" else 0
+            balloon_fraction = spec.balloon / 100 if spec.type == "balloon" else 0.0
+            totals = annual_totals(spec.principal, spec.rate, spec.years, min(io_years, spec.years) * 12,
+                                   balloon_fraction)
+            df = _annual_rows(totals, spec.rate)
+            with stage("summary"):
+                # Cent-rounded monthly rows, in closed form, so the totals match monthly mode
+                months = period_totals(spec.principal, spec.rate, spec.years, min(io_years, spec.years) * 12,
+                                       balloon_fraction, months_per_period=1)
+                rows = {"Payment": np.round(months["payment"][0], 2), "Interest": np.round(months["interest"][0], 2)}
+                summary = _summarize(spec, rows)
+    
+    if as_frame:
+        df = schedule_frame(df)
+    return df, summary
+
+def variable_rates(spec):
+    """Annual rate list (%) of a variable LoanSpec: its rates, or its index curve plus margin"""
+    rates = spec.rates
+    if spec.index:
+        rates = indexed_rates(curve_from_spec(spec.index), spec.years, spec.margin, spec.floor,
+                              spec.cap, spec.periodic_cap)[0].tolist()
+    if not rates:
+        raise ValueError("Variable rates are required")
+    return rates
+
+def variable_rate_paths(specs, n_years):
+    """(loans, n_years) annual rates (%) of variable LoanSpecs, padded past each term with its last rate.
     
-        if not rates:
+    Indexed loans are grouped by curve and priced with one indexed_rates call
+    per curve, with per-loan margin, floor and cap arrays.
+    """
+    paths = np.zeros((len(specs), n_years))
+    by_curve = {}
+    for i, spec in enumerate(specs):
+        if spec.index:
+            by_curve.setdefault(curve_from_spec(spec.index), []).append(i)
+        elif spec.rates:
+            path = spec.rates[:n_years]
+            paths[i, :len(path)] = path
+            paths[i, len(path):] = path[-1]
+        else:
             raise ValueError("Variable rates are required")
+    
+    for curve, rows in by_curve.items():
+        group = [specs[i] for i in rows]
         
-        df = amortization_variable(principal, rates, years)
+        def limits(name, default):
+            return np.array([default if getattr(s, name) is None else getattr(s, name) for s in group])
         
-    elif loan_type == "interest_only":
-        rate = float(data.get("rate", 0))
-        years = int(data.get("years", 1))
-        interest_only_years = data.get("interest_only_years", years)
-        if interest_only_years is not None:
-            interest_only_years = int(interest_only_years)
-        df = amortization_interest_only(principal, rate, years, interest_only_years)
+        periodic_cap = limits("periodic_cap", np.inf) if any(s.periodic_cap is not None for s in group) else None
+        paths[rows] = indexed_rates(curve, n_years, limits("margin", 0.0), limits("floor", -np.inf),
+                                    limits("cap", np.inf), periodic_cap)
+    
+    # Rates past a loan's term repeat its last rate, as amortization_variable pads
+    years = np.array([s.years for s in specs], dtype=np.int64)
+    last = np.minimum(np.arange(n_years)[None, :], np.maximum(years, 1)[:, None] - 1)
+    return np.take_along_axis(paths, last, axis=1)
+
+def _payment_events(spec):
+    """Dense extra-payment and skipped-payment arrays for a spec's extra_payments (None if absent)"""
+    if not spec.extra_payments:
+        return None, None
+    years = spec.years
+    months, amounts, skips = event_months(spec.extra_payments, years * 12, spec.start_date)
+    
+    if spec.type == "variable":
+        # Annual schedule: events land in the payment year they fall in
+        if skips.any():
+            raise ValueError("Skipped payments need a monthly schedule")
+        return extra_vector(months, amounts, years, months_per_period=12), None
+    skip = skip_vector(months, skips, years * 12) if skips.any() else None
+    return extra_vector(months, amounts, years * 12), skip
+
+def _build_schedule(spec, extra=None, skip=None):
+    """Run the engine for spec.type"""
+    principal, years = spec.principal, spec.years
+    if spec.rounding:
+        io_years = spec.interest_only_years if spec.type == "interest_only" else 0
+        balloon_percent = spec.balloon if spec.type == "balloon" else 0
+        return amortization_cents(principal, spec.rate, years, io_years, balloon_percent, spec.rounding,
+                                  as_frame=False, extra=extra, skip=skip)
+    
+    if spec.type == "fixed":
+        df = amortization_fixed(principal, spec.rate, years, spec.fees, as_frame=False, extra=extra, skip=skip)
         
-    elif loan_type == "balloon":
-        rate = float(data.get("rate", 0))
-        years = int(data.get("years", 1))
-        balloon_percent = float(data.get("balloon", 20))
-        df = amortization_balloon(principal, rate, years, balloon_percent)
+    elif spec.type == "variable":
+        df = amortization_variable(principal, variable_rates(spec), years, as_frame=False, extra=extra)
+        
+    elif spec.type == "interest_only":
+        df = amortization_interest_only(principal, spec.rate, years, spec.interest_only_years, as_frame=False,
+                                        extra=extra, skip=skip)
         
     else:
-        raise ValueError(f"Invalid loan type: {loan_type}")
+        df = amortization_balloon(principal, spec.rate, years, spec.balloon, as_frame=False, extra=extra, skip=skip)
+    
+    return df
+
+def _summarize(spec, df, extra=None):
+    """Summary metrics for a computed schedule"""
+    loan_type = spec.type
+    principal, fees, years, rate = spec.principal, spec.fees, spec.years, spec.rate
+    io_months = spec.interest_only_years * 12 if loan_type == "interest_only" else 0
     
     # Calculate summary metrics
+    n_rows = len(df["Payment"])
     total_paid = df["Payment"].sum()
     total_interest = df["Interest"].sum()
+    # Extra principal the engine applied: an event past the payoff only pays what is owed
+    applied = None if extra is None else df["Extra"] if "Extra" in df else extra[:n_rows]
+    # Scheduled payments, without extra principal from payment events
+    payments = df["Payment"] if applied is None else df["Payment"] - applied
+    n_months = n_rows
+    first_payment = payments[0] if n_rows > 0 else 0
+    amortizing_payment = payments[io_months] if n_rows > io_months else 0
+    average_payment = df["Payment"].mean()
     
     # Calculate APR (true APR including fees)
     apr_percent = None
     if loan_type in ["fixed", "interest_only", "balloon"]:
-        monthly_payment = df["Payment"].iloc[0] if len(df) > 0 else 0
-        apr_percent = calculate_true_apr(principal, monthly_payment, years * 12, fees) or rate
+        with stage("apr"):
+            apr_percent = calculate_true_apr(principal, first_payment, years * 12, fees) or rate
     elif loan_type == "variable":
-        rates_list = [float(r.strip()) for r in rates.split(",") if r.strip()]
+        # Index-priced loans have no literal list; average the rates the schedule used
+        rates_list = list(spec.rates) if spec.rates else df["Annual_Rate"].tolist()
         if rates_list:
             weighted_avg_rate = sum(rates_list) / len(rates_list)
             apr_percent = weighted_avg_rate
@@ -324,44 +576,44 @@ def loan_dispatcher(data):
         "total_paid": round(total_paid, 2),
         "total_interest": round(total_interest, 2),
         "apr": round(apr_percent, 2) if apr_percent else 0,
-        "total_months": len(df),
+        "total_months": n_months,
         "principal": principal,
         "fees": fees
     }
     
+    if extra is not None:
+        summary["extra_payments"] = round(float(np.sum(applied)), 2)
+        if loan_type != "variable":
+            summary["months_saved"] = years * 12 - n_months
+    
     # Add payment information
     if loan_type == "fixed":
-        monthly_payment = df["Payment"].iloc[0] if len(df) > 0 else 0
         summary.update({
-            "monthly_payment": round(monthly_payment, 2),
-            "average_payment": round(df["Payment"].mean(), 2)
+            "monthly_payment": round(first_payment, 2),
+            "average_payment": round(average_payment, 2)
         })
     
     elif loan_type == "variable":
-        monthly_payment = df["Payment"].iloc[0] if len(df) > 0 else 0
         summary.update({
-            "monthly_payment": round(monthly_payment, 2),
-            "average_payment": round(df["Payment"].mean(), 2)
+            "monthly_payment": round(first_payment, 2),
+            "average_payment": round(average_payment, 2)
         })
     
     elif loan_type == "interest_only":
-        interest_only_payment = df["Payment"].iloc[0] if len(df) > 0 else 0
-        if data.get("interest_only_years", years) < years:
-            amortizing_payment = df["Payment"].iloc[int(data.get("interest_only_years", years) * 12)] if len(df) > int(data.get("interest_only_years", years) * 12) else 0
+        if io_months < years * 12:
             summary.update({
-                "interest_only_payment": round(interest_only_payment, 2),
+                "interest_only_payment": round(first_payment, 2),
                 "amortizing_payment": round(amortizing_payment, 2) if amortizing_payment > 0 else 0
             })
         else:
-            summary["interest_only_payment"] = round(interest_only_payment, 2)
+            summary["interest_only_payment"] = round(first_payment, 2)
     
     elif loan_type == "balloon":
-        monthly_payment = df["Payment"].iloc[0] if len(df) > 0 else 0
-        balloon_amount = principal * (float(data.get("balloon", 20)) / 100)
+        balloon_amount = principal * (spec.balloon / 100)
         summary.update({
-            "monthly_payment": round(monthly_payment, 2),
+            "monthly_payment": round(first_payment, 2),
             "balloon_payment": round(balloon_amount, 2),
-            "average_payment": round(df["Payment"].mean(), 2)
+            "average_payment": round(average_payment, 2)
         })
     
-    return df, summary
\ No newline at end of file
+    return summary
\ No newline at end of file
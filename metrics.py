@@ -0,0 +1,172 @@
+"""Request metrics exposed in the Prometheus text format.
+
+Tracks request counts, per-route latency, errors by exception type, schedule
+lengths and process memory. Other modules can add their own samples (cache
+statistics and the like) with ``register_collector``.
+
+Setting LOAN_METRICS_TRACEMALLOC=1 enables tracemalloc peak-allocation
+sampling; LOAN_METRICS_TRACEMALLOC_RATE (default 0.1) controls the fraction
+of requests sampled. tracemalloc slows allocation noticeably, so it is off by
+default.
+"""
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+from timing import Histogram
+import timing
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SCHEDULE_LENGTH_BUCKETS = (1, 12, 60, 120, 180, 240, 360, 480, 600)
+ALLOCATION_BUCKETS = (1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+_lock = threading.Lock()
+_requests = {}
+_errors = {}
+_latency = {}
+_schedule_lengths = {}
+_allocations = {}
+_collectors = []
+
+_tracemalloc_enabled = os.environ.get("LOAN_METRICS_TRACEMALLOC", "0") == "1"
+_tracemalloc_rate = float(os.environ.get("LOAN_METRICS_TRACEMALLOC_RATE", "0.1"))
+_started = time.time()
+
+def _get(table, key, buckets):
+    h = table.get(key)
+    if h is None:
+        with _lock:
+            h = table.setdefault(key, Histogram(buckets))
+    return h
+
+def record_request(route, method, status, seconds):
+    """Count a finished request and observe its latency"""
+    key = (route, method, str(status))
+    with _lock:
+        _requests[key] = _requests.get(key, 0) + 1
+    _get(_latency, route, LATENCY_BUCKETS).observe(seconds)
+
+def record_error(route, exc):
+    """Count an exception that a route turned into an error response"""
+    key = (route, type(exc).__name__)
+    with _lock:
+        _errors[key] = _errors.get(key, 0) + 1
+
+def record_schedule_length(route, rows):
+    _get(_schedule_lengths, route, SCHEDULE_LENGTH_BUCKETS).observe(rows)
+
+def register_collector(collector):
+    """Add a callable returning [(name, type, help, [(labels, value), ...]), ...] to every scrape"""
+    _collectors.append(collector)
+
+# ---------- TRACEMALLOC SAMPLING ----------
+def configure_tracemalloc(enabled=True, sample_rate=None):
+    global _tracemalloc_enabled, _tracemalloc_rate
+    _tracemalloc_enabled = enabled
+    if sample_rate is not None:
+        _tracemalloc_rate = float(sample_rate)
+    if not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def start_allocation_sample():
+    """Reset the tracemalloc peak if this request is sampled; returns the baseline or None"""
+    if not _tracemalloc_enabled or random.random() >= _tracemalloc_rate:
+        return None
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+def finish_allocation_sample(route, baseline):
+    """Record the peak traced allocation above baseline since start_allocation_sample.
+
+    The peak is process-wide, so concurrent requests inflate each other's
+    samples; the distribution still shows which routes allocate the most.
+    """
+    if baseline is None or not tracemalloc.is_tracing():
+        return
+    peak = tracemalloc.get_traced_memory()[1]
+    _get(_allocations, route, ALLOCATION_BUCKETS).observe(max(peak - baseline, 0))
+
+# ---------- PROCESS ----------
+def process_rss_bytes():
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is the peak, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# ---------- EXPOSITION ----------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+def _histogram_lines(name, snapshot, scale=1.0, **labels):
+    lines = []
+    cumulative = 0
+    for bound, n in zip(snapshot["buckets"], snapshot["counts"]):
+        cumulative += n
+        lines.append(f"{name}_bucket{_labels(**labels, le=f'{bound * scale:g}')} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {snapshot['count']}")
+    lines.append(f"{name}_sum{_labels(**labels)} {snapshot['sum'] * scale!r}")
+    lines.append(f"{name}_count{_labels(**labels)} {snapshot['count']}")
+    return lines
+
+def _header(name, kind, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        requests = dict(_requests)
+        errors = dict(_errors)
+        latency = dict(_latency)
+        lengths = dict(_schedule_lengths)
+        allocations = dict(_allocations)
+
+    lines = _header("loan_requests_total", "counter", "Requests handled by route, method and status")
+    for (route, method, status), n in sorted(requests.items()):
+        lines.append(f"loan_requests_total{_labels(route=route, method=method, status=status)} {n}")
+
+    lines += _header("loan_request_errors_total", "counter", "Error responses by route and exception type")
+    for (route, exc_type), n in sorted(errors.items()):
+        lines.append(f"loan_request_errors_total{_labels(route=route, exception=exc_type)} {n}")
+
+    lines += _header("loan_request_duration_seconds", "histogram", "Request latency by route")
+    for route, h in sorted(latency.items()):
+        lines += _histogram_lines("loan_request_duration_seconds", h.snapshot(), route=route)
+
+    lines += _header("loan_stage_duration_seconds", "histogram", "Sampled request stage latency")
+    for (route, stage), snapshot in sorted(timing.histograms().items()):
+        lines += _histogram_lines("loan_stage_duration_seconds", snapshot, 0.001, route=route, stage=stage)
+
+    lines += _header("loan_schedule_rows", "histogram", "Rows in computed amortization schedules")
+    for route, h in sorted(lengths.items()):
+        lines += _histogram_lines("loan_schedule_rows", h.snapshot(), route=route)
+
+    if allocations:
+        lines += _header("loan_request_peak_alloc_bytes", "histogram", "Sampled tracemalloc peak allocation per request")
+        for route, h in sorted(allocations.items()):
+            lines += _histogram_lines("loan_request_peak_alloc_bytes", h.snapshot(), route=route)
+
+    for collector in list(_collectors):
+        for name, kind, help_text, samples in collector():
+            lines += _header(name, kind, help_text)
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(**labels)} {value}")
+
+    lines += _header("process_resident_memory_bytes", "gauge", "Resident memory size in bytes")
+    lines.append(f"process_resident_memory_bytes {process_rss_bytes()}")
+    lines += _header("process_start_time_seconds", "gauge", "Start time of the process since the epoch")
+    lines.append(f"process_start_time_seconds {_started:.0f}")
+
+    return "\n".join(lines) + "\n"
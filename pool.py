@@ -0,0 +1,184 @@
+"""Voluntary-prepayment speed modeling over pools of fixed, interest-only and balloon loans.
+
+Speeds are given per scenario as one of:
+
+    {"cpr": 6}                  constant conditional prepayment rate (% a year)
+    {"psa": 150}                PSA ramp: 0.2% CPR per month of loan age up to
+                                6% at month 30, scaled by speed / 100
+    {"cpr_vector": [2, 4, 6]}   CPR by projection month; the last value holds
+
+CPR converts to a single monthly mortality SMM = 1 - (1 - CPR)^(1/12). With
+survival factors Q_t = prod_{k<=t} (1 - SMM_k), a loan's actual balance is its
+scheduled balance B_t times Q_t, so for month t:
+
+    interest             Q_{t-1} B_{t-1} r
+    scheduled principal  Q_{t-1} (B_{t-1} - B_t)
+    prepaid principal    Q_{t-1} B_t SMM_t
+
+Scheduled balances B_t stay level over interest-only months, then amortize
+with a level payment down to the balloon (balloon % of the original
+principal), which is repaid at maturity. Seasoned loans give "balance",
+"remaining_months" and "age"; interest-only months already elapsed are
+taken off by age.
+
+Everything is evaluated as (scenario, loan, month) arrays, in blocks of loans
+to bound memory, and summed into pool-level columns.
+"""
+import numpy as np
+
+from cents import level_payment
+from spec import LOAN_TYPES, parse_loans, spec_columns
+
+POOL_TYPES = ("fixed", "interest_only", "balloon")
+PSA_RAMP_MONTHS = 30
+PSA_PEAK_CPR = 6.0
+# Upper bound on scenario x loan x month elements evaluated at once
+BLOCK_ELEMENTS = 4_000_000
+
+def smm_from_cpr(cpr):
+    """Single monthly mortality (fraction) from annual CPR (%)"""
+    return 1 - (1 - np.clip(np.asarray(cpr, dtype=float) / 100, 0, 1)) ** (1 / 12)
+
+def psa_cpr(speed, age):
+    """CPR (%) of the PSA ramp at speed (%) for loan ages in months"""
+    return PSA_PEAK_CPR * np.minimum(np.asarray(age, dtype=float), PSA_RAMP_MONTHS) / PSA_RAMP_MONTHS * speed / 100
+
+def scenario_smm(scenario, ages):
+    """SMM array (loans, months) for one scenario, given loan ages (loans, months)"""
+    if "psa" in scenario:
+        return smm_from_cpr(psa_cpr(float(scenario["psa"]), ages))
+    if "cpr_vector" in scenario:
+        vector = np.asarray(scenario["cpr_vector"], dtype=float)
+        if vector.size == 0:
+            raise ValueError("cpr_vector must not be empty")
+        n_months = ages.shape[1]
+        cpr = vector[np.minimum(np.arange(n_months), vector.size - 1)]
+        return np.broadcast_to(smm_from_cpr(cpr), ages.shape)
+    if "cpr" in scenario:
+        return np.broadcast_to(smm_from_cpr(float(scenario["cpr"])), ages.shape)
+    raise ValueError("Scenario needs one of cpr, psa or cpr_vector")
+
+def scheduled_balances(balance, rate, remaining_months, n_months, io_months=0, balloon=0.0):
+    """Scheduled (no prepayment) balances, shape (loans, n_months + 1), zero after maturity.
+
+    Balances hold for io_months interest-only months, then amortize with a
+    level payment down to balloon, which is repaid at maturity.
+    """
+    monthly_rate = rate / 100 / 12
+    io_months = np.minimum(np.broadcast_to(np.asarray(io_months, dtype=np.int64), balance.shape), remaining_months)
+    balloon = np.broadcast_to(np.asarray(balloon, dtype=float), balance.shape)
+    payment = level_payment(balance, monthly_rate, remaining_months - io_months, balloon)
+    t = np.arange(n_months + 1)[None, :]
+    j = np.maximum(t - io_months[:, None], 0)
+    r = monthly_rate[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (1 + r) ** j
+        amortized = np.where(r == 0, balance[:, None] - payment[:, None] * j,
+                             balance[:, None] * growth - payment[:, None] * (growth - 1) / r)
+    amortized = np.where(t >= remaining_months[:, None], 0.0, amortized)
+    return np.maximum(amortized, 0.0)
+
+def pool_cashflows(balance, rate, remaining_months, age, scenarios, io_months=0, balloon=0.0):
+    """Pool-level monthly cash flows for each speed scenario.
+
+    io_months (remaining interest-only months) and balloon (amount due at
+    maturity) are per loan or scalars. Returns a dict of (scenarios, months)
+    arrays: interest, scheduled_principal, prepaid_principal and balance
+    (pool balance at the end of each month).
+    """
+    balance = np.asarray(balance, dtype=float)
+    rate = np.asarray(rate, dtype=float)
+    remaining_months = np.asarray(remaining_months, dtype=np.int64)
+    age = np.asarray(age, dtype=float)
+    io_months = np.broadcast_to(np.asarray(io_months, dtype=np.int64), balance.shape)
+    balloon = np.broadcast_to(np.asarray(balloon, dtype=float), balance.shape)
+    n_months = int(remaining_months.max())
+    n_scenarios = len(scenarios)
+
+    totals = {name: np.zeros((n_scenarios, n_months))
+              for name in ("interest", "scheduled_principal", "prepaid_principal", "balance")}
+    block = max(1, BLOCK_ELEMENTS // (n_scenarios * n_months))
+    months = np.arange(1, n_months + 1)
+
+    for start in range(0, len(balance), block):
+        sl = slice(start, start + block)
+        sched = scheduled_balances(balance[sl], rate[sl], remaining_months[sl], n_months, io_months[sl], balloon[sl])
+        ages = age[sl, None] + months[None, :]
+        smm = np.stack([scenario_smm(s, ages) for s in scenarios])
+
+        survival = np.cumprod(1 - smm, axis=2)
+        prior = np.concatenate([np.ones(survival.shape[:2] + (1,)), survival[:, :, :-1]], axis=2)
+        opening, closing = sched[:, :-1], sched[:, 1:]
+
+        # Sum over loans without materializing scenario x loan x month products
+        totals["interest"] += np.einsum("slt,lt->st", prior, opening * (rate[sl, None] / 1200))
+        totals["scheduled_principal"] += np.einsum("slt,lt->st", prior, opening - closing)
+        totals["prepaid_principal"] += np.einsum("slt,slt,lt->st", prior, smm, closing)
+        totals["balance"] += np.einsum("slt,lt->st", survival, closing)
+    return totals
+
+def weighted_average_life(principal_paid):
+    """WAL in years of (scenarios, months) principal cash flows"""
+    months = np.arange(1, principal_paid.shape[-1] + 1)
+    paid = principal_paid.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(paid > 0, (principal_paid * months).sum(axis=-1) / paid / 12, 0.0)
+
+def pool_report(data):
+    """Pool cash flows and summary per speed scenario for a /pool payload"""
+    loans = data.get("loans") or []
+    if not loans:
+        raise ValueError("At least one loan is required")
+    scenarios = data.get("scenarios") or [{"psa": 100}]
+
+    specs = parse_loans(loans)
+    for i, (loan, spec) in enumerate(zip(loans, specs)):
+        if spec.type not in POOL_TYPES:
+            raise ValueError(f"loans[{i}]: Pool projections are not available for loan type: {spec.type}")
+        if loan.get("remaining_months") is None and loan.get("years") in (None, ""):
+            raise ValueError(f"loans[{i}]: years or remaining_months is required")
+    columns = spec_columns(specs)
+    # Seasoned loans carry their current balance and remaining term next to the spec fields
+    balance = np.array([
+        float(l["balance"]) if l.get("balance") is not None else p for l, p in zip(loans, columns["principal"])
+    ])
+    rate = columns["rate"]
+    remaining = np.array([
+        int(l["remaining_months"]) if l.get("remaining_months") is not None else y * 12
+        for l, y in zip(loans, columns["years"].tolist())
+    ])
+    age = np.array([int(l.get("age", 0)) for l in loans])
+    if (balance <= 0).any():
+        raise ValueError("Loan balances must be greater than 0")
+    if (remaining <= 0).any():
+        raise ValueError("Remaining term must be greater than 0")
+
+    # Interest-only months left after the loan's age; balloons are a share of the original principal
+    loan_type = columns["type"]
+    io_months = np.where(loan_type == LOAN_TYPES.index("interest_only"),
+                         np.maximum(columns["interest_only_years"] * 12 - age, 0), 0)
+    original = np.where(columns["principal"] > 0, columns["principal"], balance)
+    balloon = np.where(loan_type == LOAN_TYPES.index("balloon"), columns["balloon"] / 100 * original, 0.0)
+
+    flows = pool_cashflows(balance, rate, remaining, age, scenarios, io_months, balloon)
+    principal_paid = flows["scheduled_principal"] + flows["prepaid_principal"]
+    wal = weighted_average_life(principal_paid)
+
+    results = []
+    for i, scenario in enumerate(scenarios):
+        results.append({
+            "name": scenario.get("name", ", ".join(f"{k}={v}" for k, v in scenario.items() if k != "name")),
+            "summary": {
+                "total_interest": round(float(flows["interest"][i].sum()), 2),
+                "scheduled_principal": round(float(flows["scheduled_principal"][i].sum()), 2),
+                "prepaid_principal": round(float(flows["prepaid_principal"][i].sum()), 2),
+                "wal_years": round(float(wal[i]), 3)
+            },
+            "cashflows": {name: np.round(values[i], 2).tolist() for name, values in flows.items()}
+        })
+    return {
+        "pool_balance": round(float(balance.sum()), 2),
+        "loan_count": len(loans),
+        "months": list(range(1, flows["interest"].shape[1] + 1)),
+        "scenarios": results
+    }
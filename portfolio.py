@@ -0,0 +1,308 @@
+"""Portfolio analytics: WAC, WAM, WAL, duration and convexity by segment.
+
+Each loan's remaining scheduled cash flows (no prepayment) are reduced to a
+handful of per-loan sums, vectorized over loans. Fixed, interest-only and
+balloon loans have piecewise level payments with geometrically growing
+principal, so their sums are closed-form geometric moments and cost the same
+for any term; variable loans follow amortization_variable (annual payments
+re-amortized at each year's rate) as (loans, years) arrays. Loans that are
+interest-only to maturity repay the principal with the last payment. With
+cash flow CF_t at month t from today and discount rate y (annual %, monthly
+compounding, v = 1/(1+y/1200)):
+
+    PV            sum CF_t v^t
+    Macaulay      sum t CF_t v^t / PV / 12                    years
+    modified      Macaulay / (1 + y/1200)                     years
+    convexity     sum t (t+1) CF_t v^(t+2) / PV / 144         years^2
+    WAL           sum t principal_t / sum principal_t / 12    years
+
+The discount rate defaults to each loan's own rate. Loans aggregate by
+segment: balance-weighted WAC (%), WAM (months) and WAL, PV-weighted duration
+and convexity.
+
+A loan is a /calculate-style payload plus its age: "age" (months paid) or
+"remaining_months", and "vintage" (year) or "origination_date" for grouping.
+"""
+import numpy as np
+
+from cents import level_payment
+from loans import variable_rate_paths
+from spec import LOAN_TYPES, parse_loans, spec_columns
+
+TYPE_CODES = {name: code for code, name in enumerate(LOAN_TYPES)}
+GROUP_KEYS = ("type", "rate_band", "vintage")
+DEFAULT_RATE_BAND = 1.0
+# Below this |u n|, geometric moment sums are added term by term instead
+SERIES_THRESHOLD = 0.05
+# Upper bound on loan x month elements evaluated at once by the term-by-term sums
+BLOCK_ELEMENTS = 2_000_000
+
+def power_exp_sums(u, lo, hi):
+    """(G0, G1, G2) with Gk = sum over t = lo..hi of t^k e^(u t), per loan (zero when lo > hi)"""
+    n = np.maximum(hi - lo + 1, 0).astype(float)
+    # Hk = sum over s = 1..n of s^k x^s, from (1 - x) H1 = H0 - n x^(n+1) and
+    # (1 - x) H2 = 2 H1 - H0 - n^2 x^(n+1), which lose only ~1/(n u) per step
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        d = -np.expm1(u)
+        tail = np.exp(u * (n + 1))
+        h0 = np.exp(u) * np.expm1(u * n) / np.expm1(u)
+        h1 = (h0 - n * tail) / d
+        h2 = (2 * h1 - h0 - n * n * tail) / d
+
+    # Even so they cancel as u n -> 0; sum those loans term by term
+    near = (np.abs(u * n) < SERIES_THRESHOLD) & (n > 0)
+    if near.any():
+        longest = int(n[near].max())
+        step = max(1, BLOCK_ELEMENTS // longest)
+        s = np.arange(1, longest + 1, dtype=float)
+        for start in range(0, int(near.sum()), step):
+            idx = np.flatnonzero(near)[start:start + step]
+            terms = np.exp(u[idx, None] * s) * (s <= n[idx, None])
+            h0[idx], h1[idx], h2[idx] = terms.sum(axis=1), terms @ s, terms @ (s * s)
+    h0, h1, h2 = (np.where(n > 0, h, 0.0) for h in (h0, h1, h2))
+
+    # Shift s = 1..n to t = lo..hi: t = c + s
+    c = lo - 1.0
+    scale = np.exp(u * c)
+    return scale * h0, scale * (c * h0 + h1), scale * (c * c * h0 + 2 * c * h1 + h2)
+
+def _monthly_metrics(principal, rate, term_months, age, io_months, balloon_fraction, discount_rate):
+    """Metrics of monthly-pay loans (fixed, interest-only, balloon) in closed form.
+
+    Remaining payments are rL for interest-only months and the level payment
+    P afterwards, whose principal part grows geometrically, (P - rL) g^(j-1)
+    in amortizing month j; the balloon (all of the principal for loans that
+    are interest-only to maturity) is paid at maturity. Every sum is a
+    geometric moment, so the cost is independent of the term.
+    """
+    L, r = principal, rate / 1200
+    n, m, a = term_months, io_months, age
+    amortizing = n - m
+    lump = np.where(amortizing > 0, balloon_fraction, 1.0) * L
+    # Level payment through log1p/expm1, so tiny rates keep their digits
+    lg = np.log1p(r)
+    periods = np.maximum(amortizing, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payment = np.where(r == 0, L * (1 - balloon_fraction) / periods,
+                           (L - balloon_fraction * L * np.exp(-lg * periods)) * r / -np.expm1(-lg * periods))
+    payment = np.where(amortizing > 0, payment, 0.0)
+    interest_only = r * L
+
+    # Months from today: interest-only 1..m-a, amortizing lo..T, lump at T
+    T = (n - a).astype(float)
+    lo = np.maximum(a, m) + 1 - a
+    w = np.log1p(discount_rate / 1200)
+    i0, i1, i2 = power_exp_sums(-w, np.ones_like(T), (m - a).astype(float))
+    a0, a1, a2 = power_exp_sums(-w, lo.astype(float), T)
+    lump = np.where(T >= 1, lump, 0.0)
+    lump_pv = lump * np.exp(-w * T)
+
+    pv = interest_only * i0 + payment * a0 + lump_pv
+    s1 = interest_only * i1 + payment * a1 + lump_pv * T
+    s2 = interest_only * (i2 + i1) + payment * (a2 + a1) + lump_pv * T * (T + 1)
+
+    p0, p1, _ = power_exp_sums(lg, lo.astype(float), T)
+    scale = (payment - interest_only) * np.exp(lg * (a - m - 1))
+    paid = scale * p0 + lump
+    weighted_time = scale * p1 + lump * T
+    return _figures(pv, s1, s2, paid, weighted_time, discount_rate)
+
+def _figures(pv, s1, s2, paid, weighted_time, discount_rate):
+    """Per-loan figures from discounted cash-flow moments and principal moments"""
+    growth = 1 + discount_rate / 1200
+    with np.errstate(divide="ignore", invalid="ignore"):
+        macaulay = np.where(pv > 0, s1 / pv / 12, 0.0)
+        return {
+            "balance": paid,
+            "wal": np.where(paid > 0, weighted_time / paid / 12, 0.0),
+            "pv": pv,
+            "macaulay_duration": macaulay,
+            "modified_duration": macaulay / growth,
+            "convexity": np.where(pv > 0, s2 / pv / growth ** 2 / 144, 0.0)
+        }
+
+def _variable_metrics(principal, rate_paths, years, age, discount_rate):
+    """Metrics of variable loans: annual payments re-amortized over the remaining years"""
+    n_loans, n_years = rate_paths.shape
+    interest = np.zeros((n_loans, n_years))
+    principal_paid = np.zeros((n_loans, n_years))
+    balance = principal.astype(float)
+    for t in range(n_years):
+        active = t < years
+        rate = rate_paths[:, t] / 100
+        payment = level_payment(balance, rate, np.maximum(years - t, 1))
+        interest[:, t] = np.where(active, balance * rate, 0.0)
+        principal_paid[:, t] = np.where(active, payment - balance * rate, 0.0)
+        balance = np.where(active, balance - principal_paid[:, t], balance)
+
+    # Payment for year t + 1 falls at month 12 (t + 1); earlier ones are already paid
+    times = 12 * np.arange(1, n_years + 1)[None, :] - age[:, None]
+    future = times > 0
+    times = np.where(future, times, 0).astype(float)
+    principal_paid = principal_paid * future
+    weighted = (interest * future + principal_paid) * np.exp(-times * np.log1p(discount_rate[:, None] / 1200))
+    return _figures(weighted.sum(axis=1), (weighted * times).sum(axis=1), (weighted * times * (times + 1)).sum(axis=1),
+                    principal_paid.sum(axis=1), (principal_paid * times).sum(axis=1), discount_rate)
+
+def loan_analytics(columns, rate_paths=None, discount_rate=None):
+    """Per-loan remaining-cash-flow analytics for spec_columns-style arrays plus "age" (months).
+
+    rate_paths holds the annual rates of variable loans (rows in loan order,
+    others ignored). discount_rate is a scalar or per-loan annual %; default
+    each loan's coupon.
+    """
+    loan_type = columns["type"]
+    principal = columns["principal"]
+    term_months = columns["years"] * 12
+    age = np.clip(columns["age"], 0, term_months)
+    variable = loan_type == TYPE_CODES["variable"]
+
+    coupon = columns["rate"].astype(float).copy()
+    if variable.any():
+        paths = rate_paths[variable]
+        coupon[variable] = paths[np.arange(len(paths)), np.minimum(age[variable] // 12, paths.shape[1] - 1)]
+    discount = coupon if discount_rate is None else np.broadcast_to(
+        np.asarray(discount_rate, dtype=float), coupon.shape).astype(float)
+
+    io_months = np.where(loan_type == TYPE_CODES["interest_only"],
+                         np.minimum(columns["interest_only_years"] * 12, term_months), 0)
+    balloon = np.where(loan_type == TYPE_CODES["balloon"], columns["balloon"] / 100, 0.0)
+
+    names = ("balance", "wal", "pv", "macaulay_duration", "modified_duration", "convexity")
+    metrics = {name: np.zeros(len(principal)) for name in names}
+    monthly = ~variable
+    if monthly.any():
+        part = _monthly_metrics(principal[monthly], coupon[monthly], term_months[monthly], age[monthly],
+                                io_months[monthly], balloon[monthly], discount[monthly])
+        for name in names:
+            metrics[name][monthly] = part[name]
+    if variable.any():
+        part = _variable_metrics(principal[variable], rate_paths[variable], columns["years"][variable],
+                                 age[variable], discount[variable])
+        for name in names:
+            metrics[name][variable] = part[name]
+
+    metrics["rate"] = coupon
+    metrics["remaining_months"] = term_months - age
+    return metrics
+
+def _group_codes(key, columns, metrics, rate_band):
+    """(codes per loan, labels) for one group key"""
+    if key == "type":
+        codes = columns["type"].astype(np.int64)
+        return codes, list(LOAN_TYPES)
+    if key == "rate_band":
+        codes = np.floor(metrics["rate"] / rate_band).astype(np.int64)
+        lows = np.unique(codes)
+        labels = {int(c): f"{c * rate_band:g}-{(c + 1) * rate_band:g}" for c in lows}
+        return codes, labels
+    if key == "vintage":
+        return columns["vintage"], None
+    raise ValueError(f"group_by must be among: {', '.join(GROUP_KEYS)}")
+
+def aggregate(metrics):
+    """Portfolio-level figures from per-loan metrics"""
+    return segment_table(metrics, np.zeros(len(metrics["balance"]), dtype=np.int64), 1)[0]
+
+def segment_table(metrics, segment, n_segments):
+    """Per-segment figures (list of dicts) given each loan's segment index"""
+    def total(values):
+        return np.bincount(segment, weights=values, minlength=n_segments)
+
+    balance, pv = metrics["balance"], metrics["pv"]
+    loans = np.bincount(segment, minlength=n_segments)
+    total_balance, total_pv = total(balance), total(pv)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        by_balance = {name: total(metrics[key] * balance) / total_balance
+                      for name, key in (("wac", "rate"), ("wam_months", "remaining_months"), ("wal_years", "wal"))}
+        by_pv = {name: total(metrics[name] * pv) / total_pv
+                 for name in ("macaulay_duration", "modified_duration", "convexity")}
+
+    def clean(values, digits):
+        return [round(float(v), digits) if np.isfinite(v) else None for v in values]
+
+    columns = {
+        "loans": loans.tolist(),
+        "balance": clean(total_balance, 2),
+        "pv": clean(total_pv, 2),
+        "wac": clean(by_balance["wac"], 4),
+        "wam_months": clean(by_balance["wam_months"], 2),
+        "wal_years": clean(by_balance["wal_years"], 4),
+        **{name: clean(values, 4) for name, values in by_pv.items()}
+    }
+    return [{name: values[i] for name, values in columns.items()} for i in range(n_segments)]
+
+def group_by(columns, metrics, keys, rate_band=DEFAULT_RATE_BAND):
+    """Segments for a combination of group keys, each with its key values and figures"""
+    codes, labels = zip(*(_group_codes(k, columns, metrics, rate_band) for k in keys))
+    # Dense per-key indices folded into one integer key, so one 1-D unique finds the segments
+    values, inverses = zip(*(np.unique(c, return_inverse=True) for c in codes))
+    combined = np.ravel_multi_index([i.reshape(-1) for i in inverses], [len(v) for v in values])
+    present, segment = np.unique(combined, return_inverse=True)
+    table = segment_table(metrics, segment.reshape(-1), len(present))
+    positions = np.unravel_index(present, [len(v) for v in values])
+    for i, row in enumerate(table):
+        for key, key_labels, code in zip(keys, labels, (int(v[p[i]]) for v, p in zip(values, positions))):
+            if key_labels is None:
+                row[key] = code if code >= 0 else None
+            else:
+                row[key] = key_labels[code]
+    return [{**{k: row.pop(k) for k in keys}, **row} for row in table]
+
+def _vintage(loan):
+    if loan.get("vintage") not in (None, ""):
+        return int(loan["vintage"])
+    if loan.get("origination_date"):
+        return int(str(loan["origination_date"])[:4])
+    return -1
+
+def portfolio_columns(loans):
+    """spec_columns for request-style loans plus age, vintage and variable rate paths"""
+    specs = parse_loans(loans)
+    columns = spec_columns(specs)
+    columns["age"] = np.array([
+        int(l["age"]) if l.get("age") not in (None, "")
+        else s.years * 12 - int(l["remaining_months"]) if l.get("remaining_months") not in (None, "")
+        else 0
+        for l, s in zip(loans, specs)
+    ], dtype=np.int64)
+    columns["vintage"] = np.array([_vintage(l) for l in loans], dtype=np.int64)
+
+    # Variable paths padded with their last rate, as amortization_variable does
+    max_years = int(columns["years"].max())
+    rate_paths = np.zeros((len(specs), max_years))
+    variable = [i for i, spec in enumerate(specs) if spec.type == "variable"]
+    if variable:
+        rate_paths[variable] = variable_rate_paths([specs[i] for i in variable], max_years)
+    return columns, rate_paths
+
+def portfolio_report(data):
+    """Portfolio totals and segments for a /portfolio payload"""
+    loans = data.get("loans") or []
+    if not loans:
+        raise ValueError("At least one loan is required")
+    columns, rate_paths = portfolio_columns(loans)
+    if (columns["principal"] <= 0).any():
+        raise ValueError("Principal must be greater than 0")
+    if (columns["years"] <= 0).any():
+        raise ValueError("Years must be greater than 0")
+
+    discount_rate = data.get("discount_rate")
+    metrics = loan_analytics(columns, rate_paths, None if discount_rate in (None, "") else float(discount_rate))
+    group_keys = data.get("group_by", list(GROUP_KEYS))
+    rate_band = float(data.get("rate_band", DEFAULT_RATE_BAND))
+    if rate_band <= 0:
+        raise ValueError("rate_band must be greater than 0")
+
+    report = {
+        "portfolio": aggregate(metrics),
+        # Each key on its own; a list of keys groups by their combination
+        "segments": {
+            "+".join(keys) if isinstance(keys, list) else keys:
+                group_by(columns, metrics, keys if isinstance(keys, list) else [keys], rate_band)
+            for keys in group_keys
+        }
+    }
+    if data.get("per_loan"):
+        report["loans"] = {name: np.round(values, 4).tolist() for name, values in metrics.items()}
+    return report
@@ -1,6 +1,8 @@
-import pandas as pd
 import numpy as np
-from numpy_financial import pmt
+from loans import pmt
+
+# Loan fields /prepayment assumes when the payload leaves them out
+PREPAYMENT_DEFAULTS = {"principal": 100000, "rate": 5, "years": 30}
 
 def calculate_balance_after_months(principal, rate, years, months_paid):
     """Calculate remaining balance after specified months"""
@@ -16,17 +18,23 @@ def calculate_balance_after_months(principal, rate, years, months_paid):
         payment_factor = payment * (((1 + monthly_rate) ** months_paid) - 1) / monthly_rate
         return max(future_value - payment_factor, 0)
 
-def prepayment_scenarios(principal, rate, years, prepayment_amount, prepayment_start, prepayment_frequency):
+def scenario_frequencies(prepayment_frequency):
+    """Frequencies analyzed for a prepayment_frequency ('all' expands to every one)"""
+    if prepayment_frequency == 'all':
+        return ['monthly', 'yearly', 'quarterly', 'one_time']
+    return [prepayment_frequency]
+
+def optimal_amounts(principal):
+    """Monthly prepayment amounts compared in the optimal-amount table"""
+    return [100, 200, 500, 1000, principal * 0.01]
+
+def iter_prepayment_scenarios(principal, rate, years, prepayment_amount, prepayment_start, prepayment_frequency):
     """
-    Analyze impact of prepayments on loan
+    Yield prepayment_scenarios results piece by piece as (kind, row) pairs
     
-    Args:
-        principal: Loan amount
-        rate: Interest rate (%)
-        years: Loan term (years)
-        prepayment_amount: Additional payment amount
-        prepayment_start: Month to start prepayments (1-based)
-        prepayment_frequency: 'monthly', 'yearly', 'one_time', 'quarterly'
+    kind is 'original' (once, first), 'scenario' (one per frequency),
+    'optimal' (one per amount) and 'summary' (once, last), so callers can
+    stream rows as soon as each loop finishes.
     """
     
     monthly_rate = rate / 100 / 12
@@ -49,10 +57,16 @@ def prepayment_scenarios(principal, rate, years, prepayment_amount, prepayment_s
         if balance <= 0:
             break
     
+    yield 'original', {
+        'total_interest': round(total_interest_original, 2),
+        'total_months': total_months,
+        'monthly_payment': round(base_payment, 2)
+    }
+    
     # Scenario with prepayment
-    scenarios = []
+    best_scenario = None
     
-    for freq in [prepayment_frequency] if prepayment_frequency != 'all' else ['monthly', 'yearly', 'quarterly', 'one_time']:
+    for freq in scenario_frequencies(prepayment_frequency):
         balance = principal
         total_interest = 0
         month = 1
@@ -100,7 +114,7 @@ def prepayment_scenarios(principal, rate, years, prepayment_amount, prepayment_s
         months_saved = total_months - (month - 1)
         payback_period = prepayment_amount / (interest_savings / (month - 1)) if interest_savings > 0 else None
         
-        scenarios.append({
+        scenario = {
             'frequency': freq,
             'total_months': month - 1,
             'months_saved': max(months_saved, 0),
@@ -109,13 +123,15 @@ def prepayment_scenarios(principal, rate, years, prepayment_amount, prepayment_s
             'payback_period': round(payback_period, 1) if payback_period else None,
             'final_payment': round(schedule[-1]['payment'], 2) if schedule else 0,
             'recommendation': 'Good' if interest_savings > prepayment_amount * 0.5 else 'Moderate'
-        })
+        }
+        if best_scenario is None or scenario['interest_savings'] > best_scenario['interest_savings']:
+            best_scenario = scenario
+        yield 'scenario', scenario
     
     # Find optimal prepayment amount
-    optimal_results = []
-    amounts = [100, 200, 500, 1000, principal * 0.01]
+    highest_roi = None
     
-    for amount in amounts:
+    for amount in optimal_amounts(principal):
         balance = principal
         total_interest = 0
         month = 1
@@ -137,55 +153,181 @@ def prepayment_scenarios(principal, rate, years, prepayment_amount, prepayment_s
         interest_savings = total_interest_original - total_interest
         roi = (interest_savings / amount) * 100 if amount > 0 else 0
         
-        optimal_results.append({
+        optimal = {
             'prepayment_amount': amount,
             'interest_savings': round(interest_savings, 2),
             'months_saved': total_months - (month - 1),
             'roi_percent': round(roi, 1),
             'efficiency': 'High' if roi > 50 else 'Medium' if roi > 20 else 'Low'
-        })
-    
-    return {
-        'original': {
-            'total_interest': round(total_interest_original, 2),
-            'total_months': total_months,
-            'monthly_payment': round(base_payment, 2)
-        },
-        'scenarios': scenarios,
-        'optimal_prepayments': optimal_results,
-        'summary': {
-            'best_scenario': max(scenarios, key=lambda x: x['interest_savings']),
-            'highest_roi': max(optimal_results, key=lambda x: x['roi_percent']) if optimal_results else None
         }
+        if highest_roi is None or optimal['roi_percent'] > highest_roi['roi_percent']:
+            highest_roi = optimal
+        yield 'optimal', optimal
+    
+    yield 'summary', {
+        'best_scenario': best_scenario,
+        'highest_roi': highest_roi
     }
 
-def lump_sum_prepayment(principal, rate, years, lump_sum_amount, lump_sum_month):
-    """Analyze effect of a single lump sum prepayment"""
-    
-    # Calculate balance before lump sum
-    balance_before = calculate_balance_after_months(principal, rate, years, lump_sum_month - 1)
+def prepayment_scenarios(principal, rate, years, prepayment_amount, prepayment_start, prepayment_frequency):
+    """
+    Analyze impact of prepayments on loan
     
-    # Apply lump sum
-    balance_after = max(balance_before - lump_sum_amount, 0)
+    Args:
+        principal: Loan amount
+        rate: Interest rate (%)
+        years: Loan term (years)
+        prepayment_amount: Additional payment amount
+        prepayment_start: Month to start prepayments (1-based)
+        prepayment_frequency: 'monthly', 'yearly', 'one_time', 'quarterly' or 'all'
+    """
+    result = {'original': None, 'scenarios': [], 'optimal_prepayments': [], 'summary': None}
+    for kind, row in iter_prepayment_scenarios(principal, rate, years, prepayment_amount,
+                                               prepayment_start, prepayment_frequency):
+        if kind == 'scenario':
+            result['scenarios'].append(row)
+        elif kind == 'optimal':
+            result['optimal_prepayments'].append(row)
+        else:
+            result[kind] = row
+    return result
+
+def _discount_sum(v, first, last):
+    """sum of v**j for j = first..last (zero when first > last)"""
+    count = np.maximum(last - first + 1, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        geometric = v ** first * (1 - v ** count) / (1 - v)
+    return np.where(v == 1, count, geometric)
+
+def lump_sum_grid(principal, rate, years, amounts, months=None, mode='recast', discount_rate=0):
+    """
+    Exact outcomes of a lump sum paid before the payment of each month
     
-    # Recalculate remaining payments
-    remaining_months = years * 12 - lump_sum_month + 1
-    monthly_rate = rate / 100 / 12
+    Args:
+        principal, rate (%), years: Loan terms, scalars or arrays over loans
+        amounts: Lump-sum amounts
+        months: Months (1-based) to evaluate, default every month of the longest term
+        mode: 'keep_payment' (same payment, shorter term) or 'recast' (same term, lower payment)
+        discount_rate: Annual rate (%) for the net present value of the prepayment
     
-    if monthly_rate == 0:
-        new_payment = balance_after / remaining_months if remaining_months > 0 else 0
-    else:
-        new_payment = -pmt(monthly_rate, remaining_months, balance_after)
+    Returns a dict of (loans, amounts, months) arrays, NaN past a loan's term.
+    """
+    if mode not in ('keep_payment', 'recast'):
+        raise ValueError(f"Invalid lump sum mode: {mode}")
+    principal, rate, years = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(principal, dtype=float)),
+        np.asarray(rate, dtype=float),
+        np.asarray(years, dtype=float)
+    )
+    total_months = np.round(years * 12).astype(np.int64)
+    amounts = np.atleast_1d(np.asarray(amounts, dtype=float))
+    if months is None:
+        months = np.arange(1, total_months.max() + 1)
+    months = np.atleast_1d(np.asarray(months, dtype=np.int64))
+
+    # Shapes broadcast to (loans, amounts, months)
+    r = (rate / 100 / 12)[:, None, None]
+    n = total_months[:, None, None]
+    payment = -pmt(rate / 100 / 12, total_months, principal)[:, None, None]
+    k = months[None, None, :]
+    amount = amounts[None, :, None]
+    remaining = n - k + 1
+    v = 1 / (1 + discount_rate / 100 / 12)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        growth = (1 + r) ** (k - 1)
+        balance_before = np.where(r == 0, principal[:, None, None] - payment * (k - 1),
+                                  principal[:, None, None] * growth - payment * (growth - 1) / r)
+        balance_before = np.maximum(balance_before, 0)
+        paid = np.minimum(amount, balance_before)
+        balance_after = balance_before - paid
+        interest_before = payment * remaining - balance_before
+
+        if mode == 'recast':
+            new_payment = -pmt(np.broadcast_to(r, remaining.shape), remaining, balance_after)
+            new_payment = np.where(balance_after > 0, new_payment, 0)
+            interest_after = new_payment * remaining - balance_after
+            months_eliminated = np.where(balance_after > 0, 0, remaining)
+            npv = -paid * v ** k + (payment - new_payment) * _discount_sum(v, k, n)
+        else:
+            new_payment = np.broadcast_to(payment, balance_after.shape)
+            # Fractional number of payments left, then full payments plus a final partial one
+            periods = np.where(r == 0, balance_after / payment,
+                               -np.log1p(-balance_after * r / payment) / np.log1p(r))
+            full = np.floor(periods + 1e-9)
+            growth = (1 + r) ** full
+            left = np.where(r == 0, balance_after - payment * full,
+                            balance_after * growth - payment * (growth - 1) / r)
+            final = np.where(left >= 0.005, left * (1 + r), 0)
+            payments_left = full + (final > 0)
+            interest_after = payment * full + final - balance_after
+            months_eliminated = remaining - payments_left
+            npv = (-paid * v ** k + payment * _discount_sum(v, k + payments_left, n)
+                   + np.where(final > 0, (payment - final) * v ** (k + full), 0))
+
+    valid = (k <= n) & (k >= 1)
+    result = {
+        'balance_before': balance_before,
+        'balance_after': balance_after,
+        'new_payment': new_payment,
+        'interest_savings': interest_before - interest_after,
+        'months_eliminated': months_eliminated,
+        'net_present_value': npv
+    }
+    result = {name: np.where(valid, values, np.nan) for name, values in result.items()}
+    result['months'] = months
+    return result
+
+def best_lump_sum_month(grid):
+    """Month with the highest net present value for each (loan, amount)"""
+    npv = np.where(np.isnan(grid['net_present_value']), -np.inf, grid['net_present_value'])
+    return grid['months'][np.argmax(npv, axis=-1)]
+
+def lump_sum_curves(principal, rate, years, amounts, mode='recast', discount_rate=0):
+    """Savings curves over every lump-sum month and the best month, per loan and amount"""
+    grid = lump_sum_grid(principal, rate, years, amounts, mode=mode, discount_rate=discount_rate)
+    best = best_lump_sum_month(grid)
+    amounts = np.atleast_1d(np.asarray(amounts, dtype=float))
+
+    def columns(values):
+        # One pass over the whole grid; NaN (no effect) becomes None
+        return np.where(np.isnan(values), None, np.round(values, 2)).tolist()
+
+    curve_names = ('interest_savings', 'net_present_value', 'months_eliminated')
+    curve_lists = {name: columns(grid[name]) for name in curve_names}
+    loans = []
+    for i in range(grid['interest_savings'].shape[0]):
+        curves = []
+        for j, amount in enumerate(amounts.tolist()):
+            m = int(best[i, j]) - 1
+            curves.append({
+                'amount': amount,
+                'best_month': int(best[i, j]),
+                'best_interest_savings': round(float(grid['interest_savings'][i, j, m]), 2),
+                'best_net_present_value': round(float(grid['net_present_value'][i, j, m]), 2),
+                **{name: curve_lists[name][i][j] for name in curve_names}
+            })
+        loans.append(curves)
+    return {'mode': mode, 'months': grid['months'].tolist(), 'loans': loans}
+
+def lump_sum_prepayment(principal, rate, years, lump_sum_amount, lump_sum_month, mode='recast'):
+    """Analyze effect of a single lump sum prepayment
     
-    # Calculate savings
-    original_balance = calculate_balance_after_months(principal, rate, years, lump_sum_month)
-    interest_savings = (original_balance - balance_after) * monthly_rate * remaining_months
+    new_monthly_payment is the recast payment and months_eliminated the term
+    reduction when the payment is kept; interest_savings follows mode.
+    """
+    if not 1 <= lump_sum_month <= years * 12:
+        raise ValueError("Lump sum month must be within the loan term")
+    recast = lump_sum_grid(principal, rate, years, lump_sum_amount, [lump_sum_month], mode='recast')
+    keep = lump_sum_grid(principal, rate, years, lump_sum_amount, [lump_sum_month], mode='keep_payment')
+    interest_savings = float((recast if mode == 'recast' else keep)['interest_savings'][0, 0, 0])
     
     return {
-        'balance_before': round(balance_before, 2),
-        'balance_after': round(balance_after, 2),
-        'new_monthly_payment': round(new_payment, 2),
+        'balance_before': round(float(recast['balance_before'][0, 0, 0]), 2),
+        'balance_after': round(float(recast['balance_after'][0, 0, 0]), 2),
+        'new_monthly_payment': round(float(recast['new_payment'][0, 0, 0]), 2),
         'interest_savings': round(interest_savings, 2),
         'effective_roi': round((interest_savings / lump_sum_amount) * 100, 1) if lump_sum_amount > 0 else 0,
-        'months_eliminated': int((lump_sum_amount / new_payment) if new_payment > 0 else 0)
+        'months_eliminated': int(keep['months_eliminated'][0, 0, 0]),
+        'mode': mode
     }
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""Precomputed payment-factor and APR tables for rate-sheet quoting.
+
+A RateSheet holds, over a grid of annual rates (1/8 point steps by default),
+terms and fee ratios (fees / principal):
+
+    factors[rate, term]      monthly payment per $1 of principal
+    aprs[rate, term, fee]    true APR (%), as calculate_true_apr computes it
+
+Tables are saved as .npy files and loaded memory-mapped, so a quote is an
+index computation and a couple of array reads. APRs at off-grid rates and fee
+ratios are interpolated between neighbouring grid points; payments at
+off-grid rates are computed exactly, which costs no more than the lookup and
+keeps them to the cent. Terms off the grid, or inputs outside it, fall back
+to exact computation.
+
+Usage:
+    python ratesheet.py build DIR
+    python ratesheet.py sheet DIR --principals 100000 250000 [--output FILE]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+from loans import pmt, annuity_rate
+
+DEFAULT_RATES = np.round(np.arange(1, 161) * 0.125, 3)          # 0.125% .. 20%
+DEFAULT_TERMS = np.arange(1, 41) * 12                            # 1 .. 40 years, in months
+DEFAULT_FEE_RATIOS = np.round(np.arange(0, 21) * 0.0025, 4)     # 0% .. 5% of principal
+
+GRID_FILE = "grid.json"
+
+def payment_factors(rates, terms):
+    """Monthly payment per $1 of principal over a (rate, term) grid"""
+    rates = np.asarray(rates, dtype=float)[:, None]
+    terms = np.asarray(terms, dtype=float)[None, :]
+    return -pmt(rates / 100 / 12, terms, 1.0)
+
+def apr_from_factors(factors, terms, fee_ratios):
+    """True APR (%) for every (rate, term, fee ratio), given payment factors"""
+    factors = np.asarray(factors, dtype=float)[:, :, None]
+    terms = np.asarray(terms, dtype=float)[None, :, None]
+    fee_ratios = np.asarray(fee_ratios, dtype=float)[None, None, :]
+    monthly_rate = annuity_rate(1 - fee_ratios, factors, terms)
+    return ((1 + monthly_rate) ** 12 - 1) * 100
+
+def _axis_position(axis, values):
+    """Fractional grid position of values on a uniformly spaced axis; NaN outside it"""
+    values = np.asarray(values, dtype=float)
+    if len(axis) == 1:
+        return np.where(np.isclose(values, axis[0]), 0.0, np.nan)
+    step = axis[1] - axis[0]
+    position = (values - axis[0]) / step
+    # Snap positions that are on the grid up to float noise
+    snapped = np.round(position)
+    position = np.where(np.abs(position - snapped) < 1e-6, snapped, position)
+    return np.where((position >= 0) & (position <= len(axis) - 1), position, np.nan)
+
+def _interpolate(table, position, *index):
+    """Linear interpolation of table along its first axis at fractional position"""
+    lower = np.clip(np.floor(position).astype(np.int64), 0, table.shape[0] - 1)
+    upper = np.minimum(lower + 1, table.shape[0] - 1)
+    weight = position - lower
+    return table[(lower,) + index] * (1 - weight) + table[(upper,) + index] * weight
+
+class RateSheet:
+    """Payment-factor and APR lookup tables over a (rate, term, fee ratio) grid"""
+
+    def __init__(self, rates, terms, fee_ratios, factors, aprs):
+        self.rates = np.asarray(rates, dtype=float)
+        self.terms = np.asarray(terms, dtype=np.int64)
+        self.fee_ratios = np.asarray(fee_ratios, dtype=float)
+        self.factors = factors
+        self.aprs = aprs
+
+    @classmethod
+    def build(cls, rates=DEFAULT_RATES, terms=DEFAULT_TERMS, fee_ratios=DEFAULT_FEE_RATIOS):
+        factors = payment_factors(rates, terms)
+        return cls(rates, terms, fee_ratios, factors, apr_from_factors(factors, terms, fee_ratios))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "factors.npy"), np.ascontiguousarray(self.factors))
+        np.save(os.path.join(path, "aprs.npy"), np.ascontiguousarray(self.aprs))
+        with open(os.path.join(path, GRID_FILE), "w") as f:
+            json.dump({
+                "rates": self.rates.tolist(),
+                "terms": self.terms.tolist(),
+                "fee_ratios": self.fee_ratios.tolist()
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        """Open saved tables memory-mapped (read-only)"""
+        with open(os.path.join(path, GRID_FILE)) as f:
+            grid = json.load(f)
+        factors = np.load(os.path.join(path, "factors.npy"), mmap_mode="r")
+        aprs = np.load(os.path.join(path, "aprs.npy"), mmap_mode="r")
+        return cls(grid["rates"], grid["terms"], grid["fee_ratios"], factors, aprs)
+
+    def quote_batch(self, principal, rate, term_months, fees=0, interpolate=True):
+        """Payments and APRs for arrays of loans.
+
+        Returns a dict of arrays 'payment', 'apr' and 'source', where source is
+        0 for an exact grid hit, 1 for an interpolated APR (the payment is
+        exact) and 2 for exact computation off the grid.
+        """
+        principal, rate, term_months, fees = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(principal, dtype=float)),
+            np.asarray(rate, dtype=float),
+            np.asarray(term_months, dtype=np.int64),
+            np.asarray(fees, dtype=float)
+        )
+        fee_ratio = np.divide(fees, principal, out=np.zeros_like(fees), where=principal > 0)
+
+        term_idx = np.minimum(np.searchsorted(self.terms, term_months), len(self.terms) - 1)
+        term_idx = np.where(self.terms[term_idx] == term_months, term_idx, -1)
+        rate_pos = _axis_position(self.rates, rate)
+        fee_pos = _axis_position(self.fee_ratios, fee_ratio)
+
+        on_grid = (term_idx >= 0) & ~np.isnan(rate_pos) & ~np.isnan(fee_pos)
+        exact_hit = on_grid & (rate_pos == np.round(rate_pos)) & (fee_pos == np.round(fee_pos))
+        use_table = exact_hit | (on_grid & interpolate)
+
+        payment = np.empty(principal.shape)
+        apr = np.empty(principal.shape)
+        source = np.full(principal.shape, 2, dtype=np.int8)
+
+        if use_table.any():
+            t = term_idx[use_table]
+            r = rate_pos[use_table]
+            fp = fee_pos[use_table]
+            # Table factors at grid rates; the exact factor between them
+            on_rate = r == np.round(r)
+            factor = np.where(on_rate, np.asarray(self.factors)[np.round(r).astype(np.int64), t],
+                              -pmt(rate[use_table] / 100 / 12, term_months[use_table], 1.0))
+
+            # Bilinear in (rate, fee ratio)
+            aprs = np.asarray(self.aprs)
+            f_lower = np.clip(np.floor(fp).astype(np.int64), 0, aprs.shape[2] - 1)
+            f_upper = np.minimum(f_lower + 1, aprs.shape[2] - 1)
+            f_weight = fp - f_lower
+            apr_value = (_interpolate(aprs, r, t, f_lower) * (1 - f_weight)
+                         + _interpolate(aprs, r, t, f_upper) * f_weight)
+
+            payment[use_table] = principal[use_table] * factor
+            apr[use_table] = apr_value
+            source[use_table] = np.where(exact_hit[use_table], 0, 1)
+
+        fallback = ~use_table
+        if fallback.any():
+            p = principal[fallback]
+            payment[fallback] = -pmt(rate[fallback] / 100 / 12, term_months[fallback], p)
+            monthly_rate = annuity_rate(p - fees[fallback], payment[fallback], term_months[fallback])
+            apr[fallback] = ((1 + monthly_rate) ** 12 - 1) * 100
+
+        return {"payment": payment, "apr": apr, "source": source}
+
+    def quote(self, principal, rate, term_months, fees=0, interpolate=True):
+        """Payment and APR for a single loan"""
+        result = self.quote_batch(principal, rate, term_months, fees, interpolate)
+        apr = result["apr"][0]
+        return {
+            "monthly_payment": round(float(result["payment"][0]), 2),
+            "apr": round(float(apr), 3) if np.isfinite(apr) else None,
+            "source": ["table", "interpolated", "exact"][int(result["source"][0])]
+        }
+
+    def rate_sheet(self, principals, fee_ratio=0.0):
+        """Full (principal, rate, term) grid of payments and APRs as columns"""
+        principals = np.asarray(principals, dtype=float)
+        fee_pos = _axis_position(self.fee_ratios, fee_ratio)
+        if np.isnan(fee_pos):
+            raise ValueError(f"Fee ratio {fee_ratio} is outside the table")
+        fee_pos = float(fee_pos)
+
+        aprs = np.asarray(self.aprs)
+        lower = int(np.floor(fee_pos))
+        upper = min(lower + 1, aprs.shape[2] - 1)
+        weight = fee_pos - lower
+        apr = aprs[:, :, lower] * (1 - weight) + aprs[:, :, upper] * weight
+
+        n_p, n_r, n_t = len(principals), len(self.rates), len(self.terms)
+        return {
+            "principal": np.repeat(principals, n_r * n_t),
+            "rate": np.tile(np.repeat(self.rates, n_t), n_p),
+            "term_months": np.tile(self.terms, n_p * n_r),
+            "monthly_payment": np.round(principals[:, None, None] * np.asarray(self.factors)[None], 2).ravel(),
+            "apr": np.round(np.broadcast_to(apr, (n_p, n_r, n_t)), 3).ravel()
+        }
+
+_default_sheet = None
+
+def default_sheet():
+    """Sheet loaded from LOAN_RATESHEET_PATH if set, otherwise built in memory once"""
+    global _default_sheet
+    if _default_sheet is None:
+        path = os.environ.get("LOAN_RATESHEET_PATH")
+        if path and os.path.exists(os.path.join(path, GRID_FILE)):
+            _default_sheet = RateSheet.load(path)
+        else:
+            _default_sheet = RateSheet.build()
+    return _default_sheet
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build rate-sheet tables and emit rate sheets")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="precompute tables into DIR")
+    build.add_argument("path")
+
+    sheet = sub.add_parser("sheet", help="write the full grid for a list of principals as CSV")
+    sheet.add_argument("path")
+    sheet.add_argument("--principals", type=float, nargs="+", required=True)
+    sheet.add_argument("--fee-ratio", type=float, default=0.0)
+    sheet.add_argument("--output", help="CSV file (default: stdout)")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        RateSheet.build().save(args.path)
+        return 0
+
+    columns = RateSheet.load(args.path).rate_sheet(args.principals, args.fee_ratio)
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(list(columns))
+        writer.writerows(zip(*(c.tolist() for c in columns.values())))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Closed-form rate, term and principal sensitivities.
+
+Fixed, interest-only and balloon loans share one closed form. With monthly
+rate r, IO months m, amortizing months N = n - m and balloon fraction b:
+
+    payment         P = (L - b L (1+r)^-N) r / (1 - (1+r)^-N)
+    total interest  I = m L r + N P + b L - L
+    balance at k    L                                   for k <= m
+                    L (1+r)^j - P ((1+r)^j - 1) / r     with j = k - m
+                    0                                   for k >= n
+
+Exact first and second derivatives come from evaluating these formulas on
+second-order jets (value, d/dx, d2/dx2), one pass per input, vectorized over
+loans, so no schedule is ever built.
+
+Units: rate derivatives are per percentage point of annual rate, term
+derivatives per year (term treated as continuous), principal derivatives
+per dollar.
+"""
+import numpy as np
+
+from spec import LOAN_TYPES, parse_loans, spec_columns
+
+CLOSED_FORM_TYPES = ("fixed", "interest_only", "balloon")
+QUANTITIES = ("payment", "total_interest", "balance")
+
+# The jets lose precision to cancellation as r -> 0, so formulas are evaluated
+# no lower than this monthly rate; values and rate derivatives of loans below
+# it are carried back to their actual rate by a second-order Taylor step.
+MIN_MONTHLY_RATE = 1e-5
+
+class Jet:
+    """Value with first and second derivative along one input direction"""
+    __slots__ = ("v", "d", "dd")
+    # Make numpy arrays defer to Jet's reflected operators
+    __array_ufunc__ = None
+
+    def __init__(self, v, d=0.0, dd=0.0):
+        self.v = np.asarray(v, dtype=float)
+        self.d = np.broadcast_to(np.asarray(d, dtype=float), self.v.shape)
+        self.dd = np.broadcast_to(np.asarray(dd, dtype=float), self.v.shape)
+
+    @staticmethod
+    def lift(x):
+        return x if isinstance(x, Jet) else Jet(x)
+
+    def __add__(self, other):
+        other = Jet.lift(other)
+        return Jet(self.v + other.v, self.d + other.d, self.dd + other.dd)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return Jet(-self.v, -self.d, -self.dd)
+
+    def __sub__(self, other):
+        return self + (-Jet.lift(other))
+
+    def __rsub__(self, other):
+        return Jet.lift(other) - self
+
+    def __mul__(self, other):
+        other = Jet.lift(other)
+        return Jet(
+            self.v * other.v,
+            self.d * other.v + self.v * other.d,
+            self.dd * other.v + 2 * self.d * other.d + self.v * other.dd
+        )
+
+    __rmul__ = __mul__
+
+    def reciprocal(self):
+        inv = 1 / self.v
+        return Jet(inv, -self.d * inv ** 2, (2 * self.d ** 2 * inv - self.dd) * inv ** 2)
+
+    def __truediv__(self, other):
+        return self * Jet.lift(other).reciprocal()
+
+    def __rtruediv__(self, other):
+        return Jet.lift(other) * self.reciprocal()
+
+def jet_exp(x):
+    e = np.exp(x.v)
+    return Jet(e, e * x.d, e * (x.dd + x.d ** 2))
+
+def jet_log(x):
+    return Jet(np.log(x.v), x.d / x.v, (x.dd * x.v - x.d ** 2) / x.v ** 2)
+
+def jet_where(condition, a, b):
+    a, b = Jet.lift(a), Jet.lift(b)
+    return Jet(np.where(condition, a.v, b.v), np.where(condition, a.d, b.d), np.where(condition, a.dd, b.dd))
+
+def closed_form(principal, monthly_rate, n_months, io_months, balloon_fraction, horizon):
+    """Payment, total interest and balance at horizon as jets (inputs may be jets)"""
+    L, r, n = Jet.lift(principal), Jet.lift(monthly_rate), Jet.lift(n_months)
+    m = np.asarray(io_months, dtype=float)
+    b = np.asarray(balloon_fraction, dtype=float)
+    full_io = n.v <= m
+
+    N = jet_where(full_io, 1.0, n - m)
+    log_growth = jet_log(1 + r)
+    discount = jet_exp(-(N * log_growth))
+    payment = (L - b * L * discount) * r / (1 - discount)
+    total_interest = m * L * r + N * payment + b * L - L
+
+    horizon = np.asarray(horizon, dtype=float)
+    j = np.maximum(horizon - m, 0)
+    growth_j = jet_exp(j * log_growth)
+    balance = jet_where(j > 0, L * growth_j - payment * (growth_j - 1) / r, L)
+    # Paid off (balloon included) at maturity; the annuity does not extend past it
+    balance = jet_where(horizon >= n.v, 0.0, balance)
+
+    # Interest-only for the whole term: interest payments, principal never amortized
+    payment = jet_where(full_io, L * r, payment)
+    total_interest = jet_where(full_io, n * L * r, total_interest)
+    balance = jet_where(full_io, L, balance)
+    return {"payment": payment, "total_interest": total_interest, "balance": balance}
+
+def loan_arrays(loans):
+    """Column arrays (principal, rate, years, io_months, balloon_fraction) from request-style dicts"""
+    specs = parse_loans(loans)
+    for i, spec in enumerate(specs):
+        if spec.type not in CLOSED_FORM_TYPES:
+            raise ValueError(f"loans[{i}]: Sensitivities are not available for loan type: {spec.type}")
+
+    columns = spec_columns(specs)
+    loan_type = columns["type"]
+    years = columns["years"].astype(float)
+    io_years = np.where(loan_type == LOAN_TYPES.index("interest_only"), columns["interest_only_years"], 0)
+    balloon = np.where(loan_type == LOAN_TYPES.index("balloon"), columns["balloon"] / 100, 0.0)
+    return columns["principal"], columns["rate"], years, np.minimum(io_years, years) * 12, balloon
+
+def sensitivities(principal, rate, years, io_months=0, balloon_fraction=0, horizon_months=60):
+    """Values and first/second derivatives of each quantity with respect to each input.
+
+    Returns {quantity: {"value": arr, "d_rate": arr, "d2_rate": arr, ...}}.
+    """
+    principal = np.asarray(principal, dtype=float)
+    actual_rate = np.asarray(rate, dtype=float) / 1200
+    monthly_rate = np.maximum(actual_rate, MIN_MONTHLY_RATE)
+    n_months = np.asarray(years, dtype=float) * 12
+
+    seeds = {
+        "rate": (principal, Jet(monthly_rate, 1 / 1200), n_months),
+        "term": (principal, monthly_rate, Jet(n_months, 12.0)),
+        "principal": (Jet(principal, 1.0), monthly_rate, n_months)
+    }
+    result = {q: {} for q in QUANTITIES}
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for name, (L, r, n) in seeds.items():
+            jets = closed_form(L, r, n, io_months, balloon_fraction, horizon_months)
+            for q in QUANTITIES:
+                result[q]["value"] = jets[q].v
+                result[q][f"d_{name}"] = np.array(jets[q].d)
+                result[q][f"d2_{name}"] = np.array(jets[q].dd)
+
+    # Rate step back from the floor, in percentage points
+    h = (actual_rate - monthly_rate) * 1200
+    for values in result.values():
+        values["value"] = values["value"] + values["d_rate"] * h + 0.5 * values["d2_rate"] * h ** 2
+        values["d_rate"] = values["d_rate"] + values["d2_rate"] * h
+    return result
+
+def tornado(greeks, bumps, principal):
+    """Second-order Taylor contributions of down/up bumps to each quantity, summed over loans.
+
+    bumps holds the rate bump in percentage points, the term bump in years
+    and the principal bump as a fraction of each loan's principal.
+    """
+    steps = {
+        "rate": np.full(principal.shape, float(bumps.get("rate", 1.0))),
+        "term": np.full(principal.shape, float(bumps.get("term", 5.0))),
+        "principal": principal * float(bumps.get("principal", 0.1))
+    }
+    charts = {}
+    for q in QUANTITIES:
+        rows = []
+        for name, h in steps.items():
+            d, d2 = greeks[q][f"d_{name}"], greeks[q][f"d2_{name}"]
+            up = np.nansum(d * h + 0.5 * d2 * h ** 2)
+            down = np.nansum(-d * h + 0.5 * d2 * h ** 2)
+            rows.append({
+                "input": name,
+                "down": round(float(down), 2),
+                "up": round(float(up), 2),
+                "range": round(float(abs(up - down)), 2)
+            })
+        charts[q] = sorted(rows, key=lambda row: row["range"], reverse=True)
+    return charts
+
+def risk_report(data):
+    """Per-loan sensitivities and portfolio tornado charts for a /risk payload"""
+    loans = data.get("loans")
+    if not loans:
+        loans = [data]
+    horizon = int(data.get("horizon_months", 60))
+    principal, rate, years, io_months, balloon = loan_arrays(loans)
+    if (principal <= 0).any():
+        raise ValueError("Principal must be greater than 0")
+    if (years <= 0).any():
+        raise ValueError("Years must be greater than 0")
+
+    greeks = sensitivities(principal, rate, years, io_months, balloon, horizon)
+    return {
+        "horizon_months": horizon,
+        "loans": {
+            q: {k: [x if np.isfinite(x) else None for x in np.round(v, 6).tolist()] for k, v in values.items()}
+            for q, values in greeks.items()
+        },
+        "tornado": tornado(greeks, data.get("bumps", {}), principal)
+    }
@@ -1,6 +1,36 @@
 let currentSchedule = [];
 let currentLoanData = {};
 let currentSummary = {};
+let currentResultId = null;
+
+// Calculation responses carry an ETag derived from the request body; repeat
+// requests revalidate with If-None-Match and reuse the cached body on a 304.
+const etagCache = new Map();
+const ETAG_CACHE_SIZE = 20;
+
+async function cachedPost(url, payload) {
+    const body = JSON.stringify(payload);
+    const key = url + " " + body;
+    const cached = etagCache.get(key);
+    const headers = {"Content-Type": "application/json"};
+    if (cached) headers["If-None-Match"] = cached.etag;
+    
+    const response = await fetch(url, {method: "POST", headers, body});
+    if (response.status === 304 && cached) {
+        return new Response(cached.text, {status: 200, headers: {"Content-Type": "application/json"}});
+    }
+    
+    const etag = response.headers.get("ETag");
+    if (response.ok && etag) {
+        const text = await response.clone().text();
+        etagCache.delete(key);
+        etagCache.set(key, {etag, text});
+        if (etagCache.size > ETAG_CACHE_SIZE) {
+            etagCache.delete(etagCache.keys().next().value);
+        }
+    }
+    return response;
+}
 let loanOfferCounter = 2;
 let visualizationData = {};
 
@@ -186,11 +216,7 @@ async function calculate() {
     `;
     
     try {
-        const response = await fetch("/calculate", {
-            method: "POST",
-            headers: {"Content-Type": "application/json"},
-            body: JSON.stringify(payload)
-        });
+        const response = await cachedPost("/calculate", payload);
         
         if (!response.ok) {
             const error = await response.json();
@@ -205,6 +231,7 @@ async function calculate() {
         
         currentSchedule = data.schedule;
         currentSummary = data.summary;
+        currentResultId = data.result_id || null;
         visualizationData = data.visualization || {};
         
         // Build summary HTML with grid layout
@@ -519,17 +546,30 @@ function displaySchedule(schedule) {
 }
 
 // Export Functions
+// Exports reference the server-side result by ID; the full schedule is only
+// uploaded if the server no longer has it.
+function postExport(url, fullBody) {
+    const post = body => fetch(url, {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify(body)
+    });
+    
+    if (!currentResultId) return post(fullBody);
+    return post({result_id: currentResultId}).then(res => {
+        if (res.status !== 404) return res;
+        currentResultId = null;
+        return post(fullBody);
+    });
+}
+
 function exportToCSV() {
     if (!currentSchedule || currentSchedule.length === 0) {
         alert("No data to export");
         return;
     }
     
-    fetch("/export", {
-        method: "POST",
-        headers: {"Content-Type": "application/json"},
-        body: JSON.stringify({data: currentSchedule})
-    })
+    postExport("/export", {data: currentSchedule})
     .then(res => {
         if (!res.ok) throw new Error("Export failed");
         return res.blob();
@@ -554,11 +594,7 @@ function exportToHTML() {
         loan_data: currentLoanData
     };
     
-    fetch("/export/html", {
-        method: "POST",
-        headers: {"Content-Type": "application/json"},
-        body: JSON.stringify(exportData)
-    })
+    postExport("/export/html", exportData)
     .then(res => {
         if (!res.ok) throw new Error("HTML export failed");
         return res.blob();
@@ -583,11 +619,7 @@ function exportToText() {
         loan_data: currentLoanData
     };
     
-    fetch("/export/text", {
-        method: "POST",
-        headers: {"Content-Type": "application/json"},
-        body: JSON.stringify(exportData)
-    })
+    postExport("/export/text", exportData)
     .then(res => {
         if (!res.ok) throw new Error("Text export failed");
         return res.blob();
@@ -638,11 +670,7 @@ async function compareLoans() {
     }
     
     try {
-        const response = await fetch('/compare', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({offers: loanOffers})
-        });
+        const response = await cachedPost('/compare', {offers: loanOffers});
         
         if (!response.ok) throw new Error('Comparison failed');
         
@@ -706,11 +734,7 @@ async function sensitivityAnalysis() {
     };
     
     try {
-        const response = await fetch('/sensitivity', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify(payload)
-        });
+        const response = await cachedPost('/sensitivity', payload);
         
         if (!response.ok) throw new Error('Analysis failed');
         
@@ -827,6 +851,115 @@ async function affordabilityAnalysis() {
     }
 }
 
+// POST a payload to a /stream/<kind> endpoint and dispatch its Server-Sent
+// Events to handlers as they arrive: handlers.result(kind, row),
+// handlers.progress({done, total, elapsed, eta}) and handlers.done(info).
+async function streamPost(url, payload, handlers) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json', 'Accept': 'text/event-stream'},
+        body: JSON.stringify(payload)
+    });
+    if (!response.ok || !response.body) throw new Error('Stream request failed');
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+        
+        let end;
+        while ((end = buffer.indexOf('\n\n')) >= 0) {
+            const message = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            let event = 'message';
+            let data = '';
+            message.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            const body = data ? JSON.parse(data) : {};
+            if (event === 'error') throw new Error(body.error);
+            if (event === 'result' && handlers.result) handlers.result(body.kind, body.row);
+            else if (handlers[event]) handlers[event](body);
+        }
+    }
+}
+
+function formatEta(progress) {
+    return `${progress.done} of ${progress.total} done, about ${Math.ceil(progress.eta)}s left`;
+}
+
+function renderPrepayment(data, payload) {
+    let html = `<h4>Prepayment Analysis</h4>`;
+    
+    // Original loan info
+    if (data.original) html += `
+        <div class="metric-card">
+            <div class="metric-title">Original Loan</div>
+            <div class="metric-value">$${data.original.monthly_payment.toLocaleString()}/month</div>
+            <div class="metric-description">
+                Total Interest: $${data.original.total_interest.toLocaleString()} | 
+                Term: ${data.original.total_months} months
+            </div>
+        </div>
+    `;
+    
+    // Prepayment scenarios
+    if (data.scenarios && data.scenarios.length > 0) {
+        html += `<h5 style="margin-top: 20px;">Prepayment Scenarios</h5>`;
+        html += '<table class="prepayment-table"><tr><th>Frequency</th><th>Interest Saved</th><th>Months Saved</th><th>New Term</th><th>Recommendation</th></tr>';
+        
+        data.scenarios.forEach(scenario => {
+            html += `<tr>
+                <td>${scenario.frequency}</td>
+                <td>$${scenario.interest_savings.toLocaleString()}</td>
+                <td>${scenario.months_saved}</td>
+                <td>${scenario.total_months} months</td>
+                <td><span class="${scenario.recommendation === 'Good' ? 'positive' : ''}">${scenario.recommendation}</span></td>
+            </tr>`;
+        });
+        
+        html += '</table>';
+    }
+    
+    // Optimal prepayment amounts
+    if (data.optimal_prepayments && data.optimal_prepayments.length > 0) {
+        html += `<h5 style="margin-top: 20px;">Optimal Prepayment Amounts</h5>`;
+        html += '<table class="prepayment-table"><tr><th>Amount</th><th>Interest Saved</th><th>ROI</th><th>Efficiency</th></tr>';
+        
+        data.optimal_prepayments.forEach(prepay => {
+            html += `<tr>
+                <td>$${prepay.prepayment_amount.toLocaleString()}</td>
+                <td>$${prepay.interest_savings.toLocaleString()}</td>
+                <td>${prepay.roi_percent}%</td>
+                <td><span class="${prepay.efficiency === 'High' ? 'positive' : prepay.efficiency === 'Low' ? 'negative' : ''}">${prepay.efficiency}</span></td>
+            </tr>`;
+        });
+        
+        html += '</table>';
+    }
+    
+    // Best scenario
+    if (data.summary && data.summary.best_scenario) {
+        const best = data.summary.best_scenario;
+        html += `
+            <div class="metric-card success" style="margin-top: 20px;">
+                <div class="metric-title">Best Prepayment Strategy</div>
+                <div class="metric-value">${best.frequency} prepayments of $${payload.prepayment_amount}</div>
+                <div class="metric-description">
+                    Save $${best.interest_savings.toLocaleString()} in interest | 
+                    Pay off ${best.months_saved} months early
+                </div>
+            </div>
+        `;
+    }
+    
+    return html;
+}
+
 async function prepaymentAnalysis() {
     const payload = {
         principal: parseFloat(document.getElementById('prepayPrincipal').value),
@@ -836,86 +969,34 @@ async function prepaymentAnalysis() {
         prepayment_start: parseInt(document.getElementById('prepaymentStart').value),
         prepayment_frequency: document.getElementById('prepaymentFrequency').value
     };
+    const target = document.getElementById('prepaymentResult');
+    
+    // Rows render as the server finishes them instead of after the whole analysis
+    const data = {original: null, scenarios: [], optimal_prepayments: [], summary: null};
+    let status = '';
+    const render = () => {
+        target.innerHTML = renderPrepayment(data, payload) + (status ? `<p class="metric-description">${status}</p>` : '');
+    };
     
     try {
-        const response = await fetch('/prepayment', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify(payload)
+        await streamPost('/stream/prepayment', payload, {
+            result(kind, row) {
+                if (kind === 'scenario') data.scenarios.push(row);
+                else if (kind === 'optimal') data.optimal_prepayments.push(row);
+                else data[kind] = row;
+                render();
+            },
+            progress(progress) {
+                status = formatEta(progress);
+                render();
+            },
+            done() {
+                status = '';
+                render();
+            }
         });
-        
-        if (!response.ok) throw new Error('Prepayment analysis failed');
-        
-        const data = await response.json();
-        
-        let html = `<h4>Prepayment Analysis</h4>`;
-        
-        // Original loan info
-        html += `
-            <div class="metric-card">
-                <div class="metric-title">Original Loan</div>
-                <div class="metric-value">$${data.original.monthly_payment.toLocaleString()}/month</div>
-                <div class="metric-description">
-                    Total Interest: $${data.original.total_interest.toLocaleString()} | 
-                    Term: ${data.original.total_months} months
-                </div>
-            </div>
-        `;
-        
-        // Prepayment scenarios
-        if (data.scenarios && data.scenarios.length > 0) {
-            html += `<h5 style="margin-top: 20px;">Prepayment Scenarios</h5>`;
-            html += '<table class="prepayment-table"><tr><th>Frequency</th><th>Interest Saved</th><th>Months Saved</th><th>New Term</th><th>Recommendation</th></tr>';
-            
-            data.scenarios.forEach(scenario => {
-                html += `<tr>
-                    <td>${scenario.frequency}</td>
-                    <td>$${scenario.interest_savings.toLocaleString()}</td>
-                    <td>${scenario.months_saved}</td>
-                    <td>${scenario.total_months} months</td>
-                    <td><span class="${scenario.recommendation === 'Good' ? 'positive' : ''}">${scenario.recommendation}</span></td>
-                </tr>`;
-            });
-            
-            html += '</table>';
-        }
-        
-        // Optimal prepayment amounts
-        if (data.optimal_prepayments && data.optimal_prepayments.length > 0) {
-            html += `<h5 style="margin-top: 20px;">Optimal Prepayment Amounts</h5>`;
-            html += '<table class="prepayment-table"><tr><th>Amount</th><th>Interest Saved</th><th>ROI</th><th>Efficiency</th></tr>';
-            
-            data.optimal_prepayments.forEach(prepay => {
-                html += `<tr>
-                    <td>$${prepay.prepayment_amount.toLocaleString()}</td>
-                    <td>$${prepay.interest_savings.toLocaleString()}</td>
-                    <td>${prepay.roi_percent}%</td>
-                    <td><span class="${prepay.efficiency === 'High' ? 'positive' : prepay.efficiency === 'Low' ? 'negative' : ''}">${prepay.efficiency}</span></td>
-                </tr>`;
-            });
-            
-            html += '</table>';
-        }
-        
-        // Best scenario
-        if (data.summary && data.summary.best_scenario) {
-            const best = data.summary.best_scenario;
-            html += `
-                <div class="metric-card success" style="margin-top: 20px;">
-                    <div class="metric-title">Best Prepayment Strategy</div>
-                    <div class="metric-value">${best.frequency} prepayments of $${payload.prepayment_amount}</div>
-                    <div class="metric-description">
-                        Save $${best.interest_savings.toLocaleString()} in interest | 
-                        Pay off ${best.months_saved} months early
-                    </div>
-                </div>
-            `;
-        }
-        
-        document.getElementById('prepaymentResult').innerHTML = html;
-        
     } catch (error) {
-        document.getElementById('prepaymentResult').innerHTML = `<p class="error">Error: ${error.message}</p>`;
+        target.innerHTML = `<p class="error">Error: ${error.message}</p>`;
     }
 }
 
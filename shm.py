@@ -0,0 +1,148 @@
+"""Shared-memory columns for process-pool portfolio runs.
+
+run_sharded copies the input columns into multiprocessing.shared_memory
+blocks once and allocates the output buffers there too. Workers receive only
+block names, shapes, dtypes and a row range, attach by name, and write their
+rows of the outputs in place, so no bulk data is pickled either way.
+
+Segments are removed however a run ends:
+    - the owner closes and unlinks them in a finally block, which covers
+      exceptions, crashed workers (BrokenProcessPool) and KeyboardInterrupt
+    - an atexit hook unlinks anything still open at interpreter exit
+    - if the owner process itself is killed, multiprocessing's resource
+      tracker unlinks the segments it created
+"""
+import atexit
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+CHUNK_SIZE = 50000
+PREFIX = "loan_"
+
+_live = {}
+_live_lock = threading.Lock()
+
+class SharedArrays:
+    """Named NumPy arrays backed by shared-memory blocks"""
+
+    def __init__(self, blocks, layout, owner):
+        self.blocks = blocks
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=blocks[name].buf)
+            for name, (_, shape, dtype) in layout.items()
+        }
+
+    @classmethod
+    def create(cls, inputs=None, outputs=None):
+        """New blocks holding copies of inputs ({name: array}) and zeroed outputs ({name: (shape, dtype)})"""
+        specs = {name: (np.asarray(a).shape, np.asarray(a).dtype.str) for name, a in (inputs or {}).items()}
+        specs.update({name: (tuple(shape), np.dtype(dtype).str) for name, (shape, dtype) in (outputs or {}).items()})
+
+        token = secrets.token_hex(4)
+        blocks, layout = {}, {}
+        try:
+            for name, (shape, dtype) in specs.items():
+                size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+                block = shared_memory.SharedMemory(name=f"{PREFIX}{token}_{name}", create=True, size=size)
+                blocks[name] = block
+                layout[name] = (block.name, shape, dtype)
+        except BaseException:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+
+        shared = cls(blocks, layout, owner=True)
+        with _live_lock:
+            _live[id(shared)] = shared
+        for name, values in (inputs or {}).items():
+            shared.arrays[name][...] = values
+        return shared
+
+    @classmethod
+    def attach(cls, layout):
+        """Attach to blocks created elsewhere, from their layout"""
+        blocks = {}
+        for name, (block_name, _, _) in layout.items():
+            blocks[name] = shared_memory.SharedMemory(name=block_name)
+        return cls(blocks, layout, owner=False)
+
+    def rows(self, names, start, stop):
+        """Views of rows start:stop of the named arrays"""
+        return {name: self.arrays[name][start:stop] for name in names}
+
+    def close(self):
+        """Detach; the owner also unlinks the segments"""
+        self.arrays = {}
+        for block in self.blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                # A view is still alive somewhere; the mapping goes with it
+                pass
+            if self.owner:
+                try:
+                    block.unlink()
+                except FileNotFoundError:
+                    pass
+        self.blocks = {}
+        with _live_lock:
+            _live.pop(id(self), None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@atexit.register
+def _unlink_live():
+    with _live_lock:
+        live = list(_live.values())
+    for shared in live:
+        shared.close()
+
+def _row_views(arrays, start, stop):
+    return {name: values[start:stop] for name, values in arrays.items()}
+
+def _run_slice(fn, layout, input_names, output_names, start, stop, args):
+    """Worker side: attach, let fn fill its rows of the outputs, detach"""
+    shared = SharedArrays.attach(layout)
+    try:
+        fn(shared.rows(input_names, start, stop), shared.rows(output_names, start, stop), *args)
+    finally:
+        shared.close()
+
+def run_sharded(fn, inputs, outputs, args=(), workers=None, chunk_size=CHUNK_SIZE):
+    """Run fn(input_rows, output_rows, *args) over row chunks, in a process pool when it pays.
+
+    inputs maps names to arrays with rows on axis 0; outputs maps names to
+    (shape, dtype) with rows on axis 0. fn writes its output rows in place and
+    must be a module-level function. Returns the outputs as ordinary arrays.
+    """
+    n_rows = len(next(iter(inputs.values())))
+    bounds = [(start, min(start + chunk_size, n_rows)) for start in range(0, n_rows, chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(bounds) <= 1:
+        results = {name: np.zeros(shape, dtype) for name, (shape, dtype) in outputs.items()}
+        for start, stop in bounds:
+            fn(_row_views(inputs, start, stop), _row_views(results, start, stop), *args)
+        return results
+
+    with SharedArrays.create(inputs, outputs) as shared:
+        with ProcessPoolExecutor(max_workers=min(workers, len(bounds))) as pool:
+            futures = [
+                pool.submit(_run_slice, fn, shared.layout, list(inputs), list(outputs), start, stop, args)
+                for start, stop in bounds
+            ]
+            for future in futures:
+                future.result()
+        return {name: np.array(shared.arrays[name]) for name in outputs}
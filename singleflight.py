@@ -0,0 +1,92 @@
+"""Single-flight deduplication of concurrent identical computations.
+
+When several threads ask for the same key at once, only the first runs the
+computation. The others wait for it and share its result, or re-raise its
+exception. Once the call finishes the key is forgotten, so this only
+collapses work that overlaps in time. Caching is left to other layers.
+"""
+import os
+import threading
+
+import metrics
+
+DEFAULT_TIMEOUT = float(os.environ.get("LOAN_SINGLEFLIGHT_TIMEOUT", "30"))
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one execution"""
+
+    def __init__(self, name):
+        self.name = name
+        self.stats = {"executed": 0, "collapsed": 0, "timeouts": 0, "errors": 0}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=DEFAULT_TIMEOUT):
+        """Result of fn(), shared with any concurrent caller using the same key.
+
+        Waiting callers raise TimeoutError after timeout seconds; the
+        computation itself keeps running for the caller that started it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["executed"] += 1
+            else:
+                self.stats["collapsed"] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+                with self._lock:
+                    self.stats["errors"] += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+            return call.result
+
+        if not call.event.wait(timeout):
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise TimeoutError(f"Timed out waiting for an identical {self.name} calculation")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+groups = {}
+
+def group(name):
+    """Shared SingleFlight for name, created on first use"""
+    if name not in groups:
+        groups.setdefault(name, SingleFlight(name))
+    return groups[name]
+
+def _collect():
+    samples = []
+    for name, flight in list(groups.items()):
+        samples.extend(({"group": name, "event": event}, n) for event, n in flight.stats.items())
+    return [
+        ("loan_singleflight_events_total", "counter",
+         "Computations executed, collapsed into an in-flight one, timed out or failed", samples),
+        ("loan_singleflight_in_flight", "gauge", "Computations currently running",
+         [({"group": name}, flight.in_flight()) for name, flight in list(groups.items())])
+    ]
+
+metrics.register_collector(_collect)
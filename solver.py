@@ -0,0 +1,130 @@
+"""Goal-seek solvers: the loan parameter that produces a target.
+
+Each solver takes arrays (or scalars) that broadcast together and returns an
+array, NaN where no solution exists. Rates are nominal annual percentages
+compounded monthly, as everywhere else; balloon is a percentage of principal,
+as in balloon loan payloads. With monthly rate r, term n, principal L and
+balloon fraction b, everything follows from
+
+    payment = (L - b L (1+r)^-n) r / (1 - (1+r)^-n)
+
+which inverts in closed form for the payment, principal and term (NPER).
+The rate has no closed form and uses loans.annuity_rate's batched Newton.
+
+/solve takes the inputs as scalars or arrays, or as a "loans" array of loan
+payloads (principal, rate, years, type/balloon, plus "payment").
+"""
+import numpy as np
+
+from loans import annuity_rate
+from spec import LOAN_TYPES, parse_loans, spec_columns
+
+SOLVE_FOR = {
+    "payment": ("principal", "rate", "term_months"),
+    "rate": ("principal", "payment", "term_months"),
+    "term": ("principal", "rate", "payment"),
+    "principal": ("payment", "rate", "term_months")
+}
+# Loan types whose payment is a single level annuity
+SOLVER_TYPES = ("fixed", "balloon")
+# Solved terms up to this many months past a whole month count as that month
+TERM_TOLERANCE = 1e-3
+
+def _arrays(*values):
+    return np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in values))
+
+def solve_payment(principal, rate, term_months, balloon=0):
+    """Level monthly payment"""
+    principal, rate, n, balloon = _arrays(principal, rate, term_months, balloon)
+    r = rate / 1200
+    with np.errstate(divide="ignore", invalid="ignore"):
+        discount = (1 + r) ** -n
+        payment = np.where(r == 0, principal * (1 - balloon / 100) / n,
+                           principal * (1 - balloon / 100 * discount) * r / (1 - discount))
+    return np.where(n > 0, payment, np.nan)
+
+def solve_principal(payment, rate, term_months, balloon=0):
+    """Largest principal a monthly payment carries (inverse annuity)"""
+    payment, rate, n, balloon = _arrays(payment, rate, term_months, balloon)
+    r = rate / 1200
+    with np.errstate(divide="ignore", invalid="ignore"):
+        discount = (1 + r) ** -n
+        principal = np.where(r == 0, payment * n / (1 - balloon / 100),
+                             payment * (1 - discount) / r / (1 - balloon / 100 * discount))
+    return np.where((n > 0) & (principal > 0) & np.isfinite(principal), principal, np.nan)
+
+def solve_term(principal, rate, payment, balloon=0):
+    """Months (fractional) for a payment to bring principal down to the balloon (NPER)"""
+    principal, rate, payment, balloon = _arrays(principal, rate, payment, balloon)
+    r = rate / 1200
+    remaining = principal * balloon / 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        months = np.where(r == 0, (principal - remaining) / payment,
+                          np.log((payment - remaining * r) / (payment - principal * r)) / np.log1p(r))
+    # Payments at or below the interest never amortize
+    return np.where((payment > principal * r) & (months >= 0) & np.isfinite(months), months, np.nan)
+
+def solve_rate(principal, payment, term_months, balloon=0):
+    """Annual rate (%) at which the payment repays principal over the term"""
+    principal, payment, n, balloon = _arrays(principal, payment, term_months, balloon)
+    return annuity_rate(principal, payment, n, fv=principal * balloon / 100) * 1200
+
+SOLVERS = {
+    "payment": solve_payment,
+    "rate": solve_rate,
+    "term": solve_term,
+    "principal": solve_principal
+}
+
+def _column(values, digits):
+    return [None if not np.isfinite(x) else x for x in np.round(values, digits).tolist()]
+
+def loan_inputs(data):
+    """Solver inputs from a "loans" array of loan payloads; top-level fields fill what a loan leaves out.
+
+    Loans go through parse_loans, so only balloon loans carry a balloon;
+    "payment", which is not part of a loan spec, is read per loan. Types
+    outside SOLVER_TYPES have no level payment to solve for and are rejected.
+    """
+    loans = data["loans"]
+    defaults = {k: v for k, v in data.items() if k not in ("loans", "solve_for")}
+    specs = parse_loans(loans, defaults)
+    for i, spec in enumerate(specs):
+        if spec.type not in SOLVER_TYPES:
+            raise ValueError(f"loans[{i}]: Goal seek is not available for loan type: {spec.type}")
+    columns = spec_columns(specs)
+    inputs = {
+        "principal": columns["principal"],
+        "rate": columns["rate"],
+        "term_months": columns["years"] * 12,
+        "balloon": np.where(columns["type"] == LOAN_TYPES.index("balloon"), columns["balloon"], 0.0)
+    }
+    payments = [item.get("payment", defaults.get("payment")) for item in loans]
+    if all(p is not None for p in payments):
+        inputs["payment"] = np.array(payments, dtype=float)
+    return inputs
+
+def solve(data):
+    """Solve a /solve payload: solve_for plus scalar or array inputs"""
+    target = data.get("solve_for")
+    if target not in SOLVERS:
+        raise ValueError(f"solve_for must be one of: {', '.join(SOLVERS)}")
+
+    inputs = loan_inputs(data) if data.get("loans") else dict(data)
+    if "term_months" not in inputs and "years" in inputs:
+        inputs["term_months"] = np.asarray(inputs["years"], dtype=float) * 12
+    missing = [name if name != "term_months" else "term_months (or years)"
+               for name in SOLVE_FOR[target] if name not in inputs]
+    if missing:
+        raise ValueError(f"Missing required parameters: {', '.join(missing)}")
+
+    args = [inputs[name] for name in SOLVE_FOR[target]]
+    result = np.atleast_1d(SOLVERS[target](*args, inputs.get("balloon", 0)))
+    if target == "term":
+        # A term solved from a cent-rounded payment lands a hair past the whole month
+        return {
+            "solve_for": target,
+            "term_months": _column(result, 4),
+            "payments": [None if not np.isfinite(m) else int(np.ceil(m - TERM_TOLERANCE)) for m in result.tolist()]
+        }
+    return {"solve_for": target, target: _column(result, 4 if target == "rate" else 2)}
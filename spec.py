@@ -0,0 +1,185 @@
+"""Typed loan specs: parse, validate and normalize a payload once.
+
+LoanSpec turns a request-style loan dict into typed fields in one pass:
+numbers become floats and ints, variable rates are parsed once, the rounding
+mode is resolved (cents: true means half_even), "schedule": "annual" asks
+for yearly rows (variable loans are already yearly), and extra payments given as
+{month: amount} become event lists. Fields the loan type does not use are
+dropped (a fixed loan ignores "balloon"), so payloads that build the same
+schedule normalize to the same spec and share one canonical hash. Caches,
+ETags, single-flight keys and batch deduplication key on that hash.
+
+    spec = LoanSpec.from_dict({"type": "fixed", "principal": "250000", "rate": 6.5, "years": 30})
+    spec.hash == LoanSpec.from_dict({"principal": 250000.0, "years": "30", "rate": "6.5"}).hash
+
+parse_loans reads a whole JSON array (or {"loans": [...]}) of payloads, and
+spec_columns lays a batch out as NumPy columns for vectorized engines.
+"""
+import json
+
+import numpy as np
+
+from cents import ROUNDING_MODES
+from store import content_hash
+
+LOAN_TYPES = ("fixed", "variable", "interest_only", "balloon")
+DEFAULT_BALLOON_PERCENT = 20.0
+SCHEDULE_MODES = ("monthly", "annual")
+
+def parse_rates(rates_input):
+    """List of annual rates (%) from a comma-separated string or a sequence"""
+    if isinstance(rates_input, str):
+        return [float(r.strip()) for r in rates_input.split(",") if r.strip()]
+    return [float(r) for r in rates_input]
+
+def _optional_float(value):
+    return None if value is None or value == "" else float(value)
+
+def _whole(value):
+    """int from an int, float or numeric string ("30", 30.0)"""
+    return value if isinstance(value, int) else int(float(value))
+
+def _events(events):
+    """Extra-payment events as a list of dicts ({month: amount} expands to month events)"""
+    if not events:
+        return None
+    if isinstance(events, dict):
+        return [{"month": _whole(month), "amount": float(amount)} for month, amount in events.items()]
+    return [dict(e) for e in events]
+
+def _index(index):
+    return {
+        "tenors": [float(t) for t in index.get("tenors", [])],
+        "rates": [float(r) for r in index.get("rates", [])],
+        "method": index.get("method", "linear")
+    }
+
+class LoanSpec:
+    """One loan's normalized inputs; build with LoanSpec.from_dict"""
+
+    __slots__ = ("type", "principal", "rate", "years", "fees", "rates", "interest_only_years", "balloon",
+                 "rounding", "extra_payments", "start_date", "index", "margin", "floor", "cap",
+                 "periodic_cap", "schedule", "_hash")
+
+    def __init__(self, type="fixed", principal=0.0, rate=0.0, years=1, fees=0.0, rates=None,
+                 interest_only_years=None, balloon=None, rounding=None, extra_payments=None,
+                 start_date=None, index=None, margin=None, floor=None, cap=None, periodic_cap=None,
+                 schedule=None):
+        self.type = type
+        self.principal = principal
+        self.rate = rate
+        self.years = years
+        self.fees = fees
+        self.rates = rates
+        self.interest_only_years = interest_only_years
+        self.balloon = balloon
+        self.rounding = rounding
+        self.extra_payments = extra_payments
+        self.start_date = start_date
+        self.index = index
+        self.margin = margin
+        self.floor = floor
+        self.cap = cap
+        self.periodic_cap = periodic_cap
+        self.schedule = schedule
+        self._hash = None
+
+    @classmethod
+    def from_dict(cls, data, defaults=None):
+        """Validated spec from a payload dict; defaults fill keys the payload leaves out"""
+        if defaults:
+            data = {**defaults, **data}
+        loan_type = data.get("type", "fixed")
+        if loan_type not in LOAN_TYPES:
+            raise ValueError(f"Invalid loan type: {loan_type}")
+
+        years = _whole(data.get("years", 1))
+        spec = cls(loan_type, float(data.get("principal", 0)), years=years, fees=float(data.get("fees", 0)))
+
+        if loan_type == "variable":
+            spec.rates = tuple(parse_rates(data.get("rates") or ""))
+            if data.get("index"):
+                spec.index = _index(data["index"])
+                spec.margin = float(data.get("margin", 0))
+                spec.floor = _optional_float(data.get("floor"))
+                spec.cap = _optional_float(data.get("cap"))
+                spec.periodic_cap = _optional_float(data.get("periodic_cap"))
+        else:
+            spec.rate = float(data.get("rate", 0))
+            rounding = data.get("rounding")
+            if data.get("cents") and not rounding:
+                rounding = "half_even"
+            if rounding and rounding not in ROUNDING_MODES:
+                raise ValueError(f"Invalid rounding mode: {rounding}")
+            spec.rounding = rounding or None
+            schedule = data.get("schedule") or "monthly"
+            if schedule not in SCHEDULE_MODES:
+                raise ValueError(f"Invalid schedule: {schedule}")
+            # Monthly is the default and stays out of the canonical payload
+            spec.schedule = schedule if schedule != "monthly" else None
+
+        if loan_type == "interest_only":
+            value = data.get("interest_only_years")
+            spec.interest_only_years = years if value is None or value == "" else _whole(value)
+            if not 0 <= spec.interest_only_years <= years:
+                raise ValueError("Interest-only years must be between 0 and the loan term")
+        elif loan_type == "balloon":
+            spec.balloon = float(data.get("balloon", DEFAULT_BALLOON_PERCENT))
+
+        spec.extra_payments = _events(data.get("extra_payments"))
+        if spec.extra_payments is not None:
+            spec.start_date = data.get("start_date")
+        return spec
+
+    def to_dict(self):
+        """Canonical payload: the normalized fields that are set"""
+        return {name: getattr(self, name) for name in self.__slots__[:-1] if getattr(self, name) is not None}
+
+    @property
+    def hash(self):
+        """Stable hex digest of the canonical payload"""
+        if self._hash is None:
+            self._hash = content_hash("loan", self.to_dict())
+        return self._hash
+
+    def __eq__(self, other):
+        return isinstance(other, LoanSpec) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash(self.hash)
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.to_dict().items() if k != "type")
+        return f"LoanSpec({self.type}, {fields})"
+
+def parse_loans(payload, defaults=None):
+    """LoanSpecs from a JSON array (text, bytes or parsed), or an object with "loans"
+
+    Errors name the offending item, e.g. "loans[3]: Invalid loan type: lease".
+    """
+    if isinstance(payload, (str, bytes, bytearray)):
+        payload = json.loads(payload)
+    if isinstance(payload, dict):
+        payload = payload.get("loans") or []
+    specs = []
+    for i, item in enumerate(payload):
+        try:
+            specs.append(LoanSpec.from_dict(item, defaults))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"loans[{i}]: {e}") from e
+    return specs
+
+def spec_columns(specs):
+    """Array-backed batch: {field: array} over specs, with each type's defaults filled in"""
+    years = np.array([s.years for s in specs], dtype=np.int64)
+    return {
+        "type": np.array([LOAN_TYPES.index(s.type) for s in specs], dtype=np.int8),
+        "principal": np.array([s.principal for s in specs], dtype=float),
+        "rate": np.array([s.rate if s.type != "variable" else (s.rates or (0.0,))[0] for s in specs], dtype=float),
+        "years": years,
+        "fees": np.array([s.fees for s in specs], dtype=float),
+        "interest_only_years": np.array([
+            s.interest_only_years if s.interest_only_years is not None else 0 for s in specs
+        ], dtype=np.int64),
+        "balloon": np.array([s.balloon or 0.0 for s in specs], dtype=float)
+    }
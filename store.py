@@ -0,0 +1,155 @@
+"""Server-side store for calculation results and rendered reports.
+
+/calculate saves each result under an ID, and the export routes fetch it by
+that ID, so clients don't upload the schedule again. Results stay in a
+bounded in-memory LRU with a TTL. When LOAN_RESULT_STORE_PATH names a SQLite
+file, results evicted from memory are spilled there and read back on demand
+until they expire.
+
+Rendered reports are cached separately, keyed by a content hash.
+
+Environment:
+    LOAN_RESULT_STORE_PATH   SQLite file for spilled results (default: none)
+    LOAN_RESULT_TTL          seconds a result is kept (default 3600)
+    LOAN_RESULT_MAX          results kept in memory (default 512)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import metrics
+
+def content_hash(*parts):
+    """Stable hex digest of JSON-serializable parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, separators=(",", ":"), default=str).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class ResultStore:
+    """LRU of JSON-serializable results with TTL and optional SQLite spill"""
+
+    def __init__(self, max_entries=512, ttl=3600, spill_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.spill_path = spill_path
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "spills": 0, "spill_hits": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if spill_path:
+            with self._connect() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS results "
+                           "(id TEXT PRIMARY KEY, expires REAL, payload TEXT)")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.spill_path, timeout=5)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _count(self, event, n=1):
+        with self._lock:
+            self.stats[event] += n
+
+    def put(self, result_id, value):
+        expires = time.time() + self.ttl
+        spilled = []
+        with self._lock:
+            self._entries[result_id] = (expires, value)
+            self._entries.move_to_end(result_id)
+            while len(self._entries) > self.max_entries:
+                key, entry = self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+                if entry[0] > time.time():
+                    spilled.append((key, entry))
+
+        if spilled and self.spill_path:
+            with self._connect() as db:
+                db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                               [(key, exp, json.dumps(val)) for key, (exp, val) in spilled])
+                db.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
+            self._count("spills", len(spilled))
+        return result_id
+
+    def get(self, result_id):
+        """Stored value, or None if unknown or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(result_id)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                del self._entries[result_id]
+
+        if self.spill_path:
+            with self._connect() as db:
+                row = db.execute("SELECT payload FROM results WHERE id = ? AND expires > ?",
+                                 (result_id, now)).fetchone()
+            if row is not None:
+                self._count("spill_hits")
+                value = json.loads(row[0])
+                self.put(result_id, value)
+                return value
+
+        self._count("misses")
+        return None
+
+    def __len__(self):
+        return len(self._entries)
+
+class ReportCache:
+    """Small LRU of rendered report bytes keyed by content hash"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._entries[key]
+            self.stats["misses"] += 1
+
+        body = render()
+        with self._lock:
+            self._entries[key] = body
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+results = ResultStore(
+    max_entries=int(os.environ.get("LOAN_RESULT_MAX", "512")),
+    ttl=float(os.environ.get("LOAN_RESULT_TTL", "3600")),
+    spill_path=os.environ.get("LOAN_RESULT_STORE_PATH") or None
+)
+reports = ReportCache()
+
+def _collect():
+    return [
+        ("loan_result_store_events_total", "counter", "Result store lookups and evictions",
+         [({"event": k}, v) for k, v in results.stats.items()]),
+        ("loan_result_store_entries", "gauge", "Results held in memory", [({}, len(results))]),
+        ("loan_report_cache_events_total", "counter", "Rendered report cache lookups",
+         [({"event": k}, v) for k, v in reports.stats.items()])
+    ]
+
+metrics.register_collector(_collect)
@@ -0,0 +1,121 @@
+"""Server-Sent Events streams for long-running analyses.
+
+/stream/<kind> answers with text/event-stream and sends each piece of a
+result as soon as it is computed, instead of one JSON body at the end:
+
+    event: result     {"kind": ..., "row": {...}}   one scenario, grid row or loan
+    event: progress   {"done": 3, "total": 9, "elapsed": 0.41, "eta": 0.82}
+    event: done       {"done": 9, "total": 9, "elapsed": 1.23}
+    event: error      {"error": "..."}
+
+Kinds:
+    prepayment    prepayment_scenarios rows ('original', 'scenario', 'optimal', 'summary')
+    sensitivity   one row per rate change; "rate_changes" sets the grid
+    batch         a list of {"index", "summary" or "error"} per chunk of "chunk_size" loans
+
+Rows are encoded and sent one at a time, so the server never holds the
+complete result. ETA extrapolates the average time per completed step.
+"""
+import json
+import time
+
+import numpy as np
+
+from analysis import RATE_CHANGES, iter_sensitivity
+from loans import loan_dispatcher
+from prepayment import PREPAYMENT_DEFAULTS, iter_prepayment_scenarios, optimal_amounts, scenario_frequencies
+from spec import LoanSpec
+
+BATCH_CHUNK_SIZE = 100
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def sse(event, payload):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(payload, default=_json_default)}\n\n"
+
+def prepayment_stream(data):
+    """(total steps, (kind, row, steps) items) for a /prepayment payload"""
+    spec = LoanSpec.from_dict(data, PREPAYMENT_DEFAULTS)
+    frequency = data.get("prepayment_frequency", "monthly")
+    rows = iter_prepayment_scenarios(
+        spec.principal,
+        spec.rate,
+        spec.years,
+        data.get("prepayment_amount", 0),
+        data.get("prepayment_start", 1),
+        frequency
+    )
+    total = len(scenario_frequencies(frequency)) + len(optimal_amounts(spec.principal))
+    return total, ((kind, row, int(kind in ("scenario", "optimal"))) for kind, row in rows)
+
+def sensitivity_stream(data):
+    """(total steps, (kind, row, steps) items) for a /sensitivity payload"""
+    total = len(data.get("rate_changes", RATE_CHANGES))
+    return total, (("sensitivity", row, 1) for row in iter_sensitivity(data))
+
+def _batch_rows(loans, chunk_size):
+    for start in range(0, len(loans), chunk_size):
+        # Loans in a chunk whose specs normalize to the same hash are computed once
+        summaries = {}
+        chunk = []
+        for index in range(start, min(start + chunk_size, len(loans))):
+            try:
+                spec = LoanSpec.from_dict(loans[index])
+                if spec.hash not in summaries:
+                    summaries[spec.hash] = loan_dispatcher(spec, as_frame=False)[1]
+                chunk.append({"index": index, "summary": summaries[spec.hash]})
+            except Exception as e:
+                chunk.append({"index": index, "error": str(e)})
+        # One message per chunk keeps per-event overhead small for big batches
+        yield "loans", chunk, len(chunk)
+
+def batch_stream(data):
+    """(total steps, (kind, rows, steps) items) for a list of /calculate payloads"""
+    loans = data.get("loans") or []
+    if not loans:
+        raise ValueError("At least one loan is required")
+    chunk_size = max(int(data.get("chunk_size", BATCH_CHUNK_SIZE)), 1)
+    return len(loans), _batch_rows(loans, chunk_size)
+
+STREAMS = {
+    "prepayment": prepayment_stream,
+    "sensitivity": sensitivity_stream,
+    "batch": batch_stream
+}
+
+def events(kind, data, on_error=None):
+    """SSE messages for an analysis: results interleaved with progress, then done.
+
+    Exceptions raised while computing end the stream with an error event
+    (the status line has already gone out); on_error(e) is called first.
+    """
+    start = time.perf_counter()
+    done = 0
+    try:
+        if kind not in STREAMS:
+            raise ValueError(f"Unknown stream: {kind}")
+        total, items = STREAMS[kind](data)
+        for name, row, steps in items:
+            yield sse("result", {"kind": name, "row": row})
+            if not steps:
+                continue
+            done += steps
+            elapsed = time.perf_counter() - start
+            yield sse("progress", {
+                "done": done,
+                "total": total,
+                "elapsed": round(elapsed, 3),
+                "eta": round(elapsed / done * max(total - done, 0), 3)
+            })
+    except Exception as e:
+        if on_error is not None:
+            on_error(e)
+        yield sse("error", {"error": str(e)})
+        return
+    yield sse("done", {"done": done, "total": total, "elapsed": round(time.perf_counter() - start, 3)})
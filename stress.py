@@ -0,0 +1,232 @@
+"""Portfolio rate-shock stress testing.
+
+Each scenario moves rates in parallel by shock_bp basis points at every reset:
+
+    variable        annual payments re-amortized each year at rates[year] + shock
+                    (the first year's rate is already set); the peak payment counts
+    interest_only   the amortizing payment at the end of the interest-only period,
+                    at rate + shock, against the interest-only payment
+    balloon         the balloon refinanced at rate + shock over refinance_years
+                    (default: the original term), against the same refinance
+                    at today's rate
+    fixed           no reset; included for DTI only
+
+Payment shock is shocked / reference payment - 1, the reference being the
+current payment (for balloon loans, the unshocked refinance payment). A loan
+breaches when (shocked monthly payment + monthly_debts) / monthly_income
+exceeds dti_limit (%).
+
+The book is split into chunks of loans evaluated in a process pool (see
+shm.run_sharded: columns and results live in shared memory); the per-loan
+shock and breach arrays are reduced per scenario into shock percentiles, a
+shock histogram and breach counts.
+
+Environment:
+    LOAN_STRESS_WORKERS   worker processes for /stress (default 1)
+
+Usage:
+    python stress.py PORTFOLIO.json [--workers N] [--shocks -300 -200 ... 300]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from cents import level_payment
+from loans import variable_rate_paths
+from shm import run_sharded
+from spec import LOAN_TYPES, parse_loans, spec_columns
+
+TYPE_CODES = {name: code for code, name in enumerate(LOAN_TYPES)}
+DEFAULT_SHOCKS_BP = (-300, -200, -100, 100, 200, 300)
+DEFAULT_DTI_LIMIT = 43.0
+CHUNK_SIZE = 50000
+PERCENTILES = (50, 90, 95, 99)
+# Payment shock histogram edges, in percent
+SHOCK_BINS = (-np.inf, 0, 10, 25, 50, 100, np.inf)
+
+def portfolio_columns(loans):
+    """spec_columns for request-style loans plus rate paths, income and debts"""
+    specs = parse_loans(loans)
+    columns = spec_columns(specs)
+    if (columns["years"] <= 0).any():
+        raise ValueError("Years must be greater than 0")
+
+    # Variable rate paths padded with their last rate, as amortization_variable does
+    max_years = int(columns["years"].max()) if len(specs) else 0
+    rate_paths = np.repeat(columns["rate"][:, None], max_years, axis=1)
+    variable = [i for i, spec in enumerate(specs) if spec.type == "variable"]
+    if variable:
+        rate_paths[variable] = variable_rate_paths([specs[i] for i in variable], max_years)
+    columns["rate_paths"] = rate_paths
+    columns["income"] = np.array([float(l.get("monthly_income", 0)) for l in loans])
+    columns["debts"] = np.array([float(l.get("monthly_debts", 0)) for l in loans])
+    return columns
+
+def _variable_payments(principal, rate_paths, years, shock):
+    """Peak annual payment after the first year of annually re-amortized loans"""
+    rates = rate_paths / 100
+    current = level_payment(principal, rates[:, 0], years)
+    balance = principal * (1 + rates[:, 0]) - current
+    peak = np.where(years > 1, 0.0, current)
+    for t in range(1, rate_paths.shape[1]):
+        active = t < years
+        if not active.any():
+            break
+        rate = np.maximum(rates[:, t] + shock, 0)
+        payment = level_payment(balance, rate, np.maximum(years - t, 1))
+        peak = np.where(active, np.maximum(peak, payment), peak)
+        balance = np.where(active, balance * (1 + rate) - payment, balance)
+    return peak
+
+def current_payments(columns):
+    """Monthly payment each loan makes today"""
+    loan_type = columns["type"]
+    principal = columns["principal"]
+    rate = columns["rate_paths"][:, 0] / 100
+    n = columns["years"] * 12
+    current = level_payment(principal, rate / 12, n)
+
+    variable = loan_type == TYPE_CODES["variable"]
+    current[variable] = level_payment(principal[variable], rate[variable], columns["years"][variable]) / 12
+    io = loan_type == TYPE_CODES["interest_only"]
+    current[io] = principal[io] * rate[io] / 12
+    balloon = loan_type == TYPE_CODES["balloon"]
+    current[balloon] = level_payment(principal[balloon], rate[balloon] / 12, n[balloon],
+                                     principal[balloon] * columns["balloon"][balloon] / 100)
+    return current
+
+def shocked_payments(columns, shock_bp, current, refinance_years=None):
+    """Monthly payment of every loan after its reset under a parallel shock of shock_bp"""
+    shock = shock_bp / 10000
+    loan_type = columns["type"]
+    principal = columns["principal"]
+    years = columns["years"]
+    n = years * 12
+    shocked_rate = np.maximum(columns["rate_paths"][:, 0] / 100 + shock, 0) / 12
+    shocked = current.copy()
+
+    variable = loan_type == TYPE_CODES["variable"]
+    if variable.any():
+        shocked[variable] = _variable_payments(principal[variable], columns["rate_paths"][variable],
+                                               years[variable], shock) / 12
+
+    # Interest-only for the whole term never resets
+    io = (loan_type == TYPE_CODES["interest_only"]) & (columns["interest_only_years"] < years)
+    if io.any():
+        io_months = columns["interest_only_years"][io] * 12
+        shocked[io] = level_payment(principal[io], shocked_rate[io], n[io] - io_months)
+
+    balloon = loan_type == TYPE_CODES["balloon"]
+    if balloon.any():
+        shocked[balloon] = refinance_payments(columns, balloon, shock, refinance_years)
+    return shocked
+
+def refinance_payments(columns, balloon, shock, refinance_years=None):
+    """Monthly payment refinancing the balloon of the loans in mask balloon at rate + shock (decimal)"""
+    amount = columns["principal"][balloon] * columns["balloon"][balloon] / 100
+    rate = np.maximum(columns["rate_paths"][balloon, 0] / 100 + shock, 0) / 12
+    refi_months = columns["years"][balloon] * 12 if refinance_years is None else int(refinance_years) * 12
+    return level_payment(amount, rate, refi_months)
+
+def reference_payments(columns, current, refinance_years=None):
+    """Payments shocks are measured against: current ones, balloons refinanced at today's rate"""
+    reference = current.copy()
+    balloon = columns["type"] == TYPE_CODES["balloon"]
+    if balloon.any():
+        reference[balloon] = refinance_payments(columns, balloon, 0.0, refinance_years)
+    return reference
+
+def _stress_rows(columns, outputs, scenarios):
+    """Fill (loans, scenarios) payment shocks (%) and DTI breach flags for a slice of the book"""
+    current = current_payments(columns)
+    for i, scenario in enumerate(scenarios):
+        shocked = shocked_payments(columns, float(scenario.get("shock_bp", 0)), current,
+                                   scenario.get("refinance_years"))
+        reference = reference_payments(columns, current, scenario.get("refinance_years"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            outputs["shock_pct"][:, i] = np.where(reference > 0, (shocked / reference - 1) * 100, 0)
+            dti = (shocked + columns["debts"]) / columns["income"] * 100
+        outputs["breach"][:, i] = (columns["income"] > 0) & (dti > float(scenario.get("dti_limit", DEFAULT_DTI_LIMIT)))
+
+def default_scenarios(shocks_bp=DEFAULT_SHOCKS_BP, dti_limit=DEFAULT_DTI_LIMIT):
+    """One parallel-shock scenario per shock in basis points"""
+    return [{"name": f"{s:+d}bp", "shock_bp": s, "dti_limit": dti_limit} for s in shocks_bp]
+
+def run_stress(columns, scenarios=None, workers=None, chunk_size=CHUNK_SIZE):
+    """Scenario-level payment-shock distributions and DTI breach counts.
+
+    Books larger than one chunk are sharded across a process pool of
+    workers (default: all cores) through shared memory; smaller ones run in
+    this process.
+    """
+    scenarios = scenarios or default_scenarios()
+    n_loans = len(columns["principal"])
+    outputs = {
+        "shock_pct": ((n_loans, len(scenarios)), np.float32),
+        "breach": ((n_loans, len(scenarios)), np.bool_)
+    }
+    results = run_sharded(_stress_rows, columns, outputs, (scenarios,), workers, chunk_size)
+    return summarize_stress(columns, scenarios, results["shock_pct"].T, results["breach"].T, n_loans)
+
+def summarize_stress(columns, scenarios, shock_pct, breach, n_loans):
+    """Reduce (scenarios, loans) shock and breach arrays into per-scenario results"""
+    type_names = {code: name for name, code in TYPE_CODES.items()}
+    results = []
+    for i, scenario in enumerate(scenarios):
+        shocks = shock_pct[i].astype(float)
+        counts, _ = np.histogram(shocks, bins=SHOCK_BINS)
+        results.append({
+            "name": scenario.get("name", f"{scenario.get('shock_bp', 0)}bp"),
+            "shock_bp": scenario.get("shock_bp", 0),
+            "payment_shock_pct": {
+                "mean": round(float(shocks.mean()), 2) if n_loans else 0,
+                "max": round(float(shocks.max()), 2) if n_loans else 0,
+                **{f"p{p}": round(float(v), 2) for p, v in zip(
+                    PERCENTILES, np.percentile(shocks, PERCENTILES) if n_loans else [0] * len(PERCENTILES))}
+            },
+            "payment_shock_histogram": [
+                {"from": None if np.isinf(lo) else lo, "to": None if np.isinf(hi) else hi, "loans": int(c)}
+                for lo, hi, c in zip(SHOCK_BINS[:-1], SHOCK_BINS[1:], counts)
+            ],
+            "dti_breaches": int(breach[i].sum()),
+            "dti_breaches_by_type": {
+                type_names[code]: int(breach[i][columns["type"] == code].sum())
+                for code in np.unique(columns["type"]).tolist()
+            }
+        })
+    return {"loans": n_loans, "scenarios": results}
+
+def stress_report(data):
+    """Stress results for a /stress payload: loans plus optional scenarios"""
+    loans = data.get("loans") or []
+    if not loans:
+        raise ValueError("At least one loan is required")
+    scenarios = data.get("scenarios") or default_scenarios(
+        data.get("shocks_bp", DEFAULT_SHOCKS_BP), float(data.get("dti_limit", DEFAULT_DTI_LIMIT)))
+    # Server configuration only: a request must not choose how many processes to fork
+    workers = int(os.environ.get("LOAN_STRESS_WORKERS", "1"))
+    return run_stress(portfolio_columns(loans), scenarios, workers=workers)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rate-shock stress test a loan portfolio")
+    parser.add_argument("portfolio", help="JSON file with a list of loans, or an object with 'loans'")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--shocks", type=int, nargs="+", default=list(DEFAULT_SHOCKS_BP), help="shocks in bp")
+    parser.add_argument("--dti-limit", type=float, default=DEFAULT_DTI_LIMIT)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    with open(args.portfolio) as f:
+        data = json.load(f)
+    loans = data["loans"] if isinstance(data, dict) else data
+    report = run_stress(portfolio_columns(loans), default_scenarios(args.shocks, args.dti_limit),
+                        workers=args.workers, chunk_size=args.chunk_size)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
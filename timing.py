@@ -0,0 +1,108 @@
+"""Lightweight per-request stage timing.
+
+Code marks named stages with ``with stage("amortization"):``. While a request
+is being sampled the elapsed time of each stage is collected, sent back as a
+``Server-Timing`` header and recorded into per-route histograms. Outside a
+sampled request ``stage`` does nothing beyond a context-variable lookup.
+
+Sampling is configured with the LOAN_TIMING_SAMPLE_RATE environment variable
+(0.0 - 1.0, default 1.0) or ``configure(sample_rate=...)``.
+"""
+import bisect
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Bucket upper bounds in milliseconds
+DEFAULT_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_sample_rate = float(os.environ.get("LOAN_TIMING_SAMPLE_RATE", "1.0"))
+_current = ContextVar("loan_timing_stages", default=None)
+
+class Histogram:
+    """Cumulative-bucket histogram safe to update from several threads"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "buckets": list(self.buckets),
+                "counts": list(self.counts),
+                "count": self.count,
+                "sum": self.sum
+            }
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+def configure(sample_rate=None):
+    """Change the fraction of requests that are timed"""
+    global _sample_rate
+    if sample_rate is not None:
+        _sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+
+def start_request():
+    """Begin collecting stages for this request if it is sampled; returns the token for finish_request"""
+    sampled = _sample_rate >= 1 or (_sample_rate > 0 and random.random() < _sample_rate)
+    return _current.set({} if sampled else None)
+
+def finish_request(token, route):
+    """Stop collecting, record the stages under route and return them as {name: ms}"""
+    if token is None:
+        return None
+    stages = _current.get()
+    _current.reset(token)
+    if stages is None:
+        return None
+
+    for name, ms in stages.items():
+        histogram(route, name).observe(ms)
+    return stages
+
+@contextmanager
+def stage(name):
+    """Time a named stage of the current request; repeated stages accumulate"""
+    stages = _current.get()
+    if stages is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+def histogram(route, name):
+    """Histogram of stage name on route, created on first use"""
+    key = (route, name)
+    h = _histograms.get(key)
+    if h is None:
+        with _histograms_lock:
+            h = _histograms.setdefault(key, Histogram())
+    return h
+
+def histograms():
+    """Snapshot of all stage histograms keyed by (route, stage)"""
+    with _histograms_lock:
+        items = list(_histograms.items())
+    return {key: h.snapshot() for key, h in items}
+
+def server_timing_header(stages):
+    """Format stages as a Server-Timing header value"""
+    return ", ".join(f"{name};dur={ms:.3f}" for name, ms in stages.items())